@@ -0,0 +1,100 @@
+"""Nearest-hospital benchmark for the grid index in medplus.geo.
+
+Builds an index over synthetic hospitals (mostly clustered around cities, like a
+national directory, the rest scattered) and records:
+
+    build       GridIndex construction, every point added one at a time
+    nearest     k nearest to a random position near a city
+    within      everything within --radius km of the same positions
+    brute       one vectorized haversine over every point, for comparison
+    edit        move one point (what a row update costs the index)
+
+No database involved: it measures the index itself. Uses NumPy when it is installed,
+the pure-Python fallback otherwise (reported in the output).
+
+Usage: python benchmarks/nearest.py [--points 500000] [--queries 500] [--k 10] [--radius 25] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medplus import geo
+from medplus.geo import GridIndex, haversine_km
+
+CITIES = 300
+SCATTERED = 0.1  # Share of points not near any city
+
+
+def synthetic_points(count, rng):
+    cities = [(rng.uniform(-45, 60), rng.uniform(-120, 150)) for _ in range(CITIES)]
+    points = []
+    for _ in range(count):
+        if rng.random() < SCATTERED:
+            points.append((rng.uniform(-60, 70), rng.uniform(-180, 180)))
+        else:
+            lat, lon = rng.choice(cities)
+            points.append((max(-90.0, min(90.0, rng.gauss(lat, 0.3))), (rng.gauss(lon, 0.3) + 180) % 360 - 180))
+    return cities, points
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=500000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--radius", type=float, default=25.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    cities, points = synthetic_points(args.points, rng)
+    index = GridIndex()
+
+    def build():
+        for key, (lat, lon) in enumerate(points):
+            index.add(key, lat, lon)
+    _, build_ms = timed(build)
+
+    queries = [(lat + rng.gauss(0, 0.2), lon + rng.gauss(0, 0.2)) for lat, lon in
+               (rng.choice(cities) for _ in range(args.queries))]
+    nearest_ms = [timed(index.nearest, lat, lon, args.k)[1] for lat, lon in queries]
+    within_ms = [timed(index.within, lat, lon, args.radius)[1] for lat, lon in queries]
+
+    lats, lons = [p[0] for p in points], [p[1] for p in points]
+    if geo.np is not None:
+        lats, lons = geo.np.array(lats), geo.np.array(lons)
+    brute_ms = [timed(haversine_km, lat, lon, lats, lons)[1] for lat, lon in queries[:5]]
+    edit_ms = [timed(index.add, key, *queries[key % len(queries)])[1] for key in range(0, args.points, 997)]
+
+    results = {
+        "points": args.points,
+        "numpy": geo.np is not None,
+        "build_ms": round(build_ms, 1),
+        "nearest_ms": round(statistics.median(nearest_ms), 3),
+        "nearest_p95_ms": round(sorted(nearest_ms)[int(len(nearest_ms) * 0.95)], 3),
+        "within_ms": round(statistics.median(within_ms), 3),
+        "brute_ms": round(statistics.median(brute_ms), 1),
+        "edit_ms": round(statistics.median(edit_ms), 4),
+    }
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print(f"{name:15} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Cold start benchmark for the MedPlus desktop app.
+
+Each run starts a fresh interpreter in an empty working directory (so it also pays
+for creating medplus.db) and records, from interpreter start:
+
+    import      import of main and everything it pulls in
+    first_paint LoginFrame mapped and drawn
+    dashboard   dashboard shown and the event loop idle again after a login
+
+Usage: python benchmarks/startup.py [--runs 5] [--role USER|ADMIN] [--keep-db] [--json]
+Needs a display (use xvfb-run on a headless machine).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["import", "first_paint", "dashboard"]
+
+# Runs inside the child interpreter; prints one JSON line of millisecond timings
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+app = main.Application()
+frame = app.current_frame
+while not frame.winfo_ismapped():
+    app.update()
+app.update()
+painted = time.perf_counter()
+
+app.on_login_success(sys.argv[1], "benchmark")
+frame = app.current_frame
+while not frame.winfo_ismapped():
+    app.update()
+app.update_idletasks()
+app.update()
+interactive = time.perf_counter()
+app.on_close()
+
+print(json.dumps({
+    "import": (imported - start) * 1000,
+    "first_paint": (painted - start) * 1000,
+    "dashboard": (interactive - start) * 1000,
+}))
+"""
+
+
+def run_once(role, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run([sys.executable, "-c", PROBE, role], cwd=workdir, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure MedPlus cold start.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--role", choices=["USER", "ADMIN"], default="USER")
+    parser.add_argument("--keep-db", action="store_true",
+                        help="reuse one database across runs instead of starting from an empty directory")
+    parser.add_argument("--json", action="store_true", help="print raw timings as JSON")
+    args = parser.parse_args(argv)
+
+    samples = []
+    with tempfile.TemporaryDirectory() as shared:
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory() as fresh:
+                try:
+                    samples.append(run_once(args.role, shared if args.keep_db else fresh))
+                except RuntimeError as e:
+                    print(f"Benchmark run failed: {e}", file=sys.stderr)
+                    return 1
+
+    if args.json:
+        print(json.dumps(samples, indent=2))
+        return 0
+
+    print(f"{'stage':<12} {'median ms':>10} {'min ms':>10} {'max ms':>10}   ({args.runs} runs, {args.role})")
+    for stage in STAGES:
+        values = [sample[stage] for sample in samples]
+        print(f"{stage:<12} {statistics.median(values):>10.1f} {min(values):>10.1f} {max(values):>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
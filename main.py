@@ -1,18 +1,34 @@
+import argparse
+import os
 from medplus.ui.base import MedPlusApp
 from medplus.ui.login_ui import LoginFrame
-from medplus.ui.dashboard_ui import UserDashboardFrame, AdminDashboardFrame
+from medplus.ui.tasks import task_runner
+from medplus.database import db
 
 class Application(MedPlusApp):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, server=None):
+        super().__init__(server)
+        # Decode every background on a worker thread; the login card paints over a
+        # placeholder colour meanwhile and the dashboards are ready by the time we log in
+        self.preload_assets(["image0.png", "pills.png", "hospital_reception_bg.png"])
         self.switch_frame(LoginFrame)
+        # Open the database (and run any pending migrations) in the background once the
+        # login screen is up, so the first login doesn't pay for it
+        if not self.client:
+            self.after_idle(lambda: task_runner.submit(self, db.get, busy=False))
 
     def on_login_success(self, role, username):
+        # Dashboards (and the table/search/import modules behind them) load on first login
+        from medplus.ui.dashboard_ui import UserDashboardFrame, AdminDashboardFrame
         if role == 'ADMIN':
             self.switch_frame(AdminDashboardFrame, username=username)
         else:
             self.switch_frame(UserDashboardFrame, username=username)
 
 if __name__ == "__main__":
-    app = Application()
+    parser = argparse.ArgumentParser(description="MedPlus Hospital Management System")
+    parser.add_argument("--server", default=os.environ.get("MEDPLUS_SERVER"),
+                        help="URL of a MedPlus server to use instead of the local medplus.db")
+    args = parser.parse_args()
+    app = Application(args.server)
     app.mainloop()
@@ -0,0 +1,4 @@
+import sys
+from medplus.cli import main
+
+sys.exit(main())
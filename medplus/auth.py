@@ -1,44 +1,181 @@
-import hashlib
+import argparse
+import os
+import sys
 from medplus.database import db
+from medplus.hashing import PasswordHasher, DEFAULT_POLICY, POLICY_SETTING, check_policy, hash_parallel
+from medplus.repositories import users, settings
+
+ROLES = ("USER", "ADMIN")
+LOGIN_FAILED = "Invalid username or password."
 
 class Auth:
+    _hasher = None
+    _dummy_hash = None
+
+    @classmethod
+    def hasher(cls):
+        """Hasher for the installation's policy (see `python -m medplus.hashing calibrate`)."""
+        if cls._hasher is None:
+            try:
+                policy = settings.get(POLICY_SETTING, DEFAULT_POLICY)
+                check_policy(policy)  # One stored before policies were checked may lack parameters
+                cls._hasher = PasswordHasher(policy)
+            except ValueError as e:
+                print(f"Ignoring bad password hash policy: {e}")
+                cls._hasher = PasswordHasher(DEFAULT_POLICY)
+        return cls._hasher
+
+    @classmethod
+    def set_policy(cls, policy):
+        """Hash new passwords (and rehash old ones on login) under policy from now on."""
+        check_policy(policy)  # Raises ValueError before anything is stored
+        settings.set(POLICY_SETTING, policy)
+        cls._hasher = cls._dummy_hash = None
+
     @staticmethod
     def hash_password(password):
-        return hashlib.sha256(password.encode()).hexdigest()
+        return Auth.hasher().hash(password)
 
     @staticmethod
     def register(username, password, role='USER'):
-        # Check if user exists
-        existing = db.fetch_one("SELECT username FROM users WHERE username = ?", (username,))
-        if existing:
-            return False, "Username already exists."
-        
-        hashed_pw = Auth.hash_password(password)
+        # Hash outside the transaction: it's the slow part and needs no lock
+        return Auth.create_user(username, Auth.hash_password(password), role)
+
+    @staticmethod
+    def create_user(username, hashed_pw, role='USER'):
+        """The database half of register(), for a password that is already hashed."""
         try:
-            db.execute_query("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)", 
-                             (username, hashed_pw, role))
+            # Existence check and insert form one unit of work with a single commit
+            with db.transaction():
+                if users.exists(username):
+                    return False, "Username already exists."
+
+                users.create(username, hashed_pw, role)
             return True, "Registration successful."
         except Exception as e:
             return False, f"Registration failed: {str(e)}"
 
     @staticmethod
-    def login(username, password, role='USER'):
-        user = db.fetch_one("SELECT password_hash, role FROM users WHERE username = ?", (username,))
+    def register_many(accounts, workers=None):
+        """Creates many accounts at once from (username, password, role) tuples.
+
+        Passwords are hashed across worker processes (see hashing.hash_parallel) and all
+        accounts go in with one transaction; usernames that already exist are left
+        untouched. Returns (username, success, message) per account, in input order.
+        """
+        results = []
+        pending = {}  # username -> index into results
+        for username, password, role in accounts:
+            username, role = (username or "").strip(), (role or "USER").strip().upper()
+            if not username or not password:
+                results.append((username, False, "Username and password are required."))
+            elif role not in ROLES:
+                results.append((username, False, f"Unknown role: {role}."))
+            elif username in pending:
+                results.append((username, False, "Duplicate username in this batch."))
+            else:
+                pending[username] = len(results)
+                results.append((username, password, role))
+        if not pending:
+            return results
+
+        indexes = list(pending.values())
+        hashes = hash_parallel(Auth.hasher().policy, [results[i][1] for i in indexes], workers)
+        rows = [(results[i][0], hashed, results[i][2]) for i, hashed in zip(indexes, hashes)]
+        try:
+            created = users.create_many(rows)
+        except Exception as e:
+            for i in indexes:
+                results[i] = (results[i][0], False, f"Registration failed: {str(e)}")
+            return results
+
+        for i in indexes:
+            username = results[i][0]
+            if username in created:
+                results[i] = (username, True, "Registration successful.")
+            else:
+                results[i] = (username, False, "Username already exists.")
+        return results
+
+    @staticmethod
+    def register_file(path, workers=None, fmt=None):
+        """register_many over a CSV/JSONL file with username, password and (optional) role
+        columns. Returns (line number, username, success, message) per row."""
+        from medplus.importer import read_records
+        lines, accounts = [], []
+        for line_no, record in read_records(path, fmt):
+            if isinstance(record, Exception):
+                record = {}
+            lines.append(line_no)
+            accounts.append(tuple(None if record.get(key) is None else str(record[key])
+                                  for key in ("username", "password", "role")))
+        return [(line_no, *result) for line_no, result in zip(lines, Auth.register_many(accounts, workers))]
+
+    @staticmethod
+    def set_password(username, password):
+        if not password:
+            return False, "Password is required."
+        if not users.exists(username):
+            return False, "User not found."
+        users.set_password_hash(username, Auth.hash_password(password))
+        return True, "Password changed."
+
+    @staticmethod
+    def login(username, password, role='USER', save_hash=None):
+        """(success, message). An outdated hash is upgraded through save_hash(username, hash),
+        by default straight to the users table."""
+        hasher = Auth.hasher()
+        user = users.get_credentials(username)
         
         if not user:
-            return False, "User not found."
+            # Spend as long as a real check would, so response time doesn't reveal
+            # which usernames exist
+            if Auth._dummy_hash is None:
+                Auth._dummy_hash = hasher.hash("not a password")
+            hasher.verify(password, Auth._dummy_hash)
+            return False, LOGIN_FAILED
         
         stored_hash, stored_role = user
-        
+
+        # Password first, and the same answer for every failure: neither the message nor the
+        # order of the checks may tell a stranger that the account exists or what role it has
+        if not hasher.verify(password, stored_hash):
+            return False, LOGIN_FAILED
+
         # Verify role (Admin trying to login as User or vice versa strictly? 
         # Original code had separate login screens. We can keep that logic or unify.
         # Let's enforce role check to match original logic)
         if stored_role != role:
-            return False, f"Invalid role. This account is not a {role}."
+            return False, LOGIN_FAILED
 
-        if Auth.hash_password(password) == stored_hash:
-            return True, "Login successful."
-        else:
-            return False, "Invalid password."
+        # Only now do we know the password: upgrade legacy SHA-256 and outdated hashes
+        if hasher.needs_rehash(stored_hash):
+            try:
+                (save_hash or users.set_password_hash)(username, hasher.hash(password))
+            except Exception as e:
+                print(f"Error upgrading password hash for {username}: {e}")
+        return True, "Login successful."
 
 auth = Auth()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create user accounts in bulk from a CSV/JSONL file.")
+    parser.add_argument("path", help="file with username, password and optional role columns")
+    parser.add_argument("--workers", type=int, help="hashing processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"File not found: {args.path}", file=sys.stderr)
+        return 1
+    results = Auth.register_file(args.path, args.workers)
+    created = sum(1 for _, _, success, _ in results if success)
+    for line_no, username, success, message in results:
+        if not success:
+            print(f"  line {line_no}: {username or '(blank)'}: {message}")
+    print(f"{created} of {len(results)} accounts created")
+    return 0 if created == len(results) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import argparse
+import csv
+import getpass
+import json
+import sys
+import time
+
+# Scriptable administration without the Tk app: python -m medplus <command> ...
+# Everything goes through the same Auth/repository/importer code as the UI. Heavy modules
+# are imported inside the commands, so `--help` and small jobs start instantly.
+
+# Rows per keyset page when listing, and keys per DELETE batch
+LIST_PAGE = 1000
+DELETE_BATCH = 500
+ROLES = ("USER", "ADMIN")
+
+
+def _read_lines(path):
+    """Non-blank, stripped lines of path ('-' is stdin)."""
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8-sig")
+    try:
+        return [line.strip() for line in f if line.strip()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _key_type(table):
+    from medplus.repositories import REPOSITORIES
+    return str if REPOSITORIES[table].key == "username" else int
+
+
+def _report(rejects, limit=100):
+    for line_no, reason in rejects[:limit]:
+        print(f"  line {line_no}: {reason}", file=sys.stderr)
+    if len(rejects) > limit:
+        print(f"  ... and {len(rejects) - limit} more", file=sys.stderr)
+
+
+# --- list ------------------------------------------------------------------------------
+
+def list_rows(table, columns=None, search="", where=None, params=(), order_by=None, descending=False,
+              limit=None, page_size=LIST_PAGE):
+    """Streams rows of table in order through keyset pages; filters combine with AND.
+
+    Arguments are checked up front, so a bad column raises before any row is produced.
+    """
+    from medplus.exporter import resolve_columns, check_condition
+    from medplus.table_model import TABLES, escape_like
+
+    columns = resolve_columns(table, columns)
+    check_condition(table, where)
+    order_by = order_by or None
+    if order_by and order_by not in resolve_columns(table):
+        raise ValueError(f"Cannot order {table} by {order_by}")
+    conditions, values = [], []
+    if search:
+        search_columns = TABLES[table]["search"]
+        conditions.append(" OR ".join(f"{col} LIKE ? ESCAPE '\\'" for col in search_columns))
+        values.extend([f"%{escape_like(search)}%"] * len(search_columns))
+    if where:
+        conditions.append(where)
+        values.extend(params)
+    condition = " AND ".join(f"({c})" for c in conditions) or None
+    return _pages(table, columns, condition, values, order_by, descending, limit, page_size)
+
+
+def _pages(table, columns, condition, values, order_by, descending, limit, page_size):
+    from medplus.database import db
+    after, produced = None, 0
+    while True:
+        size = page_size if limit is None else min(page_size, limit - produced)
+        if size <= 0:
+            return
+        rows, after = db.fetch_page(table, after, size, order_by, columns, descending, condition, values)
+        yield from rows
+        produced += len(rows)
+        if after is None:
+            return
+
+
+def _write_rows(header, rows, fmt):
+    count = 0
+    if fmt == "jsonl":
+        for row in rows:
+            sys.stdout.write(json.dumps(dict(zip(header, row)), ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    print(f"{count} rows", file=sys.stderr)
+    return 0
+
+
+def cmd_list(args):
+    from medplus.exporter import resolve_columns
+    columns = [col.strip() for col in args.columns.split(",")] if args.columns else None
+    header = resolve_columns(args.table, columns)
+    rows = list_rows(args.table, header, args.search, args.where, tuple(args.param), args.order_by,
+                     args.desc, args.limit)
+    return _write_rows(header, rows, args.format)
+
+
+# --- add / update / delete -------------------------------------------------------------
+
+def cmd_add(args):
+    from medplus.importer import import_file
+    summary = import_file(args.path, args.table, args.format)
+    print(summary, file=sys.stderr)
+    return 0 if not summary.rejected else 2
+
+
+def update_records(table, records):
+    """Applies (line number, {key, column: value}) records in one transaction.
+
+    Only the columns a record carries change. Returns (updated, [(line, reason)]).
+    """
+    from medplus.database import db
+    from medplus.importer import validate_record
+    from medplus.repositories import REPOSITORIES
+
+    repository = REPOSITORIES[table]
+    if not repository.writable:
+        raise ValueError(f"{table} rows can't be updated here")
+    key_type = _key_type(table)
+    updated, rejects = 0, []
+    with db.transaction():
+        for line_no, record in records:
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                if not record.get(repository.key):
+                    raise ValueError(f"missing {repository.key}")
+                key = key_type(record[repository.key])
+                # Every column is optional here: blank or absent ones keep their value, while
+                # 0 (the equator, the prime meridian) is a real value
+                values = validate_record(record, [], repository.writable)
+                changes = dict((col, value) for col, value in zip(repository.writable, values) if value is not None)
+                if not changes:
+                    raise ValueError("nothing to change")
+                if repository.update(key, changes) is None:
+                    raise ValueError(f"no {table} row with {repository.key} {key}")
+                updated += 1
+            except ValueError as e:
+                rejects.append((line_no, str(e)))
+    return updated, rejects
+
+
+def cmd_update(args):
+    from medplus.importer import read_records
+    updated, rejects = update_records(args.table, read_records(args.path, args.format))
+    print(f"{args.table}: updated {updated}, rejected {len(rejects)}", file=sys.stderr)
+    _report(rejects)
+    return 0 if not rejects else 2
+
+
+def delete_keys(table, keys, batch_size=DELETE_BATCH):
+    """Deletes rows by key in batches within one transaction; returns how many went."""
+    from medplus.database import db
+    from medplus.repositories import REPOSITORIES
+    repository = REPOSITORIES[table]
+    deleted = 0
+    with db.transaction():
+        for start in range(0, len(keys), batch_size):
+            deleted += repository.delete_many(keys[start:start + batch_size])
+    return deleted
+
+
+def cmd_delete(args):
+    raw = args.keys or _read_lines(args.source or "-")
+    key_type = _key_type(args.table)
+    try:
+        keys = [key_type(key) for key in raw]
+    except ValueError as e:
+        print(f"Bad key: {e}", file=sys.stderr)
+        return 1
+    deleted = delete_keys(args.table, keys)
+    print(f"{args.table}: deleted {deleted} of {len(keys)}", file=sys.stderr)
+    return 0 if deleted == len(keys) else 2
+
+
+# --- users -----------------------------------------------------------------------------
+
+def cmd_users_list(args):
+    where, params = ("role = ?", (args.role,)) if args.role else (None, ())
+    rows = list_rows("users", ["username", "role"], args.search, where, params)
+    return _write_rows(["username", "role"], rows, args.format)
+
+
+def cmd_users_add(args):
+    from medplus.auth import Auth
+    results = Auth.register_file(args.path, args.workers, args.format)
+    created = sum(1 for _, _, success, _ in results if success)
+    _report([(line_no, f"{username or '(blank)'}: {message}")
+             for line_no, username, success, message in results if not success])
+    print(f"users: created {created} of {len(results)}", file=sys.stderr)
+    return 0 if created == len(results) else 2
+
+
+def cmd_users_delete(args):
+    deleted = delete_keys("users", args.usernames)
+    print(f"users: deleted {deleted} of {len(args.usernames)}", file=sys.stderr)
+    return 0 if deleted == len(args.usernames) else 2
+
+
+def cmd_users_role(args):
+    from medplus.repositories import users
+    user = users.set_role(args.username, args.role)
+    if user is None:
+        print(f"User not found: {args.username}", file=sys.stderr)
+        return 1
+    print(f"{user.username} is now {user.role}", file=sys.stderr)
+    return 0
+
+
+def cmd_users_password(args):
+    from medplus.auth import Auth
+    # From stdin so it never shows up in the process list or shell history
+    lines = sys.stdin.read().splitlines() if not sys.stdin.isatty() else [getpass.getpass()]
+    success, message = Auth.set_password(args.username, lines[0] if lines else "")
+    print(message, file=sys.stderr)
+    return 0 if success else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m medplus", description="MedPlus administration from the command line.")
+    parser.add_argument("--db", help="database file (default: medplus.db)")
+    parser.add_argument("--time", action="store_true", help="print how long the command took")
+    commands = parser.add_subparsers(dest="command", required=True)
+    tables = ["hospitals", "emergency_contacts", "personal_contacts"]
+    formats = ["csv", "jsonl"]
+
+    p = commands.add_parser("list", help="print rows as CSV/JSONL")
+    p.add_argument("table", choices=tables + ["users"])
+    p.add_argument("--columns", help="comma separated column list")
+    p.add_argument("--search", default="", help="substring matched against the searchable columns")
+    p.add_argument("--where", help="SQL condition, e.g. \"name LIKE ?\"")
+    p.add_argument("--param", action="append", default=[], help="value for a ? in --where (repeatable)")
+    p.add_argument("--order-by")
+    p.add_argument("--desc", action="store_true")
+    p.add_argument("--limit", type=int)
+    p.add_argument("--format", choices=formats, default="csv")
+    p.set_defaults(func=cmd_list)
+
+    p = commands.add_parser("add", help="create rows from a CSV/JSONL file or stdin")
+    p.add_argument("table", choices=tables)
+    p.add_argument("path", nargs="?", default="-", help="file, or - for stdin (default)")
+    p.add_argument("--format", choices=formats, help="default: guessed from the file name, csv for stdin")
+    p.set_defaults(func=cmd_add)
+
+    p = commands.add_parser("update", help="change rows: records carry the id plus the columns to set")
+    p.add_argument("table", choices=tables)
+    p.add_argument("path", nargs="?", default="-", help="file, or - for stdin (default)")
+    p.add_argument("--format", choices=formats)
+    p.set_defaults(func=cmd_update)
+
+    p = commands.add_parser("delete", help="delete rows by id")
+    p.add_argument("table", choices=tables)
+    p.add_argument("keys", nargs="*", help="ids; read one per line from --from/stdin if none are given")
+    p.add_argument("--from", dest="source", help="file of ids, one per line (- for stdin)")
+    p.set_defaults(func=cmd_delete)
+
+    users = commands.add_parser("users", help="user management").add_subparsers(dest="action", required=True)
+    p = users.add_parser("list")
+    p.add_argument("--role", choices=ROLES, type=str.upper)
+    p.add_argument("--search", default="")
+    p.add_argument("--format", choices=formats, default="csv")
+    p.set_defaults(func=cmd_users_list)
+    p = users.add_parser("add", help="create accounts from username,password[,role] records")
+    p.add_argument("path", nargs="?", default="-")
+    p.add_argument("--format", choices=formats)
+    p.add_argument("--workers", type=int, help="hashing processes (default: one per core)")
+    p.set_defaults(func=cmd_users_add)
+    p = users.add_parser("delete")
+    p.add_argument("usernames", nargs="+")
+    p.set_defaults(func=cmd_users_delete)
+    p = users.add_parser("set-role")
+    p.add_argument("username")
+    p.add_argument("role", choices=ROLES, type=str.upper)
+    p.set_defaults(func=cmd_users_role)
+    p = users.add_parser("set-password", help="new password read from stdin")
+    p.add_argument("username")
+    p.set_defaults(func=cmd_users_password)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start = time.perf_counter()
+    if args.db:
+        from medplus.database import db
+        db.configure(path=args.db)
+    try:
+        status = args.func(args)
+    except FileNotFoundError as e:
+        print(f"File not found: {e.filename}", file=sys.stderr)
+        status = 1
+    except Exception as e:
+        # Writes run in a single transaction, so a failure leaves the database untouched
+        print(f"{args.command} failed: {e}", file=sys.stderr)
+        status = 1
+    if args.time:
+        print(f"{(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    return status
@@ -0,0 +1,185 @@
+import http.client
+import json
+import os
+import threading
+from urllib.parse import urlsplit, urlencode
+from medplus.repositories import REPOSITORIES
+from medplus.search import SearchResult, SearchResults, DEFAULT_LIMIT
+from medplus.table_model import TableModel, set_model_factory
+
+# Client side of medplus/server.py: the same calls the desktop makes locally, as HTTP/JSON
+# requests to the station that owns the database.
+TIMEOUT = 15
+# Rows per request when streaming a whole table (quick dial)
+SCAN_LIMIT = 1000
+TOKEN_ENV = "MEDPLUS_SERVER_TOKEN"
+
+
+class ServerError(RuntimeError):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Client:
+    """Talks to a MedPlus server. Login/register/search mirror auth.login, auth.register
+    and search.search, so the UI can call either."""
+    def __init__(self, url, token=None, timeout=TIMEOUT):
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV)
+        self.timeout = timeout
+        self.session = None  # From login(); the server wants it on everything else
+        self._local = threading.local()  # One keep-alive connection per thread
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            with self._lock:
+                self._connections.add(conn)
+        return conn
+
+    def _drop_connection(self, conn):
+        conn.close()
+        self._local.conn = None
+        with self._lock:
+            self._connections.discard(conn)
+
+    def request(self, method, path, params=None, body=None, session=None):
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        session = session or self.session
+        if session:
+            headers["X-MedPlus-Session"] = session
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, payload, headers)
+                response = conn.getresponse()
+                data = json.loads(response.read() or b"{}")
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server may have dropped an idle keep-alive connection. Only reads are
+                # retried: a write may have been applied before the connection went
+                self._drop_connection(conn)
+                if attempt or method != "GET":
+                    raise
+        if response.status != 200:
+            raise ServerError(response.status, data.get("error", f"HTTP {response.status}"))
+        return data
+
+    def close(self):
+        """Closes every thread's connection; the next request reconnects."""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    # --- same shape as the local modules -----------------------------------------------
+
+    def login(self, username, password, role='USER'):
+        result = self.request("POST", "/auth/login", body={"username": username, "password": password, "role": role})
+        if result["success"]:
+            self.session = result["session"]
+        return result["success"], result["message"]
+
+    def logout(self):
+        # Forget the session first, so a login that overtakes this call keeps its own
+        session, self.session = self.session, None
+        if session:
+            self.request("POST", "/auth/logout", session=session)
+
+    def register(self, username, password, role='USER'):
+        result = self.request("POST", "/auth/register", body={"username": username, "password": password, "role": role})
+        return result["success"], result["message"]
+
+    def search(self, text, limit=DEFAULT_LIMIT, tables=None):
+        params = {"q": text, "limit": limit}
+        if tables:
+            params["tables"] = ",".join(tables)
+        reply = self.request("GET", "/search", params)
+        return SearchResults((SearchResult(*row) for row in reply["results"]), reply.get("too_broad", ()))
+
+    def data_version(self):
+        return tuple(self.request("GET", "/version")["version"])
+
+    def install(self):
+        """Points every table view (and quick dial) at the server instead of the database file."""
+        set_model_factory(lambda table_name, spec: RemoteTableModel(self, table_name, spec))
+
+
+class RemoteRepository:
+    """The parts of a Repository the UI uses, over HTTP."""
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.writable = list(REPOSITORIES[table].writable)
+        self.row_type = REPOSITORIES[table].row_type
+
+    def iter_all(self):
+        after = None
+        while True:
+            params = {"limit": SCAN_LIMIT}
+            if after is not None:
+                params["after"] = json.dumps(after)
+            result = self.client.request("GET", f"/tables/{self.table}/scan", params)
+            yield from map(self.row_type._make, result["rows"])
+            after = result["next"]
+            if after is None:
+                return
+
+    def get(self, key):
+        row = self.client.request("GET", f"/tables/{self.table}/get", {"key": json.dumps(key)})["row"]
+        return self.row_type._make(row) if row is not None else None
+
+
+class RemoteTableModel(TableModel):
+    """TableModel whose pages and writes go to the server; caching and events are unchanged."""
+    def __init__(self, client, table_name, spec):
+        super().__init__(table_name, spec["select"], spec["key"], spec["insert"],
+                         spec["sortable"], spec["search"])
+        self.client = client
+        self.repository = RemoteRepository(client, table_name)
+        self._path = f"/tables/{table_name}"
+        self._last_write_version = None
+
+    def count_rows(self, search=""):
+        return self.client.request("GET", f"{self._path}/count", {"search": search})["total"]
+
+    def query_page(self, page, order_by=None, descending=False, search="", after=None):
+        params = {"page": page, "descending": int(bool(descending)), "search": search}
+        if order_by:
+            params["order_by"] = order_by
+        if after is not None:
+            params["after"] = json.dumps(after)
+        return [tuple(row) for row in self.client.request("GET", f"{self._path}/page", params)["rows"]]
+
+    def data_version(self):
+        return self.client.data_version()
+
+    def _written_version(self):
+        # Came back with the write itself; asking the server again here would block the Tk thread
+        return self._last_write_version
+
+    def _write(self, action, body):
+        reply = self.client.request("POST", f"{self._path}/{action}", body=body)
+        self._last_write_version = tuple(reply["version"])
+        return reply
+
+    def write_insert(self, values):
+        return tuple(self._write("insert", {"values": list(values)})["row"])
+
+    def write_update(self, key, changes):
+        row = self._write("update", {"key": key, "changes": changes})["row"]
+        return tuple(row) if row is not None else None
+
+    def write_delete(self, keys):
+        return self._write("delete", {"keys": list(keys)})["deleted"]
@@ -1,83 +1,470 @@
 import sqlite3
 import os
+import re
+import threading
+import weakref
+from contextlib import contextmanager
+from medplus.query_cache import QueryCache, classify
+from medplus import migrations
+from medplus.migrations import FTS_TABLES
 
 DB_NAME = "medplus.db"
 
+# PRAGMAs applied to every pooled connection. WAL lets readers keep reading while a
+# writer commits; synchronous=NORMAL is durable across app crashes in WAL mode and only
+# risks the last transactions on power loss. cache_size is in KiB when negative.
+PROFILES = {
+    "desktop": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "server": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -128000,
+        "mmap_size": 512 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+    # Flaky power or a database file on a network share: fsync every commit and use a
+    # rollback journal, since WAL needs shared memory that network filesystems don't give
+    # (several machines on one file should use server.py instead)
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -8000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 10000,
+    },
+}
+DEFAULT_PROFILE = os.environ.get("MEDPLUS_DB_PROFILE", "desktop")
+
+# Prepared statements sqlite3 keeps per connection; the repositories' fixed SQL stays warm
+STATEMENT_CACHE_SIZE = 256
+
+# Maximum connections open at once (one per thread using the database)
+POOL_SIZE = 8
+# Seconds a thread waits for a free connection before giving up
+POOL_TIMEOUT = 30
+
+# Result cache in front of fetch_one/fetch_all; 0 entries turns it off
+QUERY_CACHE_ENTRIES = int(os.environ.get("MEDPLUS_QUERY_CACHE", "512"))
+QUERY_CACHE_BYTES = 16 * 1024 * 1024
+
+# Rows pulled per fetchmany() call by fetch_iter
+FETCH_CHUNK_SIZE = 1000
+# Default page length for fetch_page
+PAGE_LIMIT = 200
+# Unique key that keyset pagination falls back to, per table (id everywhere else)
+TABLE_KEYS = {"users": "username"}
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_]\w*$")
+
+class _ThreadToken:
+    """Weak-referenceable marker tied to the lifetime of one thread's locals."""
+
+
 class Database:
-    def __init__(self):
-        self.conn = None
-        self.cursor = None
+    """SQLite access with one pooled connection per thread.
+
+    conn and cursor always refer to the calling thread's own connection, so background
+    threads can use the same Database object safely. Connections come from a bounded pool
+    and go back to it when the thread ends (or calls release_connection()).
+    """
+    def __init__(self, path=DB_NAME, profile=DEFAULT_PROFILE, pool_size=POOL_SIZE,
+                 cache_entries=QUERY_CACHE_ENTRIES, cache_bytes=QUERY_CACHE_BYTES):
+        self.path = path
+        self.profile_name = profile
+        self.pragmas = PROFILES[profile]
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle = []
+        self._all = []
+        self._checked_out = {}  # id(conn) -> finalizer returning it when its thread dies
+        self._pool_lock = threading.Lock()
+        # Commits made through this object, by any thread; they invalidate the cache table
+        # by table in _note_write, so they don't count as external writes
+        self._commits = 0
+        self._commit_lock = threading.Lock()
+        self._versions = {}  # id(conn) -> (data_version, _commits) at its last check
+        self.cache = None
+        if cache_entries > 0:
+            # Writes to a table also rewrite its FTS index through triggers
+            related = dict((table, [f"{table}_fts"]) for table in FTS_TABLES)
+            self.cache = QueryCache(cache_entries, cache_bytes, related)
         self.connect()
         self.create_tables()
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(DB_NAME)
-            self.cursor = self.conn.cursor()
+            self.conn
         except sqlite3.Error as e:
             print(f"Database connection error: {e}")
 
+    @property
+    def conn(self):
+        """The calling thread's connection, checked out of the pool on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._checkout()
+        return conn
+
+    @property
+    def cursor(self):
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self.conn.cursor()
+        return cursor
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=POOL_TIMEOUT):
+            raise sqlite3.OperationalError(f"All {self.pool_size} database connections are in use")
+        try:
+            with self._pool_lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self._local.conn = conn
+        self._local.cursor = None
+        self._local.tx_depth = 0
+        self._local.tx_written = set()
+        # The token lives only in this thread's locals, which Python clears when the thread
+        # exits; the connection then goes back to the pool by itself.
+        token = self._local.token = _ThreadToken()
+        finalizer = weakref.finalize(token, self._checkin, conn)
+        finalizer.atexit = False
+        with self._pool_lock:
+            self._checked_out[id(conn)] = finalizer
+        return conn
+
+    def _open(self):
+        # Pooled connections move between threads, but only ever serve one at a time
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._pool_lock:
+            self._all.append(conn)
+        return conn
+
+    def _checkin(self, conn):
+        with self._pool_lock:
+            if self._checked_out.pop(id(conn), None) is None:
+                return # Already returned, or the pool was closed
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.append(conn)
+        self._slots.release()
+
+    def release_connection(self):
+        """Returns the calling thread's connection to the pool (e.g. at the end of a worker task)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        with self._pool_lock:
+            finalizer = self._checked_out.get(id(conn))
+        if finalizer is not None:
+            finalizer.detach()
+        self._local.conn = None
+        self._local.cursor = None
+        self._local.tx_depth = 0
+        self._local.tx_written = set()
+        self._local.token = None
+        self._checkin(conn)
+
     def create_tables(self):
-        # Users table (Admin/User)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                username TEXT PRIMARY KEY,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL CHECK(role IN ('USER', 'ADMIN'))
-            )
-        """)
-
-        # Hospitals table
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS hospitals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                address TEXT NOT NULL,
-                contact TEXT NOT NULL
-            )
-        """)
-
-        # Emergency Contacts table
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS emergency_contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                contact_no TEXT NOT NULL
-            )
-        """)
-        
-        # User Personal Contacts table (for specific users if needed, or global)
-        # The original code had "Contact_List" for users. Let's keep it simple for now.
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS personal_contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                contact_no TEXT NOT NULL
-            )
-        """)
-        
-        self.conn.commit()
+        """Applies any pending schema migrations (a single pragma read when up to date)."""
+        try:
+            applied = migrations.migrate(self.conn)
+        except sqlite3.Error as e:
+            print(f"Database migration error: {e}")
+            return
+        if applied and self.cache is not None:
+            self.cache.clear()
+
+    def create_fts_index(self, table, columns):
+        """(Re)creates the FTS5 table and sync triggers for table; see migrations.create_fts_index."""
+        migrations.create_fts_index(self.cursor, table, columns)
+
+    @contextmanager
+    def transaction(self):
+        """Groups every statement in the block into one commit; rolls back on any error.
+
+        Inside the block execute_query/execute_many don't commit and raise instead of
+        printing, so a failed step undoes the whole unit of work. Blocks may nest; only the
+        outermost one commits.
+
+            with db.transaction():
+                db.execute_query("DELETE FROM hospitals WHERE id = ?", (1,))
+                db.execute_many("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", rows)
+        """
+        conn = self.conn
+        if self._local.tx_depth == 0:
+            conn.execute("BEGIN")
+        self._local.tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._local.tx_depth -= 1
+            if self._local.tx_depth == 0:
+                conn.rollback()
+                self._end_transaction()
+            raise
+        self._local.tx_depth -= 1
+        if self._local.tx_depth == 0:
+            self._commit(conn)
+            self._end_transaction()
+
+    def _commit(self, conn):
+        wrote = conn.in_transaction
+        conn.commit()
+        if wrote:
+            with self._commit_lock:
+                self._commits += 1
+
+    def _end_transaction(self):
+        # Another thread may have cached the pre-commit rows after our write invalidated them
+        written, self._local.tx_written = self._local.tx_written, set()
+        if written and self.cache is not None:
+            self.cache.invalidate(written)
+
+    @property
+    def in_transaction(self):
+        """True while the calling thread is inside a transaction() block."""
+        return getattr(self._local, "tx_depth", 0) > 0
 
     def execute_query(self, query, params=()):
         try:
             self.cursor.execute(query, params)
-            self.conn.commit()
+            self._note_write(query)
+            if not self.in_transaction:
+                self._commit(self.conn)
             return self.cursor
         except sqlite3.Error as e:
+            if self.in_transaction:
+                raise
             print(f"Query error: {e}")
             return None
 
-    def fetch_one(self, query, params=()):
+    def execute_many(self, query, seq_of_params):
+        """Runs one statement for every parameter set, with a single commit at the end."""
+        try:
+            self.cursor.executemany(query, seq_of_params)
+            self._note_write(query)
+            if not self.in_transaction:
+                self._commit(self.conn)
+            return self.cursor
+        except sqlite3.Error as e:
+            if self.in_transaction:
+                raise
+            self.conn.rollback()
+            print(f"Query error: {e}")
+            return None
+
+    def _note_write(self, query):
+        """Invalidates cached results that read whatever query just changed."""
+        if self.cache is None:
+            return
+        kind, _, tables = classify(query)
+        if kind == "write":
+            self.cache.invalidate(tables)
+            if self.in_transaction:
+                self._local.tx_written.update(tables)
+        elif kind == "unknown":
+            self.cache.clear()
+
+    def _check_external_writes(self):
+        # Another connection's commit moves PRAGMA data_version. If one of our own pooled
+        # connections committed since this one last looked, _note_write has already dropped
+        # the affected tables, so keep the rest of the cache. Otherwise the change came from
+        # outside this process (importer, CLI) and nothing cached can be trusted. A
+        # connection's first reading has nothing to compare with and is treated the same.
+        # The counter is read before the version, so a commit racing the check only ever
+        # makes it clear too much.
+        conn = self.conn
+        commits = self._commits
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        seen = self._versions.get(id(conn))
+        if seen is None or (version != seen[0] and commits == seen[1]):
+            self.cache.clear()
+        if seen != (version, commits):
+            self._versions[id(conn)] = (version, commits)
+
+    def _fetch(self, query, params, read, default):
+        cache = self.cache
+        # Inside a transaction we may see our own uncommitted rows: never cache those
+        if cache is None or self.in_transaction:
+            cursor = self.execute_query(query, params)
+            return read(cursor) if cursor else default
+
+        kind, sql, tables = classify(query)
+        if kind != "read":
+            cursor = self.execute_query(query, params)
+            return read(cursor) if cursor else default
+
+        self._check_external_writes()
+        key = cache.make_key(sql, params)
+        hit, value = cache.get(key)
+        if hit:
+            return value
+        epoch = cache.epoch
         cursor = self.execute_query(query, params)
-        return cursor.fetchone() if cursor else None
+        if not cursor:
+            return default
+        value = read(cursor)
+        cache.put(key, tables, value, epoch)
+        return value
+
+    def fetch_one(self, query, params=()):
+        return self._fetch(query, params, lambda cursor: cursor.fetchone(), None)
 
     def fetch_all(self, query, params=()):
-        cursor = self.execute_query(query, params)
-        return cursor.fetchall() if cursor else []
+        # Cached as a tuple; callers get their own list they are free to modify
+        return list(self._fetch(query, params, lambda cursor: tuple(cursor.fetchall()), ()))
+
+    def fetch_iter(self, query, params=(), chunk_size=FETCH_CHUNK_SIZE):
+        """Yields the rows of query one by one, pulling chunk_size at a time off the cursor.
+
+        Memory stays flat however large the result. Uses its own cursor, so other queries
+        may run while iterating; the read sees one consistent snapshot. Errors are raised,
+        not printed, and results are never cached.
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def fetch_page(self, table, after_key=None, limit=PAGE_LIMIT, order_by=None, columns=None,
+                   descending=False, where=None, params=()):
+        """One page of table in keyset order: the limit rows that follow after_key.
+
+        Seeks straight to the page through the index instead of skipping OFFSET rows, so
+        page 10,000 costs the same as page 1. Ordering is by the table's key (id, or
+        username for users) unless order_by names another column, in which case the key
+        breaks ties and after_key is an (order_by value, key) pair. Returns
+        (rows, next_after_key); next_after_key is None after the last page.
+
+            rows, after = db.fetch_page("hospitals")
+            while after is not None:
+                rows, after = db.fetch_page("hospitals", after)
+        """
+        key = TABLE_KEYS.get(table, "id")
+        order_by = order_by or key
+        columns = list(columns) if columns else ["*"]
+        for name in [table, order_by] + [col for col in columns if col != "*"]:
+            if not _IDENTIFIER.match(name):
+                raise ValueError(f"Invalid identifier: {name!r}")
+
+        sort = [order_by] if order_by == key else [order_by, key]
+        direction = "DESC" if descending else "ASC"
+        conditions = [f"({where})"] if where else []
+        values = list(params)
+        if after_key is not None:
+            after = [after_key] if len(sort) == 1 else list(after_key)
+            op = '<' if descending else '>'
+            if len(sort) == 1:
+                conditions.append(f"{key} {op} ?")
+                values.extend(after)
+            elif after[0] is None:
+                # Comparing with NULL is never true; NULLs sort first ascending and last
+                # descending, so the page can only continue among the NULLs (by key) or,
+                # ascending, move on to the non-NULL values
+                tail = f" OR {order_by} IS NOT NULL" if not descending else ""
+                conditions.append(f"(({order_by} IS NULL AND {key} {op} ?){tail})")
+                values.append(after[1])
+            else:
+                # Row value comparison walks the (order_by, key) index from the last row seen
+                tail = f" OR {order_by} IS NULL" if descending else ""
+                conditions.append(f"(({order_by}, {key}) {op} (?, ?){tail})")
+                values.extend(after)
+        clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = ", ".join(f"{col} {direction}" for col in sort)
+        # The sort columns lead each row so the next key can be read whatever was selected
+        fetched = self.fetch_all(f"SELECT {', '.join(sort + columns)} FROM {table}{clause} ORDER BY {order} LIMIT ?",
+                                 (*values, limit))
+        width = len(sort)
+        rows = [row[width:] for row in fetched]
+        if len(fetched) < limit:
+            return rows, None
+        last = fetched[-1][:width]
+        return rows, last[0] if width == 1 else tuple(last)
+
+    def cache_stats(self):
+        """Hit/miss counters of the query result cache (empty if it is disabled)."""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def data_version(self):
+        """Token that changes whenever the database content may have changed.
+
+        PRAGMA data_version only moves for commits made by *other* connections, so it is
+        paired with this connection's own total_changes counter.
+        """
+        row = self.fetch_one("PRAGMA data_version")
+        return (row[0] if row else None, self.conn.total_changes)
 
     def close(self):
-        if self.conn:
-            self.conn.close()
+        with self._pool_lock:
+            connections, self._all, self._idle = self._all, [], []
+            finalizers, self._checked_out = list(self._checked_out.values()), {}
+        for finalizer in finalizers:
+            finalizer.detach()
+        for conn in connections:
+            conn.close()
+        if self.cache is not None:
+            self.cache.clear()
+        self._versions = {}
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+
+class LazyDatabase:
+    """Stands in for the Database singleton until something actually uses it.
+
+    Importing a module that does `from medplus.database import db` no longer opens a
+    file or runs migrations; the first attribute access does (once, thread-safely).
+    configure() may change the path/profile before that happens.
+    """
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._instance = None
+        self._init_lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        if self._instance is not None:
+            raise RuntimeError("Database already opened; configure() must come before first use")
+        self._kwargs.update(kwargs)
+
+    @property
+    def initialized(self):
+        return self._instance is not None
+
+    def get(self):
+        """The real Database, opening it on first call."""
+        instance = self._instance
+        if instance is None:
+            with self._init_lock:
+                if self._instance is None:
+                    self._instance = Database(**self._kwargs)
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, name):
+        # Only reached for attributes the proxy itself doesn't have
+        return getattr(self.get(), name)
 
-# Singleton instance
-db = Database()
+# Singleton instance, opened on first use
+db = LazyDatabase()
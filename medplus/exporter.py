@@ -0,0 +1,143 @@
+import argparse
+import csv
+import gzip
+import json
+import re
+import sys
+from itertools import islice
+from medplus.database import db
+
+# Columns that may be exported per table, in default order. users never exposes password_hash.
+EXPORT_TABLES = {
+    "hospitals": ["id", "name", "address", "contact", "latitude", "longitude"],
+    "emergency_contacts": ["id", "name", "contact_no"],
+    "personal_contacts": ["id", "name", "contact_no"],
+    "users": ["username", "role"],
+}
+# Columns that must not even be looked at through a condition
+HIDDEN_COLUMNS = {"users": ["password_hash"]}
+
+# A condition filters the exported table; anything that could read another table or run a
+# second statement is refused. Values belong in ? parameters, not in the condition text.
+_UNSAFE_CONDITION = re.compile(r";|--|/\*|\b(select|union|intersect|except|with|attach|pragma|values)\b", re.I)
+
+# Rows pulled from the cursor per fetchmany call
+CHUNK_SIZE = 5000
+# Fast gzip level: nightly extracts should be bound by disk, not by the compressor
+GZIP_LEVEL = 1
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    return "jsonl" if name.endswith((".jsonl", ".json", ".ndjson")) else "csv"
+
+
+def _open_output(path, compress):
+    if path == "-":
+        if compress:
+            # Closing the gzip stream writes its trailer but leaves stdout open
+            sys.stdout.flush()
+            return gzip.open(sys.stdout.buffer, "wt", encoding="utf-8", newline="", compresslevel=GZIP_LEVEL), True
+        return sys.stdout, False
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=GZIP_LEVEL), True
+    return open(path, "w", encoding="utf-8", newline=""), True
+
+
+def resolve_columns(table, columns=None):
+    """Validates a column selection against the exportable columns of table."""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Cannot export {table!r}")
+    allowed = EXPORT_TABLES[table]
+    if not columns:
+        return list(allowed)
+    unknown = [col for col in columns if col not in allowed]
+    if unknown:
+        raise ValueError(f"Cannot export column(s) {', '.join(unknown)} of {table}")
+    return list(columns)
+
+
+def check_condition(table, where):
+    """Raises ValueError unless where is a plain filter on table's own exportable columns."""
+    if not where:
+        return
+    if _UNSAFE_CONDITION.search(where):
+        raise ValueError("Conditions may only compare columns (no subqueries, UNION, ; or comments); "
+                         "pass values as ? parameters")
+    for column in HIDDEN_COLUMNS.get(table, []):
+        if re.search(rf"\b{column}\b", where, re.I):
+            raise ValueError(f"Cannot filter {table} on {column}")
+
+
+def iter_rows(table, columns, where=None, params=(), chunk_size=CHUNK_SIZE):
+    """Yields chunks of rows streamed off the database, never the whole result."""
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        query += f" WHERE {where}"
+    rows = db.fetch_iter(query, params, chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def export_table(table, path, fmt=None, columns=None, where=None, params=(), compress=None, chunk_size=CHUNK_SIZE):
+    """Writes table to path as CSV or JSONL, optionally gzip compressed, in constant memory.
+
+    where is an SQL condition on the table's own columns (see check_condition) whose ?
+    placeholders are bound from params. Returns the number of rows written.
+    """
+    columns = resolve_columns(table, columns)
+    check_condition(table, where)
+    fmt = fmt or detect_format(path)
+    if compress is None:
+        compress = path.endswith(".gz")
+
+    f, should_close = _open_output(path, compress)
+    written = 0
+    try:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for rows in iter_rows(table, columns, where, params, chunk_size):
+                writer.writerows(rows)
+                written += len(rows)
+        else:
+            for rows in iter_rows(table, columns, where, params, chunk_size):
+                f.write("".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows))
+                written += len(rows)
+    finally:
+        if should_close:
+            f.close()
+            if path == "-":
+                sys.stdout.buffer.flush()
+        else:
+            f.flush()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a MedPlus table to CSV/JSONL.")
+    parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    parser.add_argument("path", help="output file ('.gz' suffix compresses), or - for stdout")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: guessed from the file name")
+    parser.add_argument("--columns", help="comma separated column list")
+    parser.add_argument("--where", help="SQL condition, e.g. \"name LIKE ?\"")
+    parser.add_argument("--param", action="append", default=[], help="value for a ? in --where (repeatable)")
+    parser.add_argument("--gzip", action="store_true", help="compress even without a .gz suffix")
+    args = parser.parse_args(argv)
+
+    columns = [col.strip() for col in args.columns.split(",")] if args.columns else None
+    try:
+        written = export_table(args.table, args.path, args.format, columns, args.where, tuple(args.param),
+                               compress=True if args.gzip else None)
+    except Exception as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    print(f"{args.table}: exported {written} rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
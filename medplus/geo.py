@@ -0,0 +1,323 @@
+import heapq
+import math
+import threading
+from collections import namedtuple
+from medplus.table_model import get_model
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the pure-Python path gives the same answers, only slower
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+# Grid cell edge in degrees (about 28 km north-south): a query near a city touches a
+# handful of cells, and a cell rarely holds more than a few thousand hospitals
+CELL_DEGREES = 0.25
+DEFAULT_K = 10
+
+NearbyHospital = namedtuple("NearbyHospital", ["id", "name", "address", "contact", "latitude", "longitude",
+                                               "distance_km"])
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from (lat, lon) to every (lats[i], lons[i]).
+
+    One vectorized pass with NumPy (array in, array out); a plain loop otherwise.
+    """
+    if np is not None:
+        lat1, lon1 = math.radians(lat), math.radians(lon)
+        lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    cos_lat1 = math.cos(lat1)
+    sin, cos, radians = math.sin, math.cos, math.radians
+    distances = []
+    for lat2, lon2 in zip(lats, lons):
+        lat2, lon2 = radians(lat2), radians(lon2)
+        a = sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
+
+
+class GridIndex:
+    """Points bucketed into fixed latitude/longitude cells.
+
+    add/remove only touch one cell, so the index follows edits without a rebuild. Queries
+    gather the cells around the point, ring by ring, and rank the candidates with one
+    vectorized haversine; everything further away is never looked at.
+    """
+    def __init__(self, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.rows = int(math.ceil(180 / cell_degrees))
+        self.cols = int(math.ceil(360 / cell_degrees))
+        self._cells = {}  # (row, col) -> [keys, lats, lons, cached arrays or None]
+        self._where = {}  # key -> (row, col)
+
+    def __len__(self):
+        return len(self._where)
+
+    def _cell_of(self, lat, lon):
+        row = min(int((lat + 90) / self.cell_degrees), self.rows - 1)
+        col = int(((lon + 180) % 360) / self.cell_degrees) % self.cols
+        return row, col
+
+    def add(self, key, lat, lon):
+        """Adds or moves key; a missing coordinate just removes it."""
+        self.remove(key)
+        if lat is None or lon is None:
+            return
+        cell_key = self._cell_of(lat, lon)
+        cell = self._cells.get(cell_key)
+        if cell is None:
+            cell = self._cells[cell_key] = [[], [], [], None]
+        cell[0].append(key)
+        cell[1].append(float(lat))
+        cell[2].append(float(lon))
+        cell[3] = None
+        self._where[key] = cell_key
+
+    def remove(self, key):
+        cell_key = self._where.pop(key, None)
+        if cell_key is None:
+            return
+        cell = self._cells[cell_key]
+        i = cell[0].index(key)
+        for values in cell[:3]:
+            values.pop(i)
+        cell[3] = None
+        if not cell[0]:
+            del self._cells[cell_key]
+
+    def _arrays(self, cell):
+        if cell[3] is None:
+            cell[3] = (np.array(cell[0]), np.array(cell[1]), np.array(cell[2])) if np is not None else cell[:3]
+        return cell[3]
+
+    def _gather(self, cells):
+        """(keys, lats, lons) of every point in cells, as arrays when NumPy is available."""
+        parts = [self._arrays(cell) for cell in cells]
+        if np is not None:
+            if not parts:
+                return np.array([]), np.array([]), np.array([])
+            return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
+        keys, lats, lons = [], [], []
+        for part in parts:
+            keys.extend(part[0])
+            lats.extend(part[1])
+            lons.extend(part[2])
+        return keys, lats, lons
+
+    def _ring(self, row0, col0, r):
+        """Cells exactly r steps (Chebyshev) from (row0, col0); longitude wraps around."""
+        if r == 0:
+            return [(row0, col0)]
+        cells = []
+        for row in range(row0 - r, row0 + r + 1):
+            if 0 <= row < self.rows:
+                step = 1 if row in (row0 - r, row0 + r) else 2 * r
+                for col in range(col0 - r, col0 + r + 1, step):
+                    cells.append((row, col % self.cols))
+        return cells
+
+    def _clearance_km(self, lat, row0, r):
+        """Lower bound on the distance from a point in cell row0 to anything outside the
+        block of cells at most r steps away."""
+        if r == 0:
+            return 0.0
+        span = math.radians(r * self.cell_degrees)
+        north_south = EARTH_RADIUS_KM * span
+        if 2 * r + 1 >= self.cols:
+            return north_south  # Every longitude is covered
+        # Points beyond the block east or west lie within its latitude band; the band edge
+        # nearest a pole has the shortest degree of longitude
+        edge = max(abs(-90 + (row0 - r) * self.cell_degrees), abs(-90 + (row0 + r + 1) * self.cell_degrees))
+        shrink = math.sqrt(max(0.0, math.cos(math.radians(lat)) * math.cos(math.radians(min(edge, 90.0)))))
+        east_west = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, shrink * math.sin(span / 2)))
+        return min(north_south, east_west)
+
+    def _rank(self, lat, lon, keys, lats, lons, k=None, max_km=None):
+        """[(key, km)] closest first, at most k, none beyond max_km."""
+        distances = haversine_km(lat, lon, lats, lons)
+        if np is not None:
+            if k is not None and k < len(distances):
+                # Only the k winners get sorted
+                nearest = np.argpartition(distances, k - 1)[:k]
+                order = nearest[np.argsort(distances[nearest], kind="stable")]
+            else:
+                order = np.argsort(distances, kind="stable")
+            pairs = [(keys[i].item(), float(distances[i])) for i in order]
+        else:
+            pairs = list(zip(keys, distances))
+            pairs = heapq.nsmallest(k, pairs, key=lambda pair: pair[1]) if k is not None else sorted(
+                pairs, key=lambda pair: pair[1])
+        if max_km is not None:
+            pairs = [pair for pair in pairs if pair[1] <= max_km]
+        return pairs
+
+    def nearest(self, lat, lon, k=DEFAULT_K, max_km=None):
+        """The k points closest to (lat, lon) as [(key, km)], closest first."""
+        if k <= 0 or not self._where:
+            return []
+        row0, col0 = self._cell_of(lat, lon)
+        cells, seen, found, r = [], set(), 0, 0
+        while True:
+            if (2 * r + 1) ** 2 >= len(self._cells):
+                # Walking further rings would cost more than looking at every occupied cell
+                return self._rank(lat, lon, *self._gather(self._cells.values()), k=k, max_km=max_km)
+            for cell_key in self._ring(row0, col0, r):
+                cell = self._cells.get(cell_key)
+                if cell is not None and cell_key not in seen:  # Wide rings wrap onto themselves
+                    seen.add(cell_key)
+                    cells.append(cell)
+                    found += len(cell[0])
+            clearance = self._clearance_km(lat, row0, r)
+            if max_km is not None and clearance > max_km:
+                break
+            if found >= k:
+                keys, lats, lons = self._gather(cells)
+                ranked = self._rank(lat, lon, keys, lats, lons, k=k)
+                # Anything in an unvisited cell is at least `clearance` away
+                if ranked[-1][1] <= clearance:
+                    return [pair for pair in ranked if max_km is None or pair[1] <= max_km]
+            r += 1
+        return self._rank(lat, lon, *self._gather(cells), k=k, max_km=max_km)
+
+    def within(self, lat, lon, radius_km, limit=None):
+        """Every point within radius_km of (lat, lon) as [(key, km)], closest first."""
+        if radius_km < 0 or not self._where:
+            return []
+        angle = radius_km / EARTH_RADIUS_KM
+        dlat = math.degrees(angle)
+        row_lo, _ = self._cell_of(max(-90.0, lat - dlat), lon)
+        row_hi, _ = self._cell_of(min(90.0, lat + dlat), lon)
+        cos_lat = math.cos(math.radians(lat))
+        if abs(lat) + dlat >= 90 or math.sin(angle) >= cos_lat:
+            col_span = self.cols  # The circle reaches a pole: every longitude
+        else:
+            dlon = math.degrees(math.asin(math.sin(angle) / cos_lat))
+            col_span = int(dlon / self.cell_degrees) + 2
+        if (row_hi - row_lo + 1) * min(2 * col_span + 1, self.cols) >= len(self._cells):
+            cells = list(self._cells.values())
+        else:
+            _, col0 = self._cell_of(lat, lon)
+            cols = set(col % self.cols for col in range(col0 - col_span, col0 + col_span + 1))
+            cells = [self._cells[(row, col)] for row in range(row_lo, row_hi + 1) for col in cols
+                     if (row, col) in self._cells]
+        return self._rank(lat, lon, *self._gather(cells), k=limit, max_km=radius_km)
+
+
+class HospitalLocator:
+    """Nearest-hospital lookups over a GridIndex of hospital coordinates.
+
+    Built on first use and then kept in step with the shared hospitals TableModel, so rows
+    added, edited or deleted anywhere in the app are reflected without a rebuild. Queries
+    may run on a worker thread; model events only queue the edited keys, which the next
+    query reads, so nothing touches the database (or the server) on the Tk thread.
+    """
+    def __init__(self, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.index = GridIndex(cell_degrees)
+        self.loaded = False
+        self._lock = threading.Lock()       # Guards the index
+        self._load_lock = threading.Lock()  # One build at a time
+        self._pending = None  # Model events that arrive while a build is running
+        self._stale = set()   # Keys edited since the last query, read by _catch_up
+        self._subscribed = False
+
+    @property
+    def repository(self):
+        return get_model("hospitals").repository
+
+    def ensure_loaded(self):
+        """Builds the index on first use and reads rows edited since; call off the Tk thread."""
+        if not self.loaded:
+            self._load()
+        self._catch_up()
+
+    def _load(self):
+        with self._load_lock:
+            if self.loaded:
+                return
+            with self._lock:
+                self._pending = []
+                if not self._subscribed:
+                    get_model("hospitals").subscribe(self.on_model_event)
+                    self._subscribed = True
+            index = GridIndex(self.cell_degrees)
+            for row in self.repository.iter_all():
+                index.add(row.id, row.latitude, row.longitude)
+            with self._lock:
+                self.index = index
+                pending, self._pending = self._pending, None
+                for event, payload in pending:
+                    self._apply(event, payload)
+                self.loaded = True
+
+    def on_model_event(self, event, payload):
+        # Runs on the Tk thread, so it only takes note; reads wait for the next query
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((event, payload))
+            else:
+                self._apply(event, payload)
+
+    def _apply(self, event, payload):
+        if event in ("insert", "update"):
+            # Views carry no coordinates; _catch_up reads them for just this row
+            self._stale.add(payload[0])
+        elif event == "delete":
+            self.index.remove(payload)
+            # A read of this row may already be under way; have the next one drop it again
+            self._stale.add(payload)
+        elif event == "reload":
+            # Rebuilt by the next query (on whichever thread makes it)
+            self.loaded = False
+
+    def _catch_up(self):
+        """Reads the coordinates of rows inserted, edited or deleted since the last query."""
+        with self._lock:
+            stale, self._stale = self._stale, set()
+        if not stale:
+            return
+        rows = [(key, self.repository.get(key)) for key in stale]
+        with self._lock:
+            for key, row in rows:
+                if key in self._stale:
+                    continue  # Edited again meanwhile; the next query reads it afresh
+                if row is None:
+                    self.index.remove(key)
+                else:
+                    self.index.add(key, row.latitude, row.longitude)
+
+    def located(self):
+        """How many hospitals have coordinates."""
+        self.ensure_loaded()
+        return len(self.index)
+
+    def nearest(self, lat, lon, k=DEFAULT_K, max_km=None):
+        """The k hospitals closest to (lat, lon), optionally no further than max_km."""
+        self.ensure_loaded()
+        with self._lock:
+            matches = self.index.nearest(lat, lon, k, max_km)
+        return self._details(matches)
+
+    def within(self, lat, lon, radius_km, limit=None):
+        """Hospitals within radius_km of (lat, lon), closest first."""
+        self.ensure_loaded()
+        with self._lock:
+            matches = self.index.within(lat, lon, radius_km, limit)
+        return self._details(matches)
+
+    def _details(self, matches):
+        results = []
+        for key, distance in matches:
+            row = self.repository.get(key)
+            if row is not None:  # Deleted since the lookup
+                results.append(NearbyHospital(*row, distance))
+        return results
+
+
+# Singleton instance, loaded on first query
+locator = HospitalLocator()
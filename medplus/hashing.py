@@ -0,0 +1,245 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Stored hashes describe themselves, so old and new settings can live side by side:
+#   $scrypt$ln=14,r=8,p=1$<salt>$<hash>        (N = 2**ln)
+#   $pbkdf2-sha256$i=600000$<salt>$<hash>
+#   <64 hex digits>                             legacy unsalted SHA-256, verify only
+SCRYPT = "scrypt"
+PBKDF2 = "pbkdf2-sha256"
+LEGACY = "sha256"
+
+DEFAULT_POLICY = "$scrypt$ln=14,r=8,p=1"
+SALT_BYTES = 16
+KEY_BYTES = 32
+# Calibration aims for this verify time; keep logins snappy on slow front-desk PCs
+DEFAULT_TARGET_MS = 150
+CALIBRATION_ROUNDS = 3
+# Settings key the calibrated policy is saved under
+POLICY_SETTING = "password_hash_policy"
+# Below this many passwords starting worker processes costs more than it saves
+PARALLEL_THRESHOLD = 16
+# (lowest, highest) accepted for each parameter of a policy new hashes are made under;
+# stored hashes made under anything else still verify. The scrypt ceiling keeps memory
+# (128 * 2**ln * r * p bytes) within what a front-desk PC has.
+POLICY_LIMITS = {
+    SCRYPT: {"ln": (10, 20), "r": (1, 32), "p": (1, 16)},
+    PBKDF2: {"i": (10000, 10000000)},
+}
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def parse_params(text):
+    return dict((key, int(value)) for key, value in (item.split("=") for item in text.split(",") if item))
+
+
+def format_params(params):
+    return ",".join(f"{key}={value}" for key, value in params.items())
+
+
+def parse_policy(policy):
+    """'$scrypt$ln=14,r=8,p=1' -> ('scrypt', {'ln': 14, 'r': 8, 'p': 1})"""
+    _, algorithm, params = policy.split("$")[:3]
+    if algorithm not in (SCRYPT, PBKDF2):
+        raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+    return algorithm, parse_params(params)
+
+
+def check_policy(policy):
+    """parse_policy() for a policy to hash under: every parameter present and in range.
+
+    Raises ValueError otherwise.
+    """
+    algorithm, params = parse_policy(policy)
+    limits = POLICY_LIMITS[algorithm]
+    if set(params) != set(limits):
+        raise ValueError(f"{algorithm} policy needs exactly {', '.join(limits)}")
+    for name, (low, high) in limits.items():
+        if not low <= params[name] <= high:
+            raise ValueError(f"{algorithm} {name} must be between {low} and {high}")
+    return algorithm, params
+
+
+def identify(encoded):
+    """(algorithm, params) of a stored hash; legacy hex digests come back as ('sha256', {})."""
+    if not encoded.startswith("$"):
+        return LEGACY, {}
+    return parse_policy(encoded)
+
+
+def derive(algorithm, params, password, salt):
+    data = password.encode()
+    if algorithm == SCRYPT:
+        n, r, p = 2 ** params["ln"], params["r"], params["p"]
+        # scrypt needs 128 * N * r * p bytes; hashlib refuses more than maxmem
+        return hashlib.scrypt(data, salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES,
+                              maxmem=128 * n * r * p + 1024 * 1024)
+    if algorithm == PBKDF2:
+        return hashlib.pbkdf2_hmac("sha256", data, salt, params["i"], KEY_BYTES)
+    raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+
+
+class PasswordHasher:
+    """Hashes new passwords with one policy and verifies hashes made under any policy."""
+    def __init__(self, policy=DEFAULT_POLICY):
+        self.policy = policy
+        self.algorithm, self.params = parse_policy(policy)
+
+    def hash(self, password):
+        salt = os.urandom(SALT_BYTES)
+        key = derive(self.algorithm, self.params, password, salt)
+        return f"${self.algorithm}${format_params(self.params)}${_b64(salt)}${_b64(key)}"
+
+    def verify(self, password, encoded):
+        """Constant-time check of password against a stored hash of any supported kind."""
+        try:
+            algorithm, params = identify(encoded)
+            if algorithm == LEGACY:
+                expected = hashlib.sha256(password.encode()).hexdigest()
+                return hmac.compare_digest(expected, encoded)
+            _, _, _, salt, key = encoded.split("$")
+            return hmac.compare_digest(derive(algorithm, params, password, _unb64(salt)), _unb64(key))
+        except (ValueError, KeyError):
+            return False # Malformed hash never matches
+
+    def needs_rehash(self, encoded):
+        """True when a hash was made under a different (legacy or outdated) policy."""
+        try:
+            return identify(encoded) != (self.algorithm, self.params)
+        except (ValueError, KeyError):
+            return True
+
+
+def hash_many(policy, passwords):
+    """Hashes a list of passwords under policy; runs inside hash_parallel's workers."""
+    hasher = PasswordHasher(policy)
+    return [hasher.hash(password) for password in passwords]
+
+
+def hash_parallel(policy, passwords, workers=None):
+    """Hashes passwords (in order) across worker processes, one per core by default.
+
+    Key derivation is CPU bound and holds the GIL, so threads wouldn't help; processes
+    do. Each worker gets a few large chunks to keep pickling overhead negligible.
+    """
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < PARALLEL_THRESHOLD:
+        return hash_many(policy, passwords)
+    size = -(-len(passwords) // (workers * 4))
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        hashed = []
+        for part in pool.map(hash_many, [policy] * len(chunks), chunks):
+            hashed.extend(part)
+    return hashed
+
+
+def time_verify(policy, rounds=CALIBRATION_ROUNDS):
+    """Median milliseconds one verification takes under policy on this machine."""
+    hasher = PasswordHasher(policy)
+    encoded = hasher.hash("calibration")
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hasher.verify("calibration", encoded)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms=DEFAULT_TARGET_MS, algorithm=SCRYPT):
+    """Picks the strongest policy of algorithm whose verify time stays within target_ms.
+
+    Returns (policy, measured ms).
+    """
+    if algorithm == SCRYPT:
+        # Each step doubles time and memory; stop before overshooting the target
+        best = None
+        for ln in range(10, 21):
+            policy = f"$scrypt$ln={ln},r=8,p=1"
+            elapsed = time_verify(policy)
+            if elapsed > target_ms and best is not None:
+                break
+            best = (policy, elapsed)
+            if elapsed > target_ms:
+                break
+        return best
+
+    # PBKDF2 cost is linear in the iteration count: measure once, then scale
+    probe = 50000
+    elapsed = time_verify(f"$pbkdf2-sha256$i={probe}")
+    iterations = max(10000, int(probe * target_ms / elapsed) // 10000 * 10000)
+    policy = f"$pbkdf2-sha256$i={iterations}"
+    return policy, time_verify(policy)
+
+
+def benchmark(policies, seconds=1.0):
+    """Yields (policy, verifications per second) for each policy."""
+    for policy in policies:
+        if policy == LEGACY:
+            hasher, encoded = PasswordHasher(), hashlib.sha256(b"benchmark").hexdigest()
+        else:
+            hasher = PasswordHasher(policy)
+            encoded = hasher.hash("benchmark")
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            hasher.verify("benchmark", encoded)
+            count += 1
+        yield policy, count / (time.perf_counter() - start)
+
+
+BENCHMARK_POLICIES = [
+    LEGACY,
+    "$pbkdf2-sha256$i=100000",
+    "$pbkdf2-sha256$i=600000",
+    "$scrypt$ln=12,r=8,p=1",
+    "$scrypt$ln=14,r=8,p=1",
+    "$scrypt$ln=15,r=8,p=1",
+    "$scrypt$ln=16,r=8,p=1",
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Password hashing calibration and benchmark.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cal = commands.add_parser("calibrate", help="pick cost parameters for a target verify time")
+    cal.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS)
+    cal.add_argument("--algorithm", choices=[SCRYPT, PBKDF2], default=SCRYPT)
+    cal.add_argument("--save", action="store_true", help="store the policy in the database for new hashes")
+    bench = commands.add_parser("benchmark", help="verify throughput per setting")
+    bench.add_argument("--seconds", type=float, default=1.0, help="time spent on each setting")
+    bench.add_argument("policies", nargs="*", help="policies to measure (default: a standard set)")
+    args = parser.parse_args(argv)
+
+    if args.command == "calibrate":
+        policy, elapsed = calibrate(args.target_ms, args.algorithm)
+        print(f"{policy}  ({elapsed:.1f} ms per verify, target {args.target_ms:g} ms)")
+        if args.save:
+            from medplus.auth import auth
+            auth.set_policy(policy)
+            print("Saved; new passwords and rehashed logins will use it.")
+        return 0
+
+    print(f"{'setting':<28} {'verifies/s':>12} {'ms each':>10}")
+    for policy, rate in benchmark(args.policies or BENCHMARK_POLICIES, args.seconds):
+        print(f"{policy:<28} {rate:>12.1f} {1000 / rate:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
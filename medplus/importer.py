@@ -0,0 +1,240 @@
+import argparse
+import contextlib
+import csv
+import gzip
+import json
+import os
+import re
+import sys
+from medplus.database import db, FTS_TABLES
+
+# Columns accepted per table, in insert order
+IMPORT_TABLES = {
+    "hospitals": ["name", "address", "contact"],
+    "emergency_contacts": ["name", "contact_no"],
+    "personal_contacts": ["name", "contact_no"],
+}
+
+# Columns a record may leave out (stored as NULL), per table
+OPTIONAL_COLUMNS = {
+    "hospitals": ["latitude", "longitude"],
+}
+
+# Other header names accepted for a column (after normalization)
+COLUMN_ALIASES = {
+    "name": ["hospital", "hospital_name", "contact_name"],
+    "address": ["location"],
+    "contact": ["contact_no", "phone", "phone_no", "telephone"],
+    "contact_no": ["contact", "phone", "phone_no", "telephone"],
+    "latitude": ["lat"],
+    "longitude": ["lon", "lng", "long"],
+}
+
+# Decimal degrees
+COORDINATE_RANGES = {"latitude": (-90.0, 90.0), "longitude": (-180.0, 180.0)}
+
+# Rows per executemany call; all batches still share one transaction
+BATCH_SIZE = 5000
+# Rejected rows kept for the summary; the rest are only counted
+MAX_REPORTED_REJECTS = 100
+MAX_FIELD_LENGTH = 500
+
+_CONTACT = re.compile(r"^[\d\s+\-().\/]+$")
+
+
+class ImportSummary:
+    def __init__(self, table):
+        self.table = table
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.rejects = []  # (line number, reason), capped at MAX_REPORTED_REJECTS
+
+    def reject(self, line_no, reason):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append((line_no, reason))
+
+    def __str__(self):
+        lines = [f"{self.table}: read {self.read}, inserted {self.inserted}, rejected {self.rejected}"]
+        for line_no, reason in self.rejects:
+            lines.append(f"  line {line_no}: {reason}")
+        if self.rejected > len(self.rejects):
+            lines.append(f"  ... and {self.rejected - len(self.rejects)} more")
+        return "\n".join(lines)
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    return "jsonl" if name.endswith((".jsonl", ".json", ".ndjson")) else "csv"
+
+
+def _open_text(path):
+    if path == "-":
+        # Leave stdin open for whoever reads it next
+        return contextlib.nullcontext(sys.stdin)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+def _normalize_key(key):
+    """'Contact No' / 'contact-no' / ' CONTACT_NO ' -> 'contact_no'."""
+    return re.sub(r"[\s\-]+", "_", str(key).strip().lower())
+
+
+def read_records(path, fmt=None):
+    """Streams (line number, {column: value}) pairs from a CSV or JSONL file ('-' is stdin)."""
+    fmt = fmt or detect_format(path)
+    with _open_text(path) as f:
+        if fmt == "csv":
+            reader = csv.reader(f)
+            # Normalize the header once rather than every row's keys
+            header = [_normalize_key(name) for name in next(reader, [])]
+            for row in reader:
+                if row:
+                    yield reader.line_num, dict(zip(header, row))
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield line_no, ValueError(f"invalid JSON: {e}")
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, ValueError("expected a JSON object")
+                    continue
+                yield line_no, {_normalize_key(k): v for k, v in record.items()}
+
+
+def _coordinate(column, value):
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{column} is not a number: {value!r}")
+    low, high = COORDINATE_RANGES[column]
+    if not low <= number <= high:
+        raise ValueError(f"{column} out of range: {value}")
+    return number
+
+
+def validate_record(record, columns, optional=()):
+    """Returns the row as a tuple in column order (optional columns last, None when blank),
+    or raises ValueError with the reason."""
+    values = []
+    for column in list(columns) + list(optional):
+        value = record.get(column)
+        if value is None:
+            value = next((record[alias] for alias in COLUMN_ALIASES.get(column, ()) if alias in record), None)
+        value = "" if value is None else str(value).strip()
+        if not value:
+            if column in optional:
+                values.append(None)
+                continue
+            raise ValueError(f"missing {column}")
+        if len(value) > MAX_FIELD_LENGTH:
+            raise ValueError(f"{column} longer than {MAX_FIELD_LENGTH} characters")
+        if column.startswith("contact") and not _CONTACT.match(value):
+            raise ValueError(f"{column} is not a phone number: {value!r}")
+        if column in COORDINATE_RANGES:
+            value = _coordinate(column, value)
+        values.append(value)
+    row = dict(zip(list(columns) + list(optional), values))
+    if "latitude" in row and "longitude" in row and (row["latitude"] is None) != (row["longitude"] is None):
+        raise ValueError("latitude and longitude must be given together")
+    return tuple(values)
+
+
+def import_records(table, records, batch_size=BATCH_SIZE, progress=None):
+    """Validates and inserts (line number, record) pairs in batches inside a single transaction.
+
+    Either every valid row is committed or, on a database error, none are. progress is
+    called as progress(summary) after each batch.
+    """
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Cannot import into {table!r}")
+    columns = IMPORT_TABLES[table]
+    optional = OPTIONAL_COLUMNS.get(table, [])
+    insert_columns = columns + optional
+    query = f"INSERT INTO {table} ({', '.join(insert_columns)}) VALUES ({', '.join(['?'] * len(insert_columns))})"
+
+    summary = ImportSummary(table)
+    batch = []
+    fts_columns = FTS_TABLES.get(table)
+    with db.transaction():
+        if fts_columns:
+            # Indexing row by row through the FTS trigger costs several times more than
+            # the insert itself. Drop it for the duration of this transaction and index
+            # the new rows in one set-based statement at the end; nobody else can observe
+            # the missing trigger because the DDL is part of our uncommitted transaction.
+            first_id = db.fetch_one(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")[0]
+            db.execute_query(f"DROP TRIGGER IF EXISTS {table}_fts_ai")
+
+        for line_no, record in records:
+            summary.read += 1
+            if isinstance(record, Exception):
+                summary.reject(line_no, str(record))
+                continue
+            try:
+                batch.append(validate_record(record, columns, optional))
+            except ValueError as e:
+                summary.reject(line_no, str(e))
+                continue
+
+            if len(batch) >= batch_size:
+                db.execute_many(query, batch)
+                summary.inserted += len(batch)
+                batch = []
+                if progress:
+                    progress(summary)
+
+        if batch:
+            db.execute_many(query, batch)
+            summary.inserted += len(batch)
+
+        if fts_columns:
+            cols = ", ".join(fts_columns)
+            db.execute_query(f"INSERT INTO {table}_fts (rowid, {cols}) SELECT id, {cols} FROM {table} WHERE id >= ?",
+                             (first_id,))
+            db.create_fts_index(table, fts_columns)
+
+    if progress:
+        progress(summary)
+    return summary
+
+
+def import_file(path, table, fmt=None, batch_size=BATCH_SIZE, progress=None):
+    """Streams a CSV/JSONL (optionally .gz) file into table; memory use doesn't grow with file size."""
+    return import_records(table, read_records(path, fmt), batch_size, progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import hospitals or contacts from CSV/JSONL.")
+    parser.add_argument("path", help="CSV or JSONL file (may be .gz compressed)")
+    parser.add_argument("table", choices=sorted(IMPORT_TABLES))
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: guessed from the file name")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"File not found: {args.path}", file=sys.stderr)
+        return 1
+
+    def report(summary):
+        print(f"\r{summary.read} read, {summary.inserted} inserted, {summary.rejected} rejected",
+              end="", file=sys.stderr, flush=True)
+
+    try:
+        summary = import_file(args.path, args.table, args.format, args.batch_size, progress=report)
+    except Exception as e:
+        print(f"\nImport failed, nothing was written: {e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    print(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# Versioned schema. PRAGMA user_version records how many MIGRATIONS steps a database
+# file has had; only the pending ones run at startup, in one write transaction. Steps use
+# IF NOT EXISTS so files from before versioning (user_version 0) upgrade cleanly.
+# To change the schema append a step; never edit one that has shipped.
+import sqlite3
+
+# Columns covered by full-text search, per table
+FTS_TABLES = {
+    "hospitals": ["name", "address", "contact"],
+    "emergency_contacts": ["name", "contact_no"],
+    "personal_contacts": ["name", "contact_no"],
+}
+
+# Rows ANALYZE samples per index; keeps it quick on large tables
+ANALYSIS_LIMIT = 1000
+
+
+def create_base_tables(cursor):
+    # Users table (Admin/User)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('USER', 'ADMIN'))
+        )
+    """)
+
+    # Hospitals table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS hospitals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            address TEXT NOT NULL,
+            contact TEXT NOT NULL
+        )
+    """)
+
+    # Emergency Contacts table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS emergency_contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            contact_no TEXT NOT NULL
+        )
+    """)
+
+    # User Personal Contacts table (for specific users if needed, or global)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS personal_contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            contact_no TEXT NOT NULL
+        )
+    """)
+
+
+def create_sort_indexes(cursor):
+    # Behind the sortable columns of the CRUD views, so ORDER BY ... LIMIT and keyset
+    # seeks walk an index instead of sorting the whole table (rowid rides along for free)
+    for table, column in [("hospitals", "name"), ("hospitals", "address"), ("hospitals", "contact"),
+                          ("emergency_contacts", "name"), ("emergency_contacts", "contact_no"),
+                          ("personal_contacts", "name"), ("personal_contacts", "contact_no")]:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+
+
+def create_search_indexes(cursor):
+    # Full-text indexes for the global search bar (see medplus/search.py)
+    for table, columns in FTS_TABLES.items():
+        create_fts_index(cursor, table, columns)
+
+
+def create_user_indexes(cursor):
+    # users is keyed by a TEXT primary key, so its rowid isn't the username: spell the
+    # tie-break out to serve role filters and (role, username) keyset pages
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users (role, username)")
+
+
+def create_settings_table(cursor):
+    # Small key/value store for per-installation settings (e.g. the password hash policy)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+
+def add_hospital_coordinates(cursor):
+    # Nullable: existing rows (and ones added through the CRUD window) simply have no location
+    # yet. ADD COLUMN has no IF NOT EXISTS, so look first.
+    existing = set(row[1] for row in cursor.execute("PRAGMA table_info(hospitals)").fetchall())
+    for column in ("latitude", "longitude"):
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE hospitals ADD COLUMN {column} REAL")
+
+
+# (version, description, step); a file at user_version N has had steps 1..N applied
+MIGRATIONS = [
+    (1, "base tables", create_base_tables),
+    (2, "indexes for sorted views", create_sort_indexes),
+    (3, "full-text search", create_search_indexes),
+    (4, "users role index", create_user_indexes),
+    (5, "settings table", create_settings_table),
+    (6, "hospital coordinates", add_hospital_coordinates),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def create_fts_index(cursor, table, columns):
+    """Creates an external-content FTS5 table over table(columns), kept in sync by triggers."""
+    fts = f"{table}_fts"
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,)).fetchone()
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{col}" for col in columns)
+    old_cols = ", ".join(f"old.{col}" for col in columns)
+
+    # prefix='2 3' keeps short prefix queries (as the user types) off the slow path
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {cols}, content='{table}', content_rowid='id', prefix='2 3'
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    """)
+
+    if not exists:
+        # Index whatever rows the table already had before search existed
+        cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Brings conn's database up to LATEST_VERSION; returns the versions applied."""
+    if schema_version(conn) >= LATEST_VERSION:
+        return []
+
+    # IMMEDIATE takes the write lock up front; re-read the version under it in case
+    # another process migrated while we were starting
+    conn.execute("BEGIN IMMEDIATE")
+    applied = []
+    try:
+        cursor = conn.cursor()
+        current = schema_version(conn)
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(cursor)
+            # user_version lives in the file header and commits with everything else
+            cursor.execute(f"PRAGMA user_version = {version}")
+            applied.append(version)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    if applied:
+        # Refresh planner statistics so the new indexes actually get picked
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
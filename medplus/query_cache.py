@@ -0,0 +1,145 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# Entries kept, and the rough memory they may use, before the least recently used go
+MAX_ENTRIES = 512
+MAX_BYTES = 16 * 1024 * 1024
+
+_WHITESPACE = re.compile(r"\s+")
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)", re.IGNORECASE)
+_WRITE_TABLE = re.compile(
+    r"^(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+([A-Za-z_]\w*)",
+    re.IGNORECASE)
+# Results that depend on more than the table contents
+_VOLATILE = re.compile(r"\b(?:random|randomblob|changes|total_changes|last_insert_rowid)\s*\(|'now'", re.IGNORECASE)
+# Statements that neither read table data nor change it
+_NEUTRAL = ("PRAGMA", "BEGIN", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE", "EXPLAIN", "ANALYZE")
+
+
+@lru_cache(maxsize=1024)
+def classify(query):
+    """Returns (kind, normalized sql, tables) for a statement.
+
+    kind is "read" (a cacheable SELECT; tables are the ones it reads), "write" (tables is
+    the one it changes), "neutral", or "unknown" (DDL and anything we can't reason about:
+    treat it as touching every table). Statements are f-strings over a handful of
+    templates, so the parse is memoized.
+    """
+    sql = _WHITESPACE.sub(" ", query).strip().rstrip(";")
+    verb = sql.split(" ", 1)[0].upper()
+    if verb == "SELECT":
+        tables = frozenset(name.lower() for name in _READ_TABLES.findall(sql))
+        if not tables or _VOLATILE.search(sql) or any(name.startswith("sqlite_") for name in tables):
+            return "neutral", sql, frozenset()
+        return "read", sql, tables
+    if verb in _NEUTRAL:
+        return "neutral", sql, frozenset()
+    match = _WRITE_TABLE.match(sql)
+    if match:
+        return "write", sql, frozenset([match.group(1).lower()])
+    return "unknown", sql, frozenset()
+
+
+def estimate_size(value):
+    """Rough byte count of a fetch_one/fetch_all result, enough to budget the cache."""
+    if value is None:
+        return 16
+    rows = value if isinstance(value, tuple) and value and isinstance(value[0], tuple) else (value,)
+    size = 64
+    for row in rows:
+        size += 56 + 8 * len(row)
+        for item in row:
+            size += len(item) + 49 if isinstance(item, (str, bytes)) else 24
+    return size
+
+
+class QueryCache:
+    """Read-through cache of SELECT results keyed by normalized SQL and parameters.
+
+    Every entry remembers the tables its query read; a write to any of them drops it.
+    Entries are evicted least recently used first once either the entry count or the
+    estimated byte size goes over budget. Safe to share between threads.
+    """
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, related=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.related = related or {}  # table -> tables its triggers also write (e.g. FTS indexes)
+        self._entries = OrderedDict()  # key -> (value, tables, size)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        # Bumped on every invalidation; a result read across one is not stored
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(sql, params):
+        if isinstance(params, dict):
+            return sql, tuple(sorted(params.items()))
+        return sql, tuple(params)
+
+    def get(self, key):
+        """Returns (True, value) on a hit, (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, tables, value, epoch):
+        size = estimate_size(value)
+        with self._lock:
+            if epoch != self.epoch or size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, tables, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, tables):
+        """Drops every entry that read any of tables (or what their triggers write)."""
+        touched = set(tables)
+        for table in tables:
+            touched.update(self.related.get(table, ()))
+        with self._lock:
+            self.epoch += 1
+            stale = [key for key, (_, read, _) in self._entries.items() if not read.isdisjoint(touched)]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[2]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.invalidations = 0
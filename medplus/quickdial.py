@@ -0,0 +1,228 @@
+import re
+from bisect import bisect_left, insort
+from collections import namedtuple
+from medplus.table_model import get_model
+
+QuickDialEntry = namedtuple("QuickDialEntry", ["kind", "table", "id", "name", "contact_no"])
+
+# (label, table) pairs indexed for quick dial, in result priority order
+QUICK_DIAL_SOURCES = [
+    ("Emergency", "emergency_contacts"),
+    ("Personal", "personal_contacts"),
+]
+
+DEFAULT_LIMIT = 10
+
+_NON_DIGITS = re.compile(r"\D")
+_WORDS = re.compile(r"\w+")
+# Input made only of these characters is treated as a phone number
+_NUMBER_INPUT = re.compile(r"^[\d\s+\-().]+$")
+
+
+def normalize_digits(text):
+    """Keeps only the digits of a phone number: '+91 98765-43210' -> '919876543210'."""
+    return _NON_DIGITS.sub("", text or "")
+
+
+def name_tokens(name):
+    return _WORDS.findall((name or "").lower())
+
+
+class PrefixIndex:
+    """Sorted array of (term, key) pairs; prefix lookups are a bisect plus a short scan."""
+    def __init__(self):
+        self._pairs = []
+
+    def add(self, term, key):
+        insort(self._pairs, (term, key))
+
+    def add_many(self, pairs):
+        """Bulk insert; one sort instead of an O(n) insort per pair."""
+        self._pairs.extend(pairs)
+        self._pairs.sort()
+
+    def discard_where(self, predicate):
+        """Drops every pair whose key matches predicate, in one pass."""
+        self._pairs = [pair for pair in self._pairs if not predicate(pair[1])]
+
+    def remove(self, term, key):
+        i = bisect_left(self._pairs, (term, key))
+        if i < len(self._pairs) and self._pairs[i] == (term, key):
+            del self._pairs[i]
+
+    def span(self, prefix):
+        """[lo, hi) slice of the array holding the terms that start with prefix."""
+        lo = bisect_left(self._pairs, (prefix,))
+        hi = bisect_left(self._pairs, (prefix + "\uffff",), lo)
+        return lo, hi
+
+    def count(self, prefix):
+        lo, hi = self.span(prefix)
+        return hi - lo
+
+    def search(self, prefix):
+        """Yields the keys of every term starting with prefix, in term order."""
+        lo, hi = self.span(prefix)
+        for i in range(lo, hi):
+            yield self._pairs[i][1]
+
+    def __len__(self):
+        return len(self._pairs)
+
+
+class QuickDialIndex:
+    """In-memory index over emergency and personal contacts for per-keystroke lookup.
+
+    Name words are indexed for prefix matches. Phone numbers are normalized to digits and
+    indexed both forwards (typing the start of a number) and reversed, so "the last few
+    digits" is also a prefix lookup. The index follows the shared TableModels, so edits
+    made anywhere in the app are applied incrementally. It is loaded on a worker when the
+    dashboard opens (load/install); lookups find nothing until then.
+    """
+    def __init__(self):
+        self.entries = {}  # (table, id) -> QuickDialEntry
+        self.names = PrefixIndex()
+        self.digits = PrefixIndex()
+        self.reversed_digits = PrefixIndex()
+        self.loaded = False
+        self._pending = None  # Model events that arrive while load() runs; None until subscribed
+        self._kinds = dict((table, kind) for kind, table in QUICK_DIAL_SOURCES)
+        self._priority = dict((table, i) for i, (kind, table) in enumerate(QUICK_DIAL_SOURCES))
+
+    def ensure_loaded(self):
+        """Loads everything right here; the UI uses load() on a worker and install() instead."""
+        if not self.loaded:
+            self.install(self.load())
+
+    def load(self):
+        """Reads every quick dial table without touching the index; safe off the Tk thread.
+
+        Hand the result to install() on the Tk thread. Edits made in between are queued
+        and replayed by install().
+        """
+        if self.loaded:
+            return None
+        if self._pending is None:
+            self._pending = []
+            for kind, table in QUICK_DIAL_SOURCES:
+                get_model(table).subscribe(lambda event, payload, table=table: self.on_model_event(table, event, payload))
+        return dict((table, self._read_table(table)) for kind, table in QUICK_DIAL_SOURCES)
+
+    def install(self, loaded):
+        if loaded is None or self.loaded:
+            return
+        for table, rows in loaded.items():
+            self._replace_table(table, rows)
+        self.loaded = True
+        pending, self._pending = self._pending, []
+        for table, event, payload in pending:
+            self.on_model_event(table, event, payload)
+
+    def load_table(self, table):
+        self._replace_table(table, self._read_table(table))
+
+    def _read_table(self, table):
+        entries, names, digits, reversed_digits = {}, [], [], []
+        for record_id, name, contact_no in get_model(table).repository.iter_all():
+            key = (table, record_id)
+            entries[key] = QuickDialEntry(self._kinds[table], table, record_id, name, contact_no)
+            names.extend((token, key) for token in set(name_tokens(name)))
+            number = normalize_digits(contact_no)
+            if number:
+                digits.append((number, key))
+                reversed_digits.append((number[::-1], key))
+        return entries, names, digits, reversed_digits
+
+    def _replace_table(self, table, rows):
+        # Forget the table's old rows in bulk rather than one bisect-and-delete at a time
+        for key in [key for key in self.entries if key[0] == table]:
+            del self.entries[key]
+        for index in (self.names, self.digits, self.reversed_digits):
+            index.discard_where(lambda key: key[0] == table)
+
+        entries, names, digits, reversed_digits = rows
+        self.entries.update(entries)
+        self.names.add_many(names)
+        self.digits.add_many(digits)
+        self.reversed_digits.add_many(reversed_digits)
+
+    def add(self, table, record_id, name, contact_no):
+        key = (table, record_id)
+        if key in self.entries:
+            self.remove(table, record_id)
+        entry = QuickDialEntry(self._kinds[table], table, record_id, name, contact_no)
+        self.entries[key] = entry
+        for token in set(name_tokens(name)):
+            self.names.add(token, key)
+        digits = normalize_digits(contact_no)
+        if digits:
+            self.digits.add(digits, key)
+            self.reversed_digits.add(digits[::-1], key)
+
+    def remove(self, table, record_id):
+        key = (table, record_id)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for token in set(name_tokens(entry.name)):
+            self.names.remove(token, key)
+        digits = normalize_digits(entry.contact_no)
+        if digits:
+            self.digits.remove(digits, key)
+            self.reversed_digits.remove(digits[::-1], key)
+
+    def on_model_event(self, table, event, payload):
+        if not self.loaded:
+            self._pending.append((table, event, payload))
+        elif event in ("insert", "update"):
+            self.add(table, *payload)
+        elif event == "delete":
+            self.remove(table, payload)
+        elif event == "reload":
+            self.load_table(table)
+
+    def lookup(self, text, limit=DEFAULT_LIMIT):
+        """Contacts whose name words or number match what the operator has typed so far.
+
+        Nothing matches until the index is loaded.
+        """
+        text = text.strip()
+        if not text or not self.loaded:
+            return []
+
+        digits = normalize_digits(text)
+        if digits and _NUMBER_INPUT.match(text):
+            # Looks like a number: match the end of stored numbers first, then the start
+            keys = self._collect([self.reversed_digits.search(digits[::-1]), self.digits.search(digits)], limit)
+        else:
+            words = name_tokens(text)
+            if not words:
+                return []
+            # Every typed word has to prefix-match some word of the name. Drive the scan from
+            # the word with the fewest matches and check the others against each candidate.
+            words.sort(key=self.names.count)
+            first, rest = words[0], words[1:]
+            candidates = (key for key in self.names.search(first)
+                          if all(any(token.startswith(word) for token in name_tokens(self.entries[key].name))
+                                 for word in rest))
+            keys = self._collect([candidates], limit)
+
+        entries = [self.entries[key] for key in keys]
+        entries.sort(key=lambda entry: self._priority[entry.table])
+        return entries
+
+    def _collect(self, sources, limit):
+        keys = []
+        seen = set()
+        for source in sources:
+            for key in source:
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+                    if len(keys) >= limit:
+                        return keys
+        return keys
+
+
+# Singleton instance, loaded when the first quick dial panel opens
+quick_dial = QuickDialIndex()
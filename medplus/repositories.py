@@ -0,0 +1,181 @@
+import json
+from collections import namedtuple
+from medplus.database import db
+
+# Row types handed out by the repositories: plain tuples underneath, so they slot into
+# Treeviews and CSV writers unchanged, but readable as row.name / row.contact_no.
+Hospital = namedtuple("Hospital", ["id", "name", "address", "contact", "latitude", "longitude"])
+EmergencyContact = namedtuple("EmergencyContact", ["id", "name", "contact_no"])
+PersonalContact = namedtuple("PersonalContact", ["id", "name", "contact_no"])
+User = namedtuple("User", ["username", "role"])  # Never carries password_hash
+
+
+class Repository:
+    """Data access for one table through a fixed set of statements.
+
+    Every statement is built once, with an explicit column list, and only values vary
+    between calls. Identical SQL text means sqlite3 reuses the prepared statement from
+    its per-connection cache instead of parsing and planning it again.
+    """
+    def __init__(self, table, row_type, key="id", writable=(), optional=()):
+        self.table = table
+        self.row_type = row_type
+        self.key = key
+        self.columns = list(row_type._fields)
+        # Columns a caller may set; the key is generated (or immutable)
+        self.writable = list(writable)
+        # Trailing writable columns an insert may leave out (stored as NULL)
+        self.optional = list(optional)
+        if self.optional and self.writable[-len(self.optional):] != self.optional:
+            raise ValueError(f"Optional columns of {table} must come last in writable")
+
+        cols = ", ".join(self.columns)
+        self._select = f"SELECT {cols} FROM {table}"
+        self._get = f"{self._select} WHERE {key} = ?"
+        self._exists = f"SELECT 1 FROM {table} WHERE {key} = ?"
+        self._count = f"SELECT COUNT(*) FROM {table}"
+        self._delete = f"DELETE FROM {table} WHERE {key} = ?"
+        self._inserts = {}  # number of leading writable columns given -> INSERT statement
+        self._updates = {}  # tuple of columns -> UPDATE statement
+
+    def _row(self, row):
+        return self.row_type._make(row) if row is not None else None
+
+    def get(self, key):
+        return self._row(db.fetch_one(self._get, (key,)))
+
+    def exists(self, key):
+        return db.fetch_one(self._exists, (key,)) is not None
+
+    def count(self):
+        row = db.fetch_one(self._count)
+        return row[0] if row else 0
+
+    def all(self):
+        return [self.row_type._make(row) for row in db.fetch_all(f"{self._select} ORDER BY {self.key}")]
+
+    def iter_all(self):
+        """Streams every row in key order without holding the table in memory."""
+        return map(self.row_type._make, db.fetch_iter(f"{self._select} ORDER BY {self.key}"))
+
+    def page(self, after_key=None, limit=200, order_by=None, descending=False):
+        """Keyset page; see Database.fetch_page. Returns (rows, next_after_key)."""
+        rows, after = db.fetch_page(self.table, after_key, limit, order_by, self.columns, descending)
+        return [self.row_type._make(row) for row in rows], after
+
+    def insert(self, values):
+        """Inserts values (in writable column order) and returns the stored row.
+
+        The optional columns may be left out; they are stored as NULL.
+        """
+        if not self.writable:
+            raise ValueError(f"{self.table} rows can't be created here")
+        required = len(self.writable) - len(self.optional)
+        if not required <= len(values) <= len(self.writable):
+            expected = str(required) if not self.optional else f"{required} to {len(self.writable)}"
+            raise ValueError(f"Expected {expected} values for {self.table}, got {len(values)}")
+        query = self._inserts.get(len(values))
+        if query is None:
+            columns = self.writable[:len(values)]
+            query = self._inserts[len(values)] = (
+                f"INSERT INTO {self.table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"RETURNING {', '.join(self.columns)}")
+        with db.transaction():
+            row = db.execute_query(query, tuple(values)).fetchone()
+        return self._row(row)
+
+    def update(self, key, changes):
+        """Updates {column: value} pairs of one row and returns the row as stored."""
+        unknown = [col for col in changes if col not in self.writable]
+        if unknown or not changes:
+            raise ValueError(f"Cannot update {', '.join(unknown) or 'nothing'} on {self.table}")
+        columns = tuple(sorted(changes))
+        query = self._updates.get(columns)
+        if query is None:
+            assignments = ", ".join(f"{col} = ?" for col in columns)
+            query = self._updates[columns] = f"UPDATE {self.table} SET {assignments} WHERE {self.key} = ?"
+        with db.transaction():
+            db.execute_query(query, (*(changes[col] for col in columns), key))
+            return self.get(key)
+
+    def delete_many(self, keys):
+        """Deletes rows in one transaction and returns how many went."""
+        with db.transaction():
+            cursor = db.execute_many(self._delete, [(key,) for key in keys])
+            return cursor.rowcount
+
+    def delete(self, key):
+        return self.delete_many([key])
+
+
+class UserRepository(Repository):
+    """Users are keyed by username; the password hash only leaves through get_credentials()."""
+    def __init__(self):
+        super().__init__("users", User, key="username")
+        self._credentials = "SELECT password_hash, role FROM users WHERE username = ?"
+        self._create = "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)"
+        self._set_hash = "UPDATE users SET password_hash = ? WHERE username = ?"
+        self._set_role = "UPDATE users SET role = ? WHERE username = ? RETURNING username, role"
+        # One statement per batch: the rows travel as a single JSON array parameter and the
+        # primary key, not a lookup per row, decides which usernames are taken
+        self._create_many = (
+            "INSERT INTO users (username, password_hash, role) "
+            "SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]') "
+            "FROM json_each(?) WHERE true "  # WHERE disambiguates ON CONFLICT after a SELECT
+            "ON CONFLICT(username) DO NOTHING RETURNING username")
+
+    def get_credentials(self, username):
+        """(password_hash, role) for username, or None."""
+        return db.fetch_one(self._credentials, (username,))
+
+    def create(self, username, password_hash, role):
+        with db.transaction():
+            db.execute_query(self._create, (username, password_hash, role))
+
+    def create_many(self, rows, batch_size=5000):
+        """Inserts (username, password_hash, role) rows in one transaction, skipping taken
+        usernames. Returns the set of usernames actually created."""
+        created = set()
+        with db.transaction():
+            for start in range(0, len(rows), batch_size):
+                batch = json.dumps([list(row) for row in rows[start:start + batch_size]])
+                created.update(name for (name,) in db.execute_query(self._create_many, (batch,)).fetchall())
+        return created
+
+    def set_password_hash(self, username, password_hash):
+        with db.transaction():
+            db.execute_query(self._set_hash, (password_hash, username))
+
+    def set_role(self, username, role):
+        """Changes a user's role; returns the updated User, or None if there is no such user."""
+        with db.transaction():
+            return self._row(db.execute_query(self._set_role, (role, username)).fetchone())
+
+
+class SettingsRepository:
+    """Key/value settings stored alongside the data."""
+    _get = "SELECT value FROM settings WHERE key = ?"
+    _set = "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+
+    def get(self, key, default=None):
+        row = db.fetch_one(self._get, (key,))
+        return row[0] if row else default
+
+    def set(self, key, value):
+        with db.transaction():
+            db.execute_query(self._set, (key, value))
+
+
+hospitals = Repository("hospitals", Hospital, writable=["name", "address", "contact", "latitude", "longitude"],
+                       optional=["latitude", "longitude"])
+emergency_contacts = Repository("emergency_contacts", EmergencyContact, writable=["name", "contact_no"])
+personal_contacts = Repository("personal_contacts", PersonalContact, writable=["name", "contact_no"])
+users = UserRepository()
+settings = SettingsRepository()
+
+REPOSITORIES = {
+    "hospitals": hospitals,
+    "emergency_contacts": emergency_contacts,
+    "personal_contacts": personal_contacts,
+    "users": users,
+}
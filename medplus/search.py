@@ -0,0 +1,73 @@
+import re
+from collections import namedtuple
+from medplus.database import db
+
+SearchResult = namedtuple("SearchResult", ["kind", "table", "id", "name", "detail", "rank"])
+
+# (label, table, detail columns) searched by the global search bar
+SEARCH_SOURCES = [
+    ("Hospital", "hospitals", ["address", "contact"]),
+    ("Emergency", "emergency_contacts", ["contact_no"]),
+    ("Personal", "personal_contacts", ["contact_no"]),
+]
+
+DEFAULT_LIMIT = 25
+# Shorter queries match nearly everything and aren't worth a round trip
+MIN_QUERY_LENGTH = 2
+# Most matches per table that get ranked. bm25 has to score every match before the best
+# can be picked, which for a broad prefix ("ca", "road") over a million rows takes
+# seconds; such a table is reported as too broad (SearchResults.too_broad) until more
+# typing narrows it down, rather than ranking an arbitrary slice of its matches.
+RANK_LIMIT = 5000
+
+
+class SearchResults(list):
+    """search() results, best first, plus the kinds (e.g. "Hospital") that matched more
+    than RANK_LIMIT rows and were left out."""
+    def __init__(self, results=(), too_broad=()):
+        super().__init__(results)
+        self.too_broad = list(too_broad)
+
+
+def build_match_query(text):
+    """Turns free text into an FTS5 query: every word must match, as a prefix.
+
+    "cardiac ring ro" -> '"cardiac"* "ring"* "ro"*'
+    """
+    tokens = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search(text, limit=DEFAULT_LIMIT, tables=None):
+    """Ranked full-text search over hospitals and contacts.
+
+    Each table is queried through its FTS5 index ordered by bm25 and capped at limit,
+    then the results are merged by rank (lower is better). Tables with more than
+    RANK_LIMIT matches are left out and named in the result's too_broad.
+    """
+    match = build_match_query(text)
+    if not match or len(text.strip()) < MIN_QUERY_LENGTH:
+        return SearchResults()
+
+    results, too_broad = [], []
+    for kind, table, detail_columns in SEARCH_SOURCES:
+        if tables is not None and table not in tables:
+            continue
+        fts = f"{table}_fts"
+        details = " || ' - ' || ".join(f"t.{col}" for col in detail_columns)
+        # Counting stops at the cap and scores nothing, so this check stays cheap
+        matches = db.fetch_one(f"SELECT COUNT(*) FROM (SELECT rowid FROM {fts} WHERE {fts} MATCH ? LIMIT ?)",
+                               (match, RANK_LIMIT + 1))[0]
+        if matches > RANK_LIMIT:
+            too_broad.append(kind)
+            continue
+        rows = db.fetch_all(f"""
+            SELECT t.id, t.name, {details}, m.rank
+            FROM (SELECT rowid, rank FROM {fts} WHERE {fts} MATCH ? ORDER BY rank LIMIT ?) m
+            JOIN {table} t ON t.id = m.rowid
+            ORDER BY m.rank
+        """, (match, limit))
+        results.extend(SearchResult(kind, table, *row) for row in rows)
+
+    results.sort(key=lambda result: result.rank)
+    return SearchResults(results[:limit], too_broad)
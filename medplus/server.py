@@ -0,0 +1,406 @@
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import sys
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from medplus.database import db, POOL_SIZE
+from medplus.auth import Auth
+from medplus.repositories import users
+from medplus.search import search
+from medplus.table_model import TABLES, get_model
+
+# One process owns medplus.db; front-desk stations talk to it over HTTP/JSON instead of
+# opening the file over a network share. Reads run concurrently on pooled connections,
+# writes queue up for a single writer thread that commits them in batches.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Readers get a pooled connection each; the writer thread holds the last one
+READ_WORKERS = POOL_SIZE - 1
+# Writes waiting in the queue are committed together, up to this many per transaction
+WRITE_BATCH = 256
+MAX_BODY = 16 * 1024 * 1024
+# Most rows one /search or /scan reply may carry, whatever limit the client asks for
+MAX_LIMIT = 1000
+# Clients must send "Authorization: Bearer <token>" when the server has one
+TOKEN_ENV = "MEDPLUS_SERVER_TOKEN"
+# Every other route needs "X-MedPlus-Session: <session>" from /auth/login; the station
+# token only says the request comes from one of our machines, not who is at it
+SESSION_HEADER = "x-medplus-session"
+# Sessions end after this long without a request
+SESSION_IDLE_SECONDS = 8 * 3600
+# Role needed per table to read it, and to insert/update/delete (default USER). ADMIN can
+# do everything a USER can.
+READ_ROLES = {"users": "ADMIN"}
+WRITE_ROLES = {"hospitals": "ADMIN", "emergency_contacts": "ADMIN", "users": "ADMIN"}
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+Session = namedtuple("Session", ["id", "username", "role", "expires"])
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class WriteQueue:
+    """Serializes writes onto one thread and commits whatever has queued up in one go.
+
+    Each write runs inside its own savepoint, so a failing one is undone and reported
+    back to its caller without costing the rest of the batch its commit.
+    """
+    def __init__(self, batch_size=WRITE_BATCH):
+        self.batch_size = batch_size
+        self.batches = 0
+        self.writes = 0
+        self._queue = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="medplus-writer")
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    def submit(self, func, *args):
+        """Queues func(*args) for the writer; returns a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((func, args, future))
+        return future
+
+    async def data_version(self):
+        """The writer connection's data_version: moves with our commits and anyone else's."""
+        loop = asyncio.get_running_loop()
+        return list(await loop.run_in_executor(self._executor, db.data_version))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                outcomes = await loop.run_in_executor(self._executor, self._write, batch)
+            except Exception as e:
+                # The commit itself failed: nothing in the batch was written
+                outcomes = [(False, e)] * len(batch)
+            self.batches += 1
+            self.writes += len(batch)
+            for (_, _, future), (ok, value) in zip(batch, outcomes):
+                if future.cancelled():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    @staticmethod
+    def _write(batch):
+        outcomes = []
+        with db.transaction():
+            for func, args, _ in batch:
+                db.execute_query("SAVEPOINT queued_write")
+                try:
+                    outcomes.append((True, func(*args)))
+                    db.execute_query("RELEASE queued_write")
+                except Exception as e:
+                    db.execute_query("ROLLBACK TO queued_write")
+                    db.execute_query("RELEASE queued_write")
+                    outcomes.append((False, e))
+        return outcomes
+
+
+class MedPlusServer:
+    """Routes the JSON API onto Auth, the table models and search.
+
+        POST /auth/login                {username, password, role}  -> {success, message, session}
+        POST /auth/register             {username, password, role}  -> {success, message}
+        POST /auth/logout                                           -> {success}
+        GET  /tables/<table>/count      ?search=                    -> {total}
+        GET  /tables/<table>/page       ?page=&order_by=&descending=&search=&after=<json> -> {rows}
+        GET  /tables/<table>/scan       ?after=<json>&limit=        -> {rows, next}
+        GET  /tables/<table>/get        ?key=<json>                 -> {row}
+        POST /tables/<table>/insert     {values}                    -> {row, version}
+        POST /tables/<table>/update     {key, changes}              -> {row, version}
+        POST /tables/<table>/delete     {keys}                      -> {deleted, version}
+        GET  /search                    ?q=&limit=&tables=a,b       -> {results, too_broad}
+        GET  /version                                               -> {version}
+
+    Everything except login and USER registration needs a session from /auth/login, and
+    READ_ROLES/WRITE_ROLES decide what that session's role may touch.
+    """
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, read_workers=READ_WORKERS):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.writes = WriteQueue()
+        self.sessions = {}  # session id -> Session; only touched on the event loop
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="medplus-reader")
+        self._server = None
+
+    async def start(self):
+        # Open the database (and migrate) before accepting anyone
+        await asyncio.get_running_loop().run_in_executor(self._readers, db.get)
+        self.writes.start()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # In case port 0 picked one
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"MedPlus server on http://{self.host}:{self.port}", file=sys.stderr)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.writes.stop()
+        self._readers.shutdown(wait=True)
+
+    def read(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self._readers, lambda: func(*args))
+
+    # --- HTTP ------------------------------------------------------------------------
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                status, payload, keep_alive = await self._handle_request(request_line, reader)
+                body = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line, reader):
+        # Until the whole request has been read, an error leaves unread bytes behind that
+        # the next request would be parsed from, so the connection closes after replying
+        keep_alive = False
+        try:
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                raise HTTPError(400, "Malformed request line")
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            try:
+                length = int(headers.get("content-length") or 0)
+            except ValueError:
+                raise HTTPError(400, "Bad Content-Length")
+            if length < 0:
+                raise HTTPError(400, "Bad Content-Length")
+            if length > MAX_BODY:
+                raise HTTPError(413, "Request body too large")
+            raw = await reader.readexactly(length) if length else b""
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            body = {}
+            if raw:
+                try:
+                    body = json.loads(raw)
+                except ValueError:
+                    raise HTTPError(400, "Body is not valid JSON")
+
+            if self.token and not hmac.compare_digest(headers.get("authorization", ""), f"Bearer {self.token}"):
+                raise HTTPError(401, "Missing or wrong token")
+            url = urlsplit(target)
+            query = dict((key, values[-1]) for key, values in parse_qs(url.query).items())
+            session = self._session(headers.get(SESSION_HEADER))
+            return 200, await self.dispatch(method, url.path, query, body, session), keep_alive
+        except HTTPError as e:
+            return e.status, {"error": str(e)}, keep_alive
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": str(e)}, keep_alive
+        except Exception as e:
+            print(f"Server error: {e}", file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            return 500, {"error": str(e)}, keep_alive
+
+    # --- API -------------------------------------------------------------------------
+
+    def _session(self, session_id):
+        """The live Session for session_id (extending it), or None."""
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            return None
+        now = time.monotonic()
+        if session.expires < now:
+            del self.sessions[session_id]
+            return None
+        self.sessions[session_id] = session._replace(expires=now + SESSION_IDLE_SECONDS)
+        return session
+
+    @staticmethod
+    def _authorize(session, role="USER"):
+        if session is None:
+            raise HTTPError(401, "Log in first")
+        if role == "ADMIN" and session.role != "ADMIN":
+            raise HTTPError(403, "Only an administrator can do that")
+
+    def _end_sessions(self, usernames):
+        for session_id, session in list(self.sessions.items()):
+            if session.username in usernames:
+                del self.sessions[session_id]
+
+    async def dispatch(self, method, path, query, body, session=None):
+        parts = [part for part in path.split("/") if part]
+        if len(parts) == 2 and parts[0] == "auth":
+            self._require(method, "POST")
+            return await self.auth(parts[1], body, session)
+        self._authorize(session)
+        if parts == ["version"]:
+            return {"version": await self.writes.data_version()}
+        if parts == ["search"]:
+            tables = query["tables"].split(",") if query.get("tables") else None
+            results = await self.read(search, query.get("q", ""), self._limit(query, 25), tables)
+            return {"results": [list(result) for result in results], "too_broad": results.too_broad}
+        if len(parts) == 3 and parts[0] == "tables":
+            if parts[1] not in TABLES:
+                raise HTTPError(404, f"Unknown table: {parts[1]}")
+            return await self.table(method, get_model(parts[1]), parts[2], query, body, session)
+        raise HTTPError(404, f"Not found: {path}")
+
+    @staticmethod
+    def _limit(query, default):
+        try:
+            limit = int(query.get("limit", default))
+        except ValueError:
+            raise HTTPError(400, "limit must be an integer")
+        # SQLite reads a negative LIMIT as no limit at all
+        return max(1, min(limit, MAX_LIMIT))
+
+    @staticmethod
+    def _require(method, expected):
+        if method != expected:
+            raise HTTPError(405, f"Use {expected}")
+
+    async def auth(self, action, body, session=None):
+        if action == "logout":
+            if session is not None:
+                self.sessions.pop(session.id, None)
+            return {"success": True}
+        username, password, role = body["username"], body["password"], body.get("role", "USER")
+        if action == "login":
+            # Checking the password is slow, so it runs on a reader; a legacy hash it
+            # upgrades is handed back and written through the queue like any other write
+            upgrades = []
+            success, message = await self.read(Auth.login, username, password, role,
+                                               lambda *upgrade: upgrades.append(upgrade))
+            for upgrade in upgrades:
+                try:
+                    await self.writes.submit(users.set_password_hash, *upgrade)
+                except Exception as e:
+                    print(f"Error upgrading password hash for {username}: {e}", file=sys.stderr)
+            if success:
+                session_id = secrets.token_urlsafe(32)
+                expires = time.monotonic() + SESSION_IDLE_SECONDS
+                self.sessions[session_id] = Session(session_id, username, role, expires)
+                return {"success": True, "message": message, "session": session_id}
+        elif action == "register":
+            if role != "USER":
+                # Anyone may sign up; only an administrator may create another one
+                self._authorize(session, "ADMIN")
+            # Hashing is the slow part; keep it off the writer so queued writes aren't held up
+            hashed = await self.read(Auth.hash_password, password)
+            success, message = await self.writes.submit(Auth.create_user, username, hashed, role)
+        else:
+            raise HTTPError(404, f"Unknown auth action: {action}")
+        return {"success": success, "message": message}
+
+    async def table(self, method, model, action, query, body, session=None):
+        if action in ("count", "page", "scan", "get"):
+            self._require(method, "GET")
+            self._authorize(session, READ_ROLES.get(model.table_name, "USER"))
+        else:
+            self._require(method, "POST")
+            self._authorize(session, WRITE_ROLES.get(model.table_name, "USER"))
+
+        if action == "count":
+            return {"total": await self.read(model.count_rows, query.get("search", ""))}
+        if action == "page":
+            after = json.loads(query["after"]) if query.get("after") else None
+            rows = await self.read(model.query_page, int(query["page"]), query.get("order_by"),
+                                   query.get("descending") == "1", query.get("search", ""), after)
+            return {"rows": rows}
+        if action == "scan":
+            after = json.loads(query["after"]) if query.get("after") else None
+            rows, after = await self.read(model.repository.page, after, self._limit(query, MAX_LIMIT))
+            return {"rows": rows, "next": after if rows else None}
+        if action == "get":
+            return {"row": await self.read(model.repository.get, json.loads(query["key"]))}
+        # Writes reply with the version after their commit, sparing the client a /version trip
+        if action == "insert":
+            row = await self.writes.submit(model.write_insert, body["values"])
+            return {"row": row, "version": await self.writes.data_version()}
+        if action == "update":
+            row = await self.writes.submit(model.write_update, body["key"], body["changes"])
+            return {"row": row, "version": await self.writes.data_version()}
+        if action == "delete":
+            deleted = await self.writes.submit(model.write_delete, body["keys"])
+            if model.table_name == "users":
+                # A deleted account is logged out everywhere
+                self._end_sessions(set(body["keys"]))
+            return {"deleted": deleted, "version": await self.writes.data_version()}
+        raise HTTPError(404, f"Unknown table action: {action}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the MedPlus database to desktop clients over HTTP/JSON.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="interface to listen on (0.0.0.0 for every station)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", help="database file (default: medplus.db)")
+    parser.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                        help=f"shared secret clients must send (default: ${TOKEN_ENV})")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.configure(path=args.db)
+    if args.host not in ("127.0.0.1", "localhost") and not args.token:
+        print("Warning: listening beyond this machine without --token; anyone on the network can edit data.",
+              file=sys.stderr)
+
+    server = MedPlusServer(args.host, args.port, args.token)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
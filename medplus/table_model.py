@@ -0,0 +1,378 @@
+from collections import OrderedDict
+from medplus.database import db
+from medplus.repositories import REPOSITORIES
+
+# Rows fetched per database round trip
+PAGE_SIZE = 200
+# Pages kept per result set, shared by every view of that table using the same sort/filter
+MAX_CACHED_PAGES = 64
+# Distinct sort/filter combinations kept per table
+MAX_RESULT_SETS = 8
+
+# Columns each view shows (the first one is the row key), the ones a new row is made of,
+# the ones views may sort by (each backed by an index) and the ones the filter box searches.
+# users rows are keyed by username and never expose password_hash.
+TABLES = {
+    "hospitals": {
+        "select": ["id", "name", "address", "contact"],
+        "key": "id",
+        "insert": ["name", "address", "contact"],
+        "sortable": ["id", "name", "address", "contact"],
+        "search": ["name", "address", "contact"],
+    },
+    "emergency_contacts": {
+        "select": ["id", "name", "contact_no"],
+        "key": "id",
+        "insert": ["name", "contact_no"],
+        "sortable": ["id", "name", "contact_no"],
+        "search": ["name", "contact_no"],
+    },
+    "personal_contacts": {
+        "select": ["id", "name", "contact_no"],
+        "key": "id",
+        "insert": ["name", "contact_no"],
+        "sortable": ["id", "name", "contact_no"],
+        "search": ["name", "contact_no"],
+    },
+    "users": {
+        "select": ["username", "username", "role"],
+        "key": "username",
+        "insert": [],
+        "sortable": ["username", "role"],
+        "search": ["username"],
+    },
+}
+
+
+def escape_like(text):
+    """Escapes LIKE wildcards so user input is matched literally (use with ESCAPE '\\')."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class TableModel:
+    """Process-wide, shared view of one table.
+
+    Rows are loaded page by page on demand and kept as plain tuples, once per table and
+    sort/filter combination no matter how many windows show them. Sorting, filtering and
+    paging happen in SQLite; only the displayed columns are ever selected. Writes made
+    through the model are broadcast to every subscriber as row level events:
+
+        ("insert", row), ("update", row), ("delete", key), ("reload", None)
+    """
+    def __init__(self, table_name, select_columns, key_column="id", insert_columns=(),
+                 sortable_columns=(), search_columns=(), page_size=PAGE_SIZE):
+        self.table_name = table_name
+        self.select_columns = list(select_columns)
+        self.key_column = key_column
+        self.insert_columns = list(insert_columns)
+        self.sortable_columns = list(sortable_columns)
+        self.search_columns = list(search_columns)
+        self.page_size = page_size
+        self.repository = REPOSITORIES.get(table_name)
+        self._results = OrderedDict()  # (order_by, descending, search) -> {page: rows}
+        self._counts = {}              # search -> total, counts don't depend on the order
+        self._data_version = None
+        self._generation = 0  # Bumped whenever cached pages are dropped
+        self._listeners = []
+
+    # --- subscriptions ---------------------------------------------------------------
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _emit(self, event, payload):
+        for callback in list(self._listeners):
+            callback(event, payload)
+
+    # --- reads -----------------------------------------------------------------------
+
+    def count(self, search=""):
+        total = self._counts.get(search)
+        if total is None:
+            total = self._counts[search] = self.count_rows(search)
+        return total
+
+    def count_rows(self, search=""):
+        """Counts matching rows in the database, bypassing the cache; safe off the Tk thread."""
+        where, params = self._where(search)
+        row = db.fetch_one(f"SELECT COUNT(*) FROM {self.table_name}{where}", params)
+        return row[0] if row else 0
+
+    def rows(self, start, end, order_by=None, descending=False, search=""):
+        """Rows [start, end) of the sorted/filtered table, served from the shared page cache."""
+        if end <= start:
+            return []
+        result = self._result_set(order_by, descending, search)
+        rows = []
+        first_page, last_page = start // self.page_size, (end - 1) // self.page_size
+        for page in range(first_page, last_page + 1):
+            rows.extend(self._page(result, page, order_by, descending, search))
+        offset = first_page * self.page_size
+        return rows[start - offset:end - offset]
+
+    def peek_count(self, search=""):
+        """The cached row count, or None if counting would need a query."""
+        return self._counts.get(search)
+
+    def peek_rows(self, start, end, order_by=None, descending=False, search=""):
+        """Like rows(), but only answers from the cache: None if any page is missing."""
+        if end <= start:
+            return []
+        result = self._results.get((self._order_column(order_by), descending, search))
+        if result is None:
+            return None
+        first_page, last_page = start // self.page_size, (end - 1) // self.page_size
+        if any(page not in result for page in range(first_page, last_page + 1)):
+            return None
+        return self.rows(start, end, order_by, descending, search)
+
+    def load(self, start, end, order_by=None, descending=False, search="", with_count=True):
+        """Reads the pages covering [start, end) (and the count) without touching the cache.
+
+        Safe to call from a worker thread; hand the result to store() on the Tk thread.
+        """
+        first_page, last_page = start // self.page_size, max(start, end - 1) // self.page_size
+        generation = self._generation
+        total = None
+        if with_count:
+            total = self.count_rows(search)
+        # A plain dict lookup is safe off the Tk thread; it only lets the first page seek
+        cached = self._results.get((self._order_column(order_by), descending, search)) or {}
+        pages = {}
+        for page in range(first_page, last_page + 1):
+            previous = pages.get(page - 1) or cached.get(page - 1)
+            pages[page] = self._query_page(page, order_by, descending, search, previous)
+        return generation, total, pages
+
+    def store(self, loaded, order_by=None, descending=False, search=""):
+        """Caches what load() read, unless a write invalidated the cache in the meantime."""
+        generation, total, pages = loaded
+        if generation != self._generation:
+            return False
+        if total is not None:
+            self._counts[search] = total
+        result = self._result_set(order_by, descending, search)
+        for page, rows in pages.items():
+            result[page] = rows
+        while len(result) > MAX_CACHED_PAGES:
+            result.popitem(last=False)
+        return True
+
+    def refresh(self, force=False, version=None):
+        """Drops the cache and tells every view to reload if the database changed underneath us.
+
+        version is a data_version() already read on a worker; without it one is read here.
+        """
+        if version is None:
+            version = self.data_version()
+        if not force and version == self._data_version:
+            return False
+        self._invalidate()
+        self._data_version = version
+        self._emit("reload", None)
+        return True
+
+    def data_version(self):
+        """Token that changes whenever the table may have been written by someone else."""
+        return db.data_version()
+
+    def _written_version(self):
+        """data_version() as of our last write, recorded so our own writes don't trigger a reload."""
+        return self.data_version()
+
+    def _result_set(self, order_by, descending, search):
+        key = (self._order_column(order_by), descending, search)
+        result = self._results.get(key)
+        if result is None:
+            result = self._results[key] = OrderedDict()
+            while len(self._results) > MAX_RESULT_SETS:
+                self._results.popitem(last=False)
+        else:
+            self._results.move_to_end(key)
+        return result
+
+    def _order_column(self, order_by):
+        # Only whitelisted (and indexed) columns ever reach the ORDER BY clause
+        return order_by if order_by in self.sortable_columns else self.key_column
+
+    def _search_condition(self, search):
+        if not search or not self.search_columns:
+            return None, ()
+        pattern = f"%{escape_like(search)}%"
+        clauses = " OR ".join(f"{col} LIKE ? ESCAPE '\\'" for col in self.search_columns)
+        return clauses, (pattern,) * len(self.search_columns)
+
+    def _where(self, search):
+        condition, params = self._search_condition(search)
+        return (f" WHERE ({condition})" if condition else ""), params
+
+    def _page(self, result, page, order_by, descending, search):
+        rows = result.get(page)
+        if rows is None:
+            rows = result[page] = self._query_page(page, order_by, descending, search, result.get(page - 1))
+            while len(result) > MAX_CACHED_PAGES:
+                result.popitem(last=False)
+        else:
+            result.move_to_end(page)
+        return rows
+
+    def _query_page(self, page, order_by, descending, search, previous=None):
+        after = None
+        if previous is not None and len(previous) == self.page_size:
+            # Scrolling on from a page we already have: seek past its last row through the
+            # index (keyset) rather than making SQLite skip page * page_size rows
+            last = previous[-1]
+            order_col = self._order_column(order_by)
+            after = last[0] if order_col == self.key_column else (last[self.select_columns.index(order_col)], last[0])
+        return self.query_page(page, order_by, descending, search, after)
+
+    def query_page(self, page, order_by=None, descending=False, search="", after=None):
+        """One page straight from the database, bypassing the cache; safe off the Tk thread.
+
+        after is the sort key of the previous page's last row (see _query_page); with it
+        the page is a keyset seek, without it an OFFSET query.
+        """
+        order_col = self._order_column(order_by)
+        if after is not None:
+            condition, params = self._search_condition(search)
+            rows, _ = db.fetch_page(self.table_name, after, self.page_size, order_col, self.select_columns,
+                                    descending, condition, params)
+            return rows
+
+        # Jumping straight to a page (scrollbar drag) has no row to seek from
+        cols = ", ".join(self.select_columns)
+        where, params = self._where(search)
+        direction = "DESC" if descending else "ASC"
+        order = f"{order_col} {direction}"
+        if order_col != self.key_column:
+            # Tie-break on the key so paging is stable across equal names
+            order += f", {self.key_column} {direction}"
+        return db.fetch_all(f"SELECT {cols} FROM {self.table_name}{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                            (*params, self.page_size, page * self.page_size))
+
+    def _view_row(self, row):
+        """The repository's row as this model's views lay it out."""
+        if row is None or list(row._fields) == self.select_columns:
+            return tuple(row) if row is not None else None
+        return tuple(getattr(row, col) for col in self.select_columns)
+
+    def _default_result(self):
+        return self._results.get((self.key_column, False, ""))
+
+    def _invalidate(self, keep_default=False):
+        """Forgets cached pages; the unsorted, unfiltered set can be kept and patched by the caller."""
+        self._generation += 1
+        for key, pages in self._results.items():
+            if not (keep_default and key == (self.key_column, False, "")):
+                pages.clear()
+        total = self._counts.get("") if keep_default else None
+        self._counts.clear()
+        if total is not None:
+            self._counts[""] = total
+
+    # --- writes ----------------------------------------------------------------------
+    #
+    # Each write comes in two halves: write_*() only talks to the database and may run on a
+    # worker thread, apply_*() patches the cache and notifies the views on the Tk thread.
+    # insert/update/delete_many do both in one go.
+
+    def insert(self, values):
+        """Inserts a row made of insert_columns values and returns it as the views see it."""
+        row = self.write_insert(values)
+        self.apply_insert(row)
+        return row
+
+    def write_insert(self, values):
+        return self._view_row(self.repository.insert(values))
+
+    def apply_insert(self, row):
+        # Sorted or filtered sets can't know where the row lands; they re-fetch on demand
+        self._invalidate(keep_default=True)
+        if "" in self._counts:
+            self._counts[""] += 1
+        default = self._default_result()
+        # In key order a new id can only land on the trailing page
+        if default:
+            default.pop(max(default), None)
+        self._data_version = self._written_version()
+        self._emit("insert", row)
+
+    def update(self, key, changes):
+        """Updates the given {column: value} pairs of one row."""
+        row = self.write_update(key, changes)
+        self.apply_update(key, row)
+        return row
+
+    def write_update(self, key, changes):
+        return self._view_row(self.repository.update(key, changes))
+
+    def apply_update(self, key, row):
+        # The row may move in a sorted view or drop out of a filtered one
+        self._invalidate(keep_default=True)
+        default = self._default_result()
+        if default is not None:
+            for rows in default.values():
+                for i, cached in enumerate(rows):
+                    if cached[0] == key:
+                        rows[i] = row
+        self._data_version = self._written_version()
+        self._emit("update", row)
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        """Deletes several rows in one transaction (one commit, all or nothing)."""
+        keys = list(keys)
+        if keys:
+            self.apply_delete(keys, self.write_delete(keys))
+
+    def write_delete(self, keys):
+        """Deletes the rows and returns how many were actually removed."""
+        return self.repository.delete_many(keys)
+
+    def apply_delete(self, keys, deleted):
+        self._invalidate(keep_default=True)
+        if "" in self._counts:
+            self._counts[""] = max(0, self._counts[""] - deleted)
+        default = self._default_result()
+        if default is not None:
+            # Everything after the first deleted row shifts up
+            wanted = set(keys)
+            first_stale = None
+            for page, rows in default.items():
+                if any(row[0] in wanted for row in rows):
+                    first_stale = page if first_stale is None else min(first_stale, page)
+            first_stale = 0 if first_stale is None else first_stale
+            for page in [page for page in default if page >= first_stale]:
+                del default[page]
+        self._data_version = self._written_version()
+        for key in keys:
+            self._emit("delete", key)
+
+
+_models = {}
+
+def local_model(table_name, spec):
+    return TableModel(table_name, spec["select"], spec["key"], spec["insert"],
+                      spec["sortable"], spec["search"])
+
+# Builds the model for (table_name, spec); client mode swaps in one that talks to a server
+_model_factory = local_model
+
+def set_model_factory(factory):
+    """Makes get_model() build models with factory(table_name, spec), dropping existing ones."""
+    global _model_factory
+    _model_factory = factory
+    _models.clear()
+
+def get_model(table_name):
+    """Returns the shared model for table_name, creating it on first use."""
+    model = _models.get(table_name)
+    if model is None:
+        model = _models[table_name] = _model_factory(table_name, TABLES[table_name])
+    return model
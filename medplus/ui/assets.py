@@ -0,0 +1,213 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Upper bound for decoded pixels held by the store (masters + resized renders)
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+# Number of finished background renders kept around (a handful of common window sizes)
+RENDER_CACHE_SIZE = 8
+
+
+def resolve_asset_path(image_path):
+    """Finds an asset relative to the project root, falling back to the CWD."""
+    if os.path.isabs(image_path):
+        return image_path
+
+    # This file is in medplus/ui/assets.py
+    current_file_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(current_file_dir))
+    full_path = os.path.join(project_root, image_path)
+
+    if not os.path.exists(full_path):
+        full_path = os.path.join(os.getcwd(), image_path)
+    return full_path
+
+
+def image_nbytes(image):
+    """Approximate decoded size of a PIL image in bytes."""
+    return image.width * image.height * len(image.getbands())
+
+
+class AssetStore:
+    """Process-wide store of decoded background images.
+
+    Each asset is decoded once and kept as a "master" that is downscaled to just cover
+    the largest screen seen so far, so we never hold the full resolution PNG. Resized
+    renders for specific window sizes are cached on top of that. Everything is accounted
+    against a single memory budget; renders are evicted before masters, oldest first.
+    The Tk PhotoImages made from renders belong to the Tk thread and are kept by each
+    frame (BaseFrame._photos), not here.
+    """
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, max_renders=RENDER_CACHE_SIZE):
+        self.memory_budget = memory_budget
+        self.max_renders = max_renders
+        self.screen_size = (0, 0)
+        self._masters = OrderedDict()  # path -> (image, downscaled)
+        self._renders = OrderedDict()  # (path, width, height) -> image
+        self._bytes = 0
+        self._pending = set()  # paths queued or being decoded by the preloader
+        self._lock = threading.RLock()
+
+    def set_screen_size(self, width, height):
+        """Grows the master target size to cover the largest screen in use."""
+        with self._lock:
+            new_size = (max(self.screen_size[0], width), max(self.screen_size[1], height))
+            if new_size == self.screen_size:
+                return
+            self.screen_size = new_size
+
+            # Masters we shrank for a smaller screen would now be upscaled; decode them again on demand
+            for path, (image, downscaled) in list(self._masters.items()):
+                if downscaled and (image.width < new_size[0] or image.height < new_size[1]):
+                    self._drop_master(path)
+
+    def set_memory_budget(self, memory_budget):
+        with self._lock:
+            self.memory_budget = memory_budget
+            self._trim()
+
+    def peek_master(self, path):
+        """Returns the decoded master if it is already loaded, without decoding."""
+        with self._lock:
+            entry = self._masters.get(path)
+            if entry is None:
+                return None
+            self._masters.move_to_end(path)
+            return entry[0]
+
+    def get_master(self, path):
+        """Returns the shared master image for path, decoding it on first use."""
+        image = self.peek_master(path)
+        if image is not None:
+            return image
+
+        # Decode outside the lock so one slow PNG doesn't block every other caller
+        image, downscaled = self._decode(path)
+
+        with self._lock:
+            entry = self._masters.get(path)
+            if entry is not None:
+                # Somebody else decoded it in the meantime
+                return entry[0]
+            self._masters[path] = (image, downscaled)
+            self._bytes += image_nbytes(image)
+            self._trim(keep=path)
+            return image
+
+    def is_pending(self, path):
+        """True while the preloader still owes us this asset."""
+        with self._lock:
+            return path in self._pending
+
+    def preload(self, image_paths, render_size=None):
+        """Decodes assets on a background thread.
+
+        If render_size is given the LANCZOS render for that window size is prepared as
+        well, so the first frame using the asset can paint straight from the cache.
+        """
+        with self._lock:
+            paths = []
+            for image_path in image_paths:
+                path = resolve_asset_path(image_path)
+                if path in self._masters or path in self._pending or not os.path.exists(path):
+                    continue
+                self._pending.add(path)
+                paths.append(path)
+
+        thread = threading.Thread(target=self._preload_worker, args=(paths, render_size),
+                                  name="asset-preloader", daemon=True)
+        thread.start()
+        return thread
+
+    def _preload_worker(self, paths, render_size):
+        # First use of PIL usually happens here, so its import cost lands off the Tk thread
+        from PIL import Image
+        for path in paths:
+            try:
+                image = self.get_master(path)
+                if render_size and self.get_render(path, *render_size) is None:
+                    self.put_render(path, *render_size, image.resize(render_size, Image.Resampling.LANCZOS))
+            except Exception as e:
+                print(f"Error preloading {path}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+
+    def get_render(self, path, width, height):
+        with self._lock:
+            key = (path, width, height)
+            image = self._renders.get(key)
+            if image is not None:
+                self._renders.move_to_end(key)
+            return image
+
+    def put_render(self, path, width, height, image):
+        with self._lock:
+            key = (path, width, height)
+            old = self._renders.pop(key, None)
+            if old is not None:
+                self._bytes -= image_nbytes(old)
+            self._renders[key] = image
+            self._bytes += image_nbytes(image)
+            self._trim(keep=path)
+
+    def footprint(self):
+        """Current decoded size of everything held by the store, in bytes."""
+        with self._lock:
+            return self._bytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                "masters": len(self._masters),
+                "renders": len(self._renders),
+                "bytes": self._bytes,
+                "budget": self.memory_budget,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._masters.clear()
+            self._renders.clear()
+            self._bytes = 0
+
+    def _decode(self, path):
+        from PIL import Image
+        with Image.open(path) as source:
+            image = source.convert("RGBA" if "A" in source.getbands() or "transparency" in source.info else "RGB")
+
+        screen_w, screen_h = self.screen_size
+        if screen_w and screen_h:
+            # Smallest size that still covers the screen in both directions
+            scale = max(screen_w / image.width, screen_h / image.height)
+            if scale < 1:
+                size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0), True
+        return image, False
+
+    def _drop_master(self, path):
+        image, _ = self._masters.pop(path)
+        self._bytes -= image_nbytes(image)
+        # Renders are derived from the master so they go too
+        for key in [key for key in self._renders if key[0] == path]:
+            self._bytes -= image_nbytes(self._renders.pop(key))
+
+    def _trim(self, keep=None):
+        while len(self._renders) > self.max_renders:
+            _, image = self._renders.popitem(last=False)
+            self._bytes -= image_nbytes(image)
+
+        while self._bytes > self.memory_budget and self._renders:
+            _, image = self._renders.popitem(last=False)
+            self._bytes -= image_nbytes(image)
+
+        # Still over budget: evict least recently used masters, but never the one being handed out
+        while self._bytes > self.memory_budget:
+            victim = next((path for path in self._masters if path != keep), None)
+            if victim is None:
+                break
+            self._drop_master(victim)
+
+
+# Singleton instance
+asset_store = AssetStore()
@@ -1,13 +1,28 @@
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
+from medplus.ui.assets import asset_store, resolve_asset_path
+from medplus.ui.tasks import task_runner
+from collections import OrderedDict, deque
 import os
+import time
+
+# How long the window must stay the same size before we do the expensive LANCZOS pass
+RESIZE_SETTLE_MS = 150
+# How often a frame checks whether the preloader has finished its background
+PRELOAD_POLL_MS = 50
+# Frames kept alive (hidden) by switch_frame so switching back to them is cheap
+MAX_CACHED_FRAMES = 4
+# Number of recent switch_frame timings kept for switch_stats()
+SWITCH_TIMING_SAMPLES = 100
+# Finished backgrounds each frame keeps converted for Tk (e.g. restored and maximized)
+PHOTO_CACHE_SIZE = 2
 
 class MedPlusApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, server=None):
         super().__init__()
         self.title("MedPlus Hospital Management System")
-        self.geometry("1000x800")
+        self.initial_size = (1000, 800)
+        self.geometry("{}x{}".format(*self.initial_size))
         
         # Style Configuration
         self.style = ttk.Style(self)
@@ -44,16 +59,72 @@ class MedPlusApp(tk.Tk):
         
         self.style.configure('Card.TFrame', background="white", relief="raised")
         self.style.configure('Card.TLabel', background="white", foreground=self.text_color, font=default_font)
+        self.style.configure('Card.TRadiobutton', background="white", font=default_font)
         
         self.current_frame = None
+        self.max_cached_frames = MAX_CACHED_FRAMES
+        self._frame_cache = OrderedDict()  # frame class -> live (possibly hidden) instance
+        self.switch_timings = deque(maxlen=SWITCH_TIMING_SAMPLES)  # milliseconds
+
+        # Client mode: a medplus server (see server.py) owns the database and every read and
+        # write goes through it; otherwise this process opens medplus.db itself
+        self.client = None
+        if server:
+            from medplus.client import Client
+            self.client = Client(server)
+            self.client.install()
+
+        # Database and image work runs on worker threads and reports back through after()
+        task_runner.attach(self)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        task_runner.shutdown()
+        self.destroy()
+
+    def preload_assets(self, image_paths):
+        """Starts decoding background images off the main thread."""
+        asset_store.set_screen_size(self.winfo_screenwidth(), self.winfo_screenheight())
+        asset_store.preload(image_paths, render_size=self.initial_size)
 
     def switch_frame(self, frame_class, *args, **kwargs):
-        """Destroys current frame and replaces it with a new one."""
+        """Hides the current frame and shows frame_class, reusing a cached instance if we have one.
+
+        A reused frame gets the same arguments through its on_show() hook instead of __init__.
+        """
+        start = time.perf_counter()
+
         if self.current_frame:
-            self.current_frame.destroy()
-        
-        self.current_frame = frame_class(self, *args, **kwargs)
+            self.current_frame.on_hide()
+            self.current_frame.pack_forget()
+
+        frame = self._frame_cache.pop(frame_class, None)
+        if frame is not None and frame.winfo_exists():
+            frame.on_show(*args, **kwargs)
+        else:
+            frame = frame_class(self, *args, **kwargs)
+
+        # Most recently shown frame goes last; evict from the front when the pool is full
+        self._frame_cache[frame_class] = frame
+        while len(self._frame_cache) > self.max_cached_frames:
+            _, stale = self._frame_cache.popitem(last=False)
+            stale.destroy()
+
+        self.current_frame = frame
         self.current_frame.pack(fill="both", expand=True)
+        self.switch_timings.append((time.perf_counter() - start) * 1000)
+
+    def switch_stats(self):
+        """Summary of recent switch_frame latencies in milliseconds."""
+        timings = list(self.switch_timings)
+        if not timings:
+            return {"count": 0, "last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": len(timings),
+            "last_ms": timings[-1],
+            "avg_ms": sum(timings) / len(timings),
+            "max_ms": max(timings),
+        }
 
 class BaseFrame(tk.Frame):
     def __init__(self, master):
@@ -61,35 +132,41 @@ class BaseFrame(tk.Frame):
         self.master = master
         self.pack(fill="both", expand=True)
         self.bg_image_ref = None
-        self.original_image = None
         self.canvas = None
+        self.bg_key = None
+        self._bg_item = None
+        self._bg_size = None
+        self._photos = OrderedDict()  # (width, height) -> PhotoImage of the finished render
+        self._resize_job = None
+        self._refine_task = None
+        self._poll_job = None
+
+    def on_show(self, *args, **kwargs):
+        """Called when switch_frame reuses this frame; receives the switch_frame arguments."""
+        pass
+
+    def on_hide(self):
+        """Called before switch_frame hides this frame."""
+        pass
 
     def add_background(self, image_path):
         """Adds a responsive background image to the frame."""
-        # Find path relative to this file or project root
-        if not os.path.isabs(image_path):
-            # Try to find the project root (where medplus folder or main.py sits)
-            # This file is in medplus/ui/base.py
-            current_file_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(os.path.dirname(current_file_dir))
-            full_path = os.path.join(project_root, image_path)
-            
-            # Fallback to CWD if not found in project root
-            if not os.path.exists(full_path):
-                full_path = os.path.join(os.getcwd(), image_path)
-        else:
-            full_path = image_path
+        full_path = resolve_asset_path(image_path)
 
         if not os.path.exists(full_path):
              print(f"Warning: Background image not found at {full_path}")
              return
 
         try:
-            self.original_image = Image.open(full_path)
+            # Decoded once per process and shared by every frame using the same asset
+            asset_store.set_screen_size(self.winfo_screenwidth(), self.winfo_screenheight())
+            self.bg_key = full_path
             
             # Create a Canvas to hold the background
             # using place to ensure it covers everything at z=0 (bottom)
-            self.canvas = tk.Canvas(self, highlightthickness=0)
+            # Its background colour doubles as the placeholder until the image is ready
+            placeholder = getattr(self.master, 'bg_color', None) or self.cget('bg')
+            self.canvas = tk.Canvas(self, highlightthickness=0, bg=placeholder)
             self.canvas.place(relx=0, rely=0, relwidth=1, relheight=1)
             
             # Bind resize event
@@ -99,25 +176,120 @@ class BaseFrame(tk.Frame):
             # Canvas.lower refers to items, so we need to validly lower the widget.
             # Using tk.Misc.lower(widget) works.
             tk.Misc.lower(self.canvas)
+
+            if asset_store.is_pending(full_path):
+                # The preloader is still decoding it; paint once it's done
+                self._poll_job = self.after(PRELOAD_POLL_MS, self._poll_preload)
+            else:
+                asset_store.get_master(full_path)
             
         except Exception as e:
             print(f"Error loading background: {e}")
 
+    @property
+    def original_image(self):
+        """The shared master image for this frame's background (not a per-frame copy)."""
+        if self.bg_key is None:
+            return None
+        return asset_store.get_master(self.bg_key)
+
     def _on_resize(self, event):
-        if not self.original_image or not self.canvas:
-            return
-            
         # Get current frame size
-        width = event.width
-        height = event.height
-        
+        self._update_background(event.width, event.height)
+
+    def _update_background(self, width, height):
+        """Coalesces bursts of <Configure> events into a single high quality resize.
+
+        While the user is dragging we show a cached render if we have one, otherwise a
+        cheap NEAREST preview. The LANCZOS pass only runs once the size has settled.
+        """
+        if self.bg_key is None or not self.canvas:
+            return
+        if asset_store.is_pending(self.bg_key):
+            return # Placeholder stays until _poll_preload sees the image
+
         if width <= 1 or height <= 1: return # Ignore validation/init glitches
+        if (width, height) == self._bg_size: return # Already showing the final render
+
+        self._cancel_resize_job()
+
+        # A size this frame has shown before needs no PhotoImage conversion at all
+        cached = None if (width, height) in self._photos else asset_store.get_render(self.bg_key, width, height)
+        if cached is not None or (width, height) in self._photos:
+            self._show_background(cached, (width, height))
+            self._bg_size = (width, height)
+            return
+
+        original_image = self.original_image
+        if original_image is None:
+            return
+
+        from PIL import Image
+        preview = original_image.resize((width, height), Image.Resampling.NEAREST)
+        self._show_background(preview)
+        self._bg_size = None
+        self._resize_job = self.after(RESIZE_SETTLE_MS, self._refine_background, width, height)
+
+    def _poll_preload(self):
+        self._poll_job = None
+        if asset_store.is_pending(self.bg_key):
+            self._poll_job = self.after(PRELOAD_POLL_MS, self._poll_preload)
+            return
+        self._update_background(self.winfo_width(), self.winfo_height())
+
+    def _refine_background(self, width, height):
+        self._resize_job = None
+        original_image = self.original_image
+        if original_image is None or not self.canvas:
+            return
+
+        from PIL import Image
+        # Resampling a screen-sized image takes long enough to stall the UI; do it on a
+        # worker (PIL releases the GIL) and only build the PhotoImage back here
+        self._refine_task = task_runner.submit(
+            self, original_image.resize, (width, height), Image.Resampling.LANCZOS,
+            on_done=lambda resized_image: self._on_refined(width, height, resized_image),
+            key="background", busy=False)
+
+    def _on_refined(self, width, height, resized_image):
+        self._refine_task = None
+        asset_store.put_render(self.bg_key, width, height, resized_image)
+        self._photos.pop((width, height), None)  # Stale if the master was decoded again
+        self._show_background(resized_image, (width, height))
+        self._bg_size = (width, height)
+
+    def _show_background(self, image, size=None):
+        """Shows image; a finished render (size given) is converted once and kept per size."""
+        photo = self._photos.get(size) if size is not None else None
+        if photo is None:
+            from PIL import ImageTk
+            photo = ImageTk.PhotoImage(image)
+            if size is not None:
+                self._photos[size] = photo
+                while len(self._photos) > PHOTO_CACHE_SIZE:
+                    self._photos.popitem(last=False)
+        else:
+            self._photos.move_to_end(size)
+        self.bg_image_ref = photo
         
-        # Resize image
-        resized_image = self.original_image.resize((width, height), Image.Resampling.LANCZOS)
-        self.bg_image_ref = ImageTk.PhotoImage(resized_image)
-        
-        # Update canvas
-        self.canvas.delete("bg")
-        self.canvas.create_image(0, 0, image=self.bg_image_ref, anchor="nw", tags="bg")
+        # Update canvas in place rather than recreating the item each time
+        if self._bg_item is None:
+            self._bg_item = self.canvas.create_image(0, 0, image=self.bg_image_ref, anchor="nw", tags="bg")
+        else:
+            self.canvas.itemconfigure(self._bg_item, image=self.bg_image_ref)
+
+    def _cancel_resize_job(self):
+        if self._resize_job is not None:
+            self.after_cancel(self._resize_job)
+            self._resize_job = None
+        if self._refine_task is not None:
+            self._refine_task.cancel()
+            self._refine_task = None
 
+    def destroy(self):
+        # A pending refine or poll would otherwise fire on a dead canvas
+        self._cancel_resize_job()
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
+        super().destroy()
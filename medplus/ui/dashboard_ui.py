@@ -1,7 +1,32 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from medplus.ui.base import BaseFrame
-from medplus.database import db
+from medplus.ui.table_view import VirtualTreeview
+from medplus.ui.search_ui import SearchBar
+from medplus.ui.quickdial_ui import QuickDialPanel
+from medplus.table_model import get_model
+from medplus.importer import import_file
+from medplus.ui.tasks import task_runner
+
+# Pause in typing before the filter box re-queries
+FILTER_DELAY_MS = 250
+# How often the import progress window re-reads the worker's counters
+IMPORT_PROGRESS_MS = 200
+
+def close_child_windows(frame):
+    """Closes any CRUD windows a dashboard opened, so they don't outlive the session."""
+    for child in frame.winfo_children():
+        if isinstance(child, tk.Toplevel):
+            child.destroy()
+
+
+def end_session(frame):
+    """In client mode, logs the station's session out on the server as well."""
+    client = frame.master.client
+    if client:
+        task_runner.submit(frame.master, client.logout, busy=False,
+                           on_error=lambda e: print(f"Logout error: {e}"))
+
 
 class UserDashboardFrame(BaseFrame):
     def __init__(self, master, username):
@@ -19,8 +44,13 @@ class UserDashboardFrame(BaseFrame):
         header = ttk.Frame(self, padding=10, style='Card.TFrame') # Use Card style for white background
         header.pack(fill="x", pady=(20,0), padx=20)
         
-        ttk.Label(header, text=f"Welcome, {username}", style='SubHeader.TLabel', background="white").pack(side="left")
+        self.header_label = ttk.Label(header, text=f"Welcome, {username}", style='SubHeader.TLabel', background="white")
+        self.header_label.pack(side="left")
         ttk.Button(header, text="Logout", command=self.logout).pack(side="right")
+
+        # Global search over hospitals and contacts, results drop down under the header
+        self.search_bar = SearchBar(self, padding=10)
+        self.search_bar.pack(side="top", pady=(5, 0), padx=20, anchor="e")
         
         # Main Content Area
         # We want the background to show, so we might not want a big opaque frame filling everything.
@@ -36,16 +66,32 @@ class UserDashboardFrame(BaseFrame):
         
         ttk.Label(btn_frame, text="Dashboard Menu", style='SubHeader.TLabel', background="white").pack(pady=(0,20))
         
-        ttk.Button(btn_frame, text="View Hospital Map", command=self.show_map, width=30).pack(pady=10)
+        ttk.Button(btn_frame, text="Nearest Hospitals", command=self.show_map, width=30).pack(pady=10)
         ttk.Button(btn_frame, text="My Personal Contacts", command=self.manage_contacts, width=30).pack(pady=10)
         ttk.Button(btn_frame, text="Emergency Contacts", command=self.view_emergency_contacts, width=30).pack(pady=10)
 
+        # Quick dial sits to the left of the menu so it's one click away during a call
+        self.quick_dial = QuickDialPanel(self)
+        self.quick_dial.place(relx=0.03, rely=0.5, anchor="w")
+
+    def on_show(self, username):
+        self.username = username
+        self.header_label.config(text=f"Welcome, {username}")
+
+    def on_hide(self):
+        close_child_windows(self)
+        self.search_bar.clear()
+        self.quick_dial.clear()
+
     def logout(self):
         from medplus.ui.login_ui import LoginFrame
+        end_session(self)
         self.master.switch_frame(LoginFrame)
 
     def show_map(self):
-        messagebox.showinfo("Map", "Map functionality is under construction.\n(Opening GPS Module...)")
+        # Geo module (and NumPy, when installed) only load once someone asks for it
+        from medplus.ui.nearest_ui import NearestHospitalsWindow
+        NearestHospitalsWindow(self)
 
     def manage_contacts(self):
         # Open a dialog/window to manage contacts
@@ -53,7 +99,10 @@ class UserDashboardFrame(BaseFrame):
 
     def view_emergency_contacts(self):
         # Read-only or Add? Original allowed Add. Let's allow Add.
-        CRUDWindow(self, "Emergency Contacts", "emergency_contacts", ["Name", "Contact No"])
+        # A server only lets administrators change the shared emergency list
+        editable = not self.master.client
+        CRUDWindow(self, "Emergency Contacts", "emergency_contacts", ["Name", "Contact No"],
+                   allow_add=editable, allow_edit=editable, allow_delete=editable)
 
 
 class AdminDashboardFrame(BaseFrame):
@@ -67,8 +116,12 @@ class AdminDashboardFrame(BaseFrame):
         header = ttk.Frame(self, padding=10, style='Card.TFrame')
         header.pack(fill="x", pady=(20,0), padx=20)
         
-        ttk.Label(header, text=f"Admin Dashboard ({username})", style='SubHeader.TLabel', background="white").pack(side="left")
+        self.header_label = ttk.Label(header, text=f"Admin Dashboard ({username})", style='SubHeader.TLabel', background="white")
+        self.header_label.pack(side="left")
         ttk.Button(header, text="Logout", command=self.logout).pack(side="right")
+
+        self.search_bar = SearchBar(self, padding=10)
+        self.search_bar.pack(side="top", pady=(5, 0), padx=20, anchor="e")
         
         # Content - Center Card
         btn_frame = ttk.Frame(self, style='Card.TFrame', padding=30)
@@ -79,14 +132,66 @@ class AdminDashboardFrame(BaseFrame):
         ttk.Button(btn_frame, text="Manage Hospitals", command=self.manage_hospitals, width=30).pack(pady=10)
         # Original had specific Add/Delete/Modify buttons. A unified Manager is better.
         ttk.Button(btn_frame, text="Manage Users", command=self.manage_users, width=30).pack(pady=10)
+        if not master.client:
+            # Imports read a local file straight into the database; in client mode run
+            # `python -m medplus.importer` on the server instead
+            ttk.Button(btn_frame, text="Import Hospital Directory", command=self.import_hospitals, width=30).pack(pady=10)
         
+    def on_show(self, username):
+        self.username = username
+        self.header_label.config(text=f"Admin Dashboard ({username})")
+
+    def on_hide(self):
+        close_child_windows(self)
+        self.search_bar.clear()
+
     def logout(self):
         from medplus.ui.login_ui import LoginFrame
+        end_session(self)
         self.master.switch_frame(LoginFrame)
         
     def manage_hospitals(self):
         CRUDWindow(self, "Manage Hospitals", "hospitals", ["Name", "Address", "Contact"])
 
+    def import_hospitals(self):
+        path = filedialog.askopenfilename(
+            parent=self, title="Import Hospital Directory",
+            filetypes=[("CSV / JSON Lines", "*.csv *.jsonl *.json *.gz"), ("All files", "*.*")])
+        if not path:
+            return
+
+        # Small progress window; the import itself streams the file in batches on a worker
+        progress_window = tk.Toplevel(self)
+        progress_window.title("Importing...")
+        progress_label = ttk.Label(progress_window, text="Starting import...", padding=20)
+        progress_label.pack()
+        latest = [None]  # Written by the worker, read by the Tk thread
+
+        def report(summary):
+            latest[0] = f"{summary.read:,} read, {summary.inserted:,} inserted, {summary.rejected:,} rejected"
+
+        def show_progress():
+            if not progress_window.winfo_exists():
+                return
+            if latest[0]:
+                progress_label.config(text=latest[0])
+            progress_window.after(IMPORT_PROGRESS_MS, show_progress)
+
+        def on_done(summary):
+            progress_window.destroy()
+            # Open hospital views pick the new rows up through the shared model
+            model = get_model("hospitals")
+            task_runner.submit(self, model.data_version, on_done=lambda version: model.refresh(version=version),
+                               key="import-refresh", busy=False)
+            messagebox.showinfo("Import Complete", str(summary))
+
+        def on_error(e):
+            progress_window.destroy()
+            messagebox.showerror("Error", f"Import failed, nothing was written:\n{e}")
+
+        show_progress()
+        task_runner.submit(self, import_file, path, "hospitals", progress=report, on_done=on_done, on_error=on_error)
+
     def manage_users(self):
         # Specialized view for users (maybe just delete)
         CRUDWindow(self, "Manage Users", "users", ["Username", "Role"], allow_add=False, allow_edit=False)
@@ -102,6 +207,9 @@ class CRUDWindow(tk.Toplevel):
         # DB columns assumption: id is first, then rest map to 'columns' lowercased/slugified
         # Real generic CRUD is hard without schema reflection, so I'll do some basic mapping
         
+        # Shared with every other window on the same table
+        self.model = get_model(table_name)
+        
         self.create_widgets(allow_add, allow_edit, allow_delete)
         self.refresh_data()
 
@@ -118,42 +226,36 @@ class CRUDWindow(tk.Toplevel):
             ttk.Button(toolbar, text="Delete Selected", command=self.delete_item).pack(side="left", padx=5)
             
         ttk.Button(toolbar, text="Refresh", command=self.refresh_data).pack(side="right", padx=5)
+
+        # Filter box; the WHERE clause runs in SQLite once typing pauses
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", self.on_filter_changed)
+        self._filter_job = None
+        ttk.Entry(toolbar, textvariable=self.filter_var, width=25).pack(side="right", padx=5)
+        ttk.Label(toolbar, text="Filter:").pack(side="right")
         
-        # Treeview
+        # Virtual Treeview: only the rows on screen exist as items, the rest is paged in on scroll
         # ID is hidden usually, but let's keep it simple.
         cols = ["ID"] + self.columns
-        self.tree = ttk.Treeview(self, columns=cols, show='headings')
-        
-        for col in cols:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100) # Adjust as needed
-            
-        self.tree.pack(fill="both", expand=True, padx=10, pady=10)
+        self.table = VirtualTreeview(self, cols, self.model)
+        self.table.pack(fill="both", expand=True, padx=10, pady=10)
 
-    def refresh_data(self):
-        # Clear existing
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        # Fetch data
-        # Mapping table names to specific select queries if needed, or generic
-        # Generic SELECT * FROM table
-        # We need to map the result columns to the tree columns carefully.
-        # This is a simplification.
-        
+    def on_filter_changed(self, *args):
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_job = None
         try:
-            # handle 'users' which has password_hash that we don't want to show (or maybe shows as hash)
-            if self.table_name == "users":
-                # Special query
-                rows = db.fetch_all("SELECT rowid, username, role FROM users") # using rowid for sqlite if no int pk, but we defined string pk for users. 
-                # Wait, users table has username as PK.
-                # Let's adjust generic logic or switch based on table.
-                rows = db.fetch_all("SELECT username, username, role FROM users") # ID is username here
-            else:
-                rows = db.fetch_all(f"SELECT * FROM {self.table_name}")
-            
-            for row in rows:
-                self.tree.insert("", "end", values=row)
+            self.table.set_filter(self.filter_var.get())
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to filter data: {e}")
+
+    def refresh_data(self, force=False):
+        try:
+            # Skipped entirely when nothing has been written since the last load
+            self.table.refresh(force=force)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load data: {e}")
 
@@ -165,49 +267,35 @@ class CRUDWindow(tk.Toplevel):
             if val is None: return # Cancelled
             values.append(val)
         
-        # Insert
-        try:
-            placeholders = ",".join(["?"] * len(values))
-            # Need actual db column names. 
-            # Simplified map:
-            if self.table_name == "hospitals":
-                cols = "name, address, contact"
-            elif self.table_name == "personal_contacts" or self.table_name == "emergency_contacts":
-                cols = "name, contact_no"
-            else:
-                return
-
-            query = f"INSERT INTO {self.table_name} ({cols}) VALUES ({placeholders})"
-            db.execute_query(query, tuple(values))
-            self.refresh_data()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        # Insert; the model maps the values onto the table's columns and notifies every open view
+        if not self.model.insert_columns:
+            return
+        task_runner.submit(self, self.model.write_insert, values,
+                           on_done=self.model.apply_insert, on_error=self.show_error)
 
     def delete_item(self):
-        selected = self.tree.selection()
+        selected = self.table.selected_rows()
         if not selected:
             messagebox.showwarning("Warning", "Select an item to delete")
             return
         
-        item = self.tree.item(selected[0])
-        record_id = item['values'][0] # ID is first column
+        record_ids = [row[0] for row in selected] # ID is first column
         
-        confirm = messagebox.askyesno("Confirm", f"Delete record ID {record_id}?")
+        if len(record_ids) == 1:
+            confirm = messagebox.askyesno("Confirm", f"Delete record ID {record_ids[0]}?")
+        else:
+            confirm = messagebox.askyesno("Confirm", f"Delete {len(record_ids)} selected records?")
         if confirm:
-            try:
-                if self.table_name == "users":
-                    db.execute_query("DELETE FROM users WHERE username = ?", (record_id,))
-                else:
-                    db.execute_query(f"DELETE FROM {self.table_name} WHERE id = ?", (record_id,))
-                self.refresh_data()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+            # One transaction for the whole selection, on a worker; users are keyed by
+            # username, everything else by id, and the model knows which
+            task_runner.submit(self, self.model.write_delete, record_ids,
+                               on_done=lambda deleted: self.model.apply_delete(record_ids, deleted),
+                               on_error=self.show_error)
 
     def edit_item(self):
-        selected = self.tree.selection()
+        selected = self.table.selected_rows()
         if not selected: return
-        item = self.tree.item(selected[0])
-        record_id = item['values'][0]
+        record_id = selected[0][0]
         
         # Get new values for each column
         # Ideally pre-fill, but simpledialog doesn't support pre-fill easy without custom code.
@@ -217,13 +305,15 @@ class CRUDWindow(tk.Toplevel):
         # Just creating a new object is easiest, but editing is requested.
         # I'll implement a simple edit for the first logic column (Name) as a demo.
         
+        writable = self.model.repository.writable
+        if not writable:
+            return
         new_val = simpledialog.askstring("Edit", f"Enter new value for {self.columns[0]}", parent=self)
         if new_val:
-            try:
-                if self.table_name == "hospitals":
-                    db.execute_query("UPDATE hospitals SET name = ? WHERE id = ?", (new_val, record_id))
-                elif "contacts" in self.table_name:
-                    db.execute_query(f"UPDATE {self.table_name} SET name = ? WHERE id = ?", (new_val, record_id))
-                self.refresh_data()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+            # The first editable column is the name for every table that allows edits
+            task_runner.submit(self, self.model.write_update, record_id, {writable[0]: new_val},
+                               on_done=lambda row: self.model.apply_update(record_id, row),
+                               on_error=self.show_error)
+
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error), parent=self)
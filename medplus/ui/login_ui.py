@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from medplus.ui.base import BaseFrame
 from medplus.auth import auth
+from medplus.ui.tasks import task_runner
 
 class LoginFrame(BaseFrame):
     def __init__(self, master):
@@ -32,17 +33,19 @@ class LoginFrame(BaseFrame):
         role_frame = ttk.Frame(container, style='Card.TFrame')
         role_frame.pack(pady=(0, 20), fill="x")
         
-        # Custom style for radio buttons to match card background
-        style = ttk.Style()
-        style.configure('Card.TRadiobutton', background="white", font=('Segoe UI', 10))
-        
         ttk.Radiobutton(role_frame, text="User", variable=self.role_var, value="USER", style='Card.TRadiobutton').pack(side="left", padx=10)
         ttk.Radiobutton(role_frame, text="Admin", variable=self.role_var, value="ADMIN", style='Card.TRadiobutton').pack(side="left", padx=10)
         
         # Buttons
-        ttk.Button(container, text="Login", command=self.login).pack(fill="x", pady=5)
+        self.login_button = ttk.Button(container, text="Login", command=self.login)
+        self.login_button.pack(fill="x", pady=5)
         ttk.Button(container, text="Create Account", command=self.go_to_register).pack(fill="x", pady=5)
 
+    def on_show(self):
+        # Don't leave the previous user's credentials on a shared front-desk screen
+        self.username_var.set("")
+        self.password_var.set("")
+
     def login(self):
         username = self.username_var.get()
         password = self.password_var.get()
@@ -52,7 +55,16 @@ class LoginFrame(BaseFrame):
             messagebox.showerror("Error", "Please fill all fields")
             return
 
-        success, message = auth.login(username, password, role)
+        # Hashing and the lookup run on a worker; a locked database can't freeze the window
+        self.login_button.state(["disabled"])
+        backend = self.master.client or auth
+        task_runner.submit(self, backend.login, username, password, role,
+                           on_done=lambda result: self.on_login_result(result, role, username),
+                           on_error=self.on_login_error)
+
+    def on_login_result(self, result, role, username):
+        self.login_button.state(["!disabled"])
+        success, message = result
         if success:
             if hasattr(self.master, 'on_login_success'):
                 self.master.on_login_success(role, username)
@@ -61,6 +73,10 @@ class LoginFrame(BaseFrame):
         else:
             messagebox.showerror("Error", message)
 
+    def on_login_error(self, error):
+        self.login_button.state(["!disabled"])
+        messagebox.showerror("Error", f"Login failed: {error}")
+
     def go_to_register(self):
         self.master.switch_frame(RegisterFrame)
 
@@ -92,16 +108,19 @@ class RegisterFrame(BaseFrame):
         role_frame = ttk.Frame(container, style='Card.TFrame')
         role_frame.pack(pady=(0, 20), fill="x")
         
-        style = ttk.Style()
-        style.configure('Card.TRadiobutton', background="white", font=('Segoe UI', 10))
-        
         ttk.Radiobutton(role_frame, text="User", variable=self.role_var, value="USER", style='Card.TRadiobutton').pack(side="left", padx=10)
         ttk.Radiobutton(role_frame, text="Admin", variable=self.role_var, value="ADMIN", style='Card.TRadiobutton').pack(side="left", padx=10)
         
         # Buttons
-        ttk.Button(container, text="Register", command=self.register).pack(fill="x", pady=5)
+        self.register_button = ttk.Button(container, text="Register", command=self.register)
+        self.register_button.pack(fill="x", pady=5)
         ttk.Button(container, text="Back to Login", command=self.go_to_login).pack(fill="x", pady=5)
 
+    def on_show(self):
+        self.username_var.set("")
+        self.password_var.set("")
+        self.role_var.set("USER")
+
     def register(self):
         username = self.username_var.get()
         password = self.password_var.get()
@@ -111,12 +130,23 @@ class RegisterFrame(BaseFrame):
             messagebox.showerror("Error", "Please fill all fields")
             return
 
-        success, message = auth.register(username, password, role)
+        self.register_button.state(["disabled"])
+        backend = self.master.client or auth
+        task_runner.submit(self, backend.register, username, password, role,
+                           on_done=self.on_register_result, on_error=self.on_register_error)
+
+    def on_register_result(self, result):
+        self.register_button.state(["!disabled"])
+        success, message = result
         if success:
             messagebox.showinfo("Success", "Account created! Please login.")
             self.go_to_login()
         else:
             messagebox.showerror("Error", message)
 
+    def on_register_error(self, error):
+        self.register_button.state(["!disabled"])
+        messagebox.showerror("Error", f"Registration failed: {error}")
+
     def go_to_login(self):
         self.master.switch_frame(LoginFrame)
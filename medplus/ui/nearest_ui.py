@@ -0,0 +1,114 @@
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+from medplus.geo import locator, DEFAULT_K
+from medplus.importer import COORDINATE_RANGES
+from medplus.ui.tasks import task_runner
+
+MAX_RESULTS = 100
+
+
+class NearestHospitalsWindow(tk.Toplevel):
+    """Hospitals closest to a position, nearest first, with their distance.
+
+    The first search builds the in-memory grid of hospital coordinates on a worker; after
+    that each search only reads the cells around the position.
+    """
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Nearest Hospitals")
+        self.geometry("760x480")
+        self._results = []
+
+        form = ttk.Frame(self, padding=10)
+        form.pack(fill="x")
+        self.lat_var = tk.StringVar()
+        self.lon_var = tk.StringVar()
+        self.count_var = tk.StringVar(value=str(DEFAULT_K))
+        self.radius_var = tk.StringVar()
+        for label, var, width in [("Latitude", self.lat_var, 12), ("Longitude", self.lon_var, 12),
+                                  ("Within km (optional)", self.radius_var, 8)]:
+            ttk.Label(form, text=label).pack(side="left", padx=(0, 3))
+            entry = ttk.Entry(form, textvariable=var, width=width)
+            entry.pack(side="left", padx=(0, 10))
+            entry.bind('<Return>', lambda e: self.run_search())
+        ttk.Label(form, text="Show").pack(side="left", padx=(0, 3))
+        ttk.Spinbox(form, from_=1, to=MAX_RESULTS, textvariable=self.count_var, width=5).pack(side="left")
+        ttk.Button(form, text="Search", command=self.run_search).pack(side="right")
+
+        columns = [("Name", 220), ("Address", 250), ("Contact", 130), ("Distance (km)", 100)]
+        self.results = ttk.Treeview(self, columns=[col for col, _ in columns], show='headings', selectmode='browse')
+        for col, width in columns:
+            self.results.heading(col, text=col)
+            self.results.column(col, width=width, anchor="e" if col.startswith("Distance") else "w")
+        self.results.pack(fill="both", expand=True, padx=10)
+        self.results.bind('<Double-1>', self.show_selected)
+        self.results.bind('<Return>', self.show_selected)
+
+        self.status = ttk.Label(self, text="Enter a position in decimal degrees.", padding=10)
+        self.status.pack(anchor="w")
+
+    def read_form(self):
+        """(lat, lon, k, radius or None) from the form; raises ValueError with a message."""
+        values = []
+        for column, var in [("latitude", self.lat_var), ("longitude", self.lon_var)]:
+            try:
+                value = float(var.get().strip())
+            except ValueError:
+                raise ValueError(f"Enter a {column} in decimal degrees.")
+            low, high = COORDINATE_RANGES[column]
+            if not low <= value <= high:
+                raise ValueError(f"The {column} must be between {low:g} and {high:g}.")
+            values.append(value)
+        try:
+            k = min(max(int(self.count_var.get()), 1), MAX_RESULTS)
+            radius = float(self.radius_var.get()) if self.radius_var.get().strip() else None
+        except ValueError:
+            raise ValueError("The result count and distance must be numbers.")
+        if radius is not None and radius <= 0:
+            raise ValueError("The distance must be more than zero.")
+        return values[0], values[1], k, radius
+
+    def run_search(self):
+        try:
+            lat, lon, k, radius = self.read_form()
+        except ValueError as e:
+            messagebox.showwarning("Nearest Hospitals", str(e), parent=self)
+            return
+        if not locator.loaded:
+            self.status.config(text="Loading hospital locations...")
+        task_runner.submit(self, self.search, lat, lon, k, radius,
+                           on_done=self.show_results, on_error=self.show_error, key="nearest")
+
+    @staticmethod
+    def search(lat, lon, k, radius):
+        # Runs on a worker; returns the timing so it can be shown next to the results
+        locator.ensure_loaded()
+        start = time.perf_counter()
+        results = locator.nearest(lat, lon, k, max_km=radius)
+        return results, time.perf_counter() - start, locator.located()
+
+    def show_results(self, outcome):
+        self._results, elapsed, located = outcome
+        self.results.delete(*self.results.get_children())
+        for index, hospital in enumerate(self._results):
+            self.results.insert("", "end", iid=str(index), values=(
+                hospital.name, hospital.address, hospital.contact, f"{hospital.distance_km:.1f}"))
+        if not located:
+            self.status.config(text="No hospitals have a location yet.")
+        else:
+            self.status.config(text=f"{len(self._results)} of {located:,} located hospitals "
+                                    f"({elapsed * 1000:.1f} ms)")
+
+    def show_error(self, error):
+        self.status.config(text="")
+        messagebox.showerror("Error", f"Search failed: {error}", parent=self)
+
+    def show_selected(self, event=None):
+        selected = self.results.selection()
+        if not selected:
+            return
+        hospital = self._results[int(selected[0])]
+        messagebox.showinfo(hospital.name, f"{hospital.address}\n{hospital.contact}\n"
+                                           f"{hospital.distance_km:.1f} km away "
+                                           f"({hospital.latitude:.5f}, {hospital.longitude:.5f})", parent=self)
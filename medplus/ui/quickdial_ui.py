@@ -0,0 +1,78 @@
+import tkinter as tk
+from tkinter import ttk
+from medplus.quickdial import quick_dial
+from medplus.ui.tasks import task_runner
+
+RESULT_ROWS = 8
+
+
+class QuickDialPanel(ttk.Frame):
+    """Emergency quick dial: type part of a name or the last few digits of a number.
+
+    Lookups hit the in-memory prefix index on every keystroke, no database round trip; the
+    index is read on a worker as soon as the panel opens. Double-click or Enter copies the
+    number to the clipboard.
+    """
+    def __init__(self, master, **kwargs):
+        super().__init__(master, style='Card.TFrame', padding=15, **kwargs)
+        self._entries = []
+
+        ttk.Label(self, text="Quick Dial", style='SubHeader.TLabel', background="white").pack(anchor="w", pady=(0, 10))
+
+        self.query_var = tk.StringVar()
+        self.query_var.trace_add("write", self.on_query_changed)
+        entry = ttk.Entry(self, textvariable=self.query_var, width=30, font=('Segoe UI', 10))
+        entry.pack(fill="x")
+        entry.bind('<Down>', lambda e: self.focus_results())
+        entry.bind('<Return>', lambda e: self.copy_selected(first=True))
+
+        self.results = tk.Listbox(self, height=RESULT_ROWS, width=32, activestyle="none",
+                                  font=('Segoe UI', 10), relief="flat", highlightthickness=1)
+        self.results.pack(fill="both", expand=True, pady=(5, 0))
+        self.results.bind('<Double-1>', lambda e: self.copy_selected())
+        self.results.bind('<Return>', lambda e: self.copy_selected())
+
+        self.status = ttk.Label(self, text="", style='Card.TLabel')
+        self.status.pack(anchor="w", pady=(5, 0))
+
+        if not quick_dial.loaded:
+            self.status.config(text="Loading contacts...")
+            task_runner.submit(self, quick_dial.load, on_done=self.on_loaded,
+                               on_error=lambda e: self.status.config(text=f"Quick dial unavailable: {e}"),
+                               key="load", busy=False)
+
+    def on_loaded(self, loaded):
+        quick_dial.install(loaded)
+        # Anything typed while loading matched nothing; look it up again
+        self.on_query_changed()
+
+    def on_query_changed(self, *args):
+        try:
+            self._entries = quick_dial.lookup(self.query_var.get())
+        except Exception as e:
+            print(f"Quick dial error: {e}")
+            self._entries = []
+
+        self.results.delete(0, "end")
+        for entry in self._entries:
+            self.results.insert("end", f"{entry.name}  -  {entry.contact_no}  ({entry.kind})")
+        self.status.config(text="" if quick_dial.loaded else "Loading contacts...")
+
+    def focus_results(self):
+        if self._entries:
+            self.results.focus_set()
+            self.results.selection_set(0)
+            self.results.activate(0)
+
+    def copy_selected(self, first=False):
+        selection = self.results.curselection()
+        index = selection[0] if selection else (0 if first and self._entries else None)
+        if index is None:
+            return
+        entry = self._entries[index]
+        self.clipboard_clear()
+        self.clipboard_append(entry.contact_no)
+        self.status.config(text=f"Copied {entry.contact_no} for {entry.name}")
+
+    def clear(self):
+        self.query_var.set("")
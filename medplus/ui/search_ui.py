@@ -0,0 +1,83 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+from medplus.search import search
+from medplus.ui.tasks import task_runner
+
+# Pause in typing before the search runs; short enough to feel live
+SEARCH_DELAY_MS = 120
+RESULT_ROWS = 8
+
+
+class SearchBar(ttk.Frame):
+    """Global search box with a live, ranked result list underneath.
+
+    Results are refreshed as the user types (debounced) from the FTS5 indexes; the list
+    only appears while there is something to show.
+    """
+    def __init__(self, master, tables=None, **kwargs):
+        super().__init__(master, style='Card.TFrame', **kwargs)
+        self.tables = tables
+        self._job = None
+        self._results = []
+
+        self.query_var = tk.StringVar()
+        self.query_var.trace_add("write", self.on_query_changed)
+        entry = ttk.Entry(self, textvariable=self.query_var, width=40, font=('Segoe UI', 10))
+        entry.pack(side="top", fill="x")
+        entry.bind('<Escape>', lambda e: self.query_var.set(""))
+        # Shown when a table had too many matches to rank
+        self.hint = ttk.Label(self, style='Card.TLabel', foreground='gray')
+
+        self.results = ttk.Treeview(self, columns=["Type", "Name", "Details"], show='headings',
+                                    height=RESULT_ROWS, selectmode='browse')
+        for col, width in [("Type", 80), ("Name", 220), ("Details", 260)]:
+            self.results.heading(col, text=col)
+            self.results.column(col, width=width)
+        self.results.bind('<Double-1>', self.show_selected)
+        self.results.bind('<Return>', self.show_selected)
+
+    def on_query_changed(self, *args):
+        if self._job is not None:
+            self.after_cancel(self._job)
+        self._job = self.after(SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        self._job = None
+        # A newer query supersedes one still running, so results never arrive out of order
+        client = getattr(self.winfo_toplevel(), "client", None)
+        task_runner.submit(self, client.search if client else search, self.query_var.get(), tables=self.tables,
+                           on_done=self.show_results, on_error=self.on_search_error,
+                           key="search", busy=False)
+
+    def on_search_error(self, error):
+        print(f"Search error: {error}")
+        self.show_results([])
+
+    def show_results(self, results):
+        self._results = results
+        self.results.delete(*self.results.get_children())
+        for index, result in enumerate(self._results):
+            self.results.insert("", "end", iid=str(index), values=(result.kind, result.name, result.detail))
+
+        # Repacked in order so the hint always sits under the list
+        self.results.pack_forget()
+        self.hint.pack_forget()
+        if self._results:
+            self.results.pack(side="top", fill="x", pady=(5, 0))
+        too_broad = getattr(results, "too_broad", None)
+        if too_broad:
+            self.hint.config(text=f"Too many {', '.join(too_broad).lower()} matches - keep typing to narrow it down.")
+            self.hint.pack(side="top", fill="x", pady=(5, 0))
+        if self._results or too_broad:
+            # Drop down over the dashboard's centre card rather than under it
+            self.lift()
+
+    def show_selected(self, event=None):
+        selected = self.results.selection()
+        if not selected:
+            return
+        result = self._results[int(selected[0])]
+        messagebox.showinfo(result.kind, f"{result.name}\n{result.detail}", parent=self)
+
+    def clear(self):
+        self.query_var.set("")
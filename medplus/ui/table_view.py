@@ -0,0 +1,271 @@
+import tkinter as tk
+from tkinter import ttk
+from medplus.ui.tasks import task_runner
+
+# Extra rows materialised above and below the visible area so small scrolls don't re-render
+OVERSCAN_ROWS = 10
+# Used when the theme doesn't tell us the Treeview row / heading heights
+DEFAULT_ROW_HEIGHT = 20
+HEADING_HEIGHT = 24
+WHEEL_SCROLL_ROWS = 3
+SORT_ARROWS = {False: " \u25b2", True: " \u25bc"}
+
+
+class VirtualTreeview(ttk.Frame):
+    """Treeview that only holds the visible rows (plus a little overscan) as items.
+
+    Rows come from a shared TableModel, which pages them in from the database as the user
+    scrolls; pages that aren't cached yet are read on a worker thread and the window is
+    drawn once they arrive. The scrollbar and the row count label describe the whole table without it ever
+    being loaded. The first value of every row is its key and is used as the item id.
+    """
+    def __init__(self, master, columns, model, overscan=OVERSCAN_ROWS):
+        super().__init__(master)
+        self.model = model
+        self.columns = columns
+        self.overscan = overscan
+        # Sorting and filtering are pushed down to SQLite by the model
+        self.order_by = None
+        self.descending = False
+        self.search = ""
+        self.total = 0
+        self.top = 0            # Index of the first visible row
+        self.visible_rows = 1
+        self._window = (0, 0)   # [start, end) rows currently materialised as tree items
+        self._window_rows = {}  # iid -> row for the materialised window
+        self._selected = {}     # iid -> row, survives the row scrolling out of the window
+
+        style = ttk.Style(self)
+        self.row_height = int(style.lookup('Treeview', 'rowheight') or DEFAULT_ROW_HEIGHT)
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings')
+        for index, col in enumerate(columns):
+            self.tree.heading(col, text=col, command=lambda index=index: self.sort_by(index))
+            self.tree.column(col, width=100) # Adjust as needed
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.status = ttk.Label(self, anchor="w")
+
+        self.status.pack(side="bottom", fill="x")
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_units(-WHEEL_SCROLL_ROWS))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_units(WHEEL_SCROLL_ROWS))
+        self.tree.bind('<Up>', lambda e: self._move_focus(-1))
+        self.tree.bind('<Down>', lambda e: self._move_focus(1))
+        self.tree.bind('<Prior>', lambda e: self._move_focus(-self.visible_rows))
+        self.tree.bind('<Next>', lambda e: self._move_focus(self.visible_rows))
+        self.tree.bind('<Home>', lambda e: self._move_focus(-self.total))
+        self.tree.bind('<End>', lambda e: self._move_focus(self.total))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+
+        self.model.subscribe(self._on_model_event)
+        self.bind('<Destroy>', self._on_destroy)
+
+    def refresh(self, force=False):
+        """Reloads the visible window if the database changed since the last load.
+
+        Only rows that actually differ are touched, so selection and scroll position survive.
+        The version check may be a server round trip, so it runs on a worker.
+        """
+        task_runner.submit(self, self.model.data_version,
+                           on_done=lambda version: self._on_version(version, force),
+                           on_error=lambda e: self.status.config(text=f"Failed to load rows: {e}"),
+                           key="version", busy=False)
+
+    def _on_version(self, version, force):
+        if self.model.refresh(force=force, version=version):
+            return # The model's "reload" event already redrew every view of the table
+        if not self._window_rows:
+            # New view of a table another window may already have loaded
+            self._render()
+
+    def sort_by(self, column_index):
+        """Sorts on a displayed column; clicking the same header again flips the direction."""
+        column = self.model.select_columns[column_index]
+        if column not in self.model.sortable_columns:
+            return
+        if column == self.order_by:
+            self.descending = not self.descending
+        else:
+            self.order_by, self.descending = column, False
+
+        for index, col in enumerate(self.columns):
+            arrow = SORT_ARROWS[self.descending] if index == column_index else ""
+            self.tree.heading(col, text=col + arrow)
+        self.top = 0
+        self._render()
+
+    def set_filter(self, text):
+        text = text.strip()
+        if text == self.search:
+            return
+        self.search = text
+        self.top = 0
+        self._render()
+
+    def is_default_order(self):
+        return self.order_by in (None, self.model.key_column) and not self.descending and not self.search
+
+    def selected_rows(self):
+        return list(self._selected.values())
+
+    def scroll_to(self, top):
+        top = max(0, min(top, self.total - self.visible_rows))
+        self.top = top
+        start, end = self._window
+        # Still inside the materialised window: just move the tree's own view
+        if start <= top and top + self.visible_rows <= end and end > start:
+            self.tree.yview_moveto((top - start) / (end - start))
+            self._update_scrollbar()
+        else:
+            self._render()
+
+    # --- rendering -------------------------------------------------------------------
+
+    def _render(self):
+        total = self.model.peek_count(self.search)
+        if total is not None:
+            self.total = total
+        self.top = max(0, min(self.top, self.total - self.visible_rows))
+        start = max(0, self.top - self.overscan)
+        end = self.top + self.visible_rows + self.overscan
+        rows = None
+        if total is not None:
+            end = min(total, end)
+            rows = self.model.peek_rows(start, end, self.order_by, self.descending, self.search)
+        if rows is None:
+            # Not cached yet: read it in the background and come back here when it lands
+            self._request_rows(start, end, with_count=total is None)
+            return
+        new_rows = {str(row[0]): row for row in rows}
+
+        # Diff against what the tree already holds instead of rebuilding it
+        stale = [iid for iid in self._window_rows if iid not in new_rows]
+        if stale:
+            self.tree.delete(*stale)
+        for index, row in enumerate(rows):
+            iid = str(row[0])
+            old = self._window_rows.get(iid)
+            if old is None:
+                self.tree.insert("", index, iid=iid, values=row)
+                continue
+            if old != row:
+                self.tree.item(iid, values=row)
+            if self.tree.index(iid) != index:
+                self.tree.move(iid, "", index)
+        self._window_rows = new_rows
+        self._window = (start, start + len(rows))
+
+        if rows:
+            self.tree.yview_moveto((self.top - start) / len(rows))
+        visible_selection = [iid for iid in self._selected if self.tree.exists(iid)]
+        if visible_selection:
+            self.tree.selection_set(visible_selection)
+        self._update_scrollbar()
+
+    def _request_rows(self, start, end, with_count):
+        view = (self.order_by, self.descending, self.search)
+        task_runner.submit(self, self.model.load, start, end, *view, with_count=with_count,
+                           on_done=lambda loaded: self._on_rows_loaded(loaded, view),
+                           on_error=lambda e: self.status.config(text=f"Failed to load rows: {e}"),
+                           key="rows")
+
+    def _on_rows_loaded(self, loaded, view):
+        # If a write invalidated the cache meanwhile store() drops it and _render asks again
+        self.model.store(loaded, *view)
+        if view == (self.order_by, self.descending, self.search):
+            self._render()
+
+    def _update_scrollbar(self):
+        if self.total:
+            last = min(self.top + self.visible_rows, self.total)
+            self.scrollbar.set(self.top / self.total, last / self.total)
+            self.status.config(text=f"Showing {self.top + 1:,}-{last:,} of {self.total:,} rows")
+        else:
+            self.scrollbar.set(0, 1)
+            self.status.config(text="No rows")
+
+    # --- event handlers --------------------------------------------------------------
+
+    def _on_model_event(self, event, payload):
+        if event == "update" and self.is_default_order():
+            iid = str(payload[0])
+            if iid in self._window_rows:
+                self._window_rows[iid] = payload
+                self.tree.item(iid, values=payload)
+            if iid in self._selected:
+                self._selected[iid] = payload
+            return
+
+        if event == "delete":
+            self._selected.pop(str(payload), None)
+
+        total = self.model.peek_count(self.search)
+        if total is not None:
+            self.total = total
+        # In key order new rows land at the end; only redraw if that end is on screen
+        if event == "insert" and self.is_default_order() and self._window[1] < self.total - 1:
+            self._update_scrollbar()
+        else:
+            self._render()
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self.model.unsubscribe(self._on_model_event)
+
+    def _on_configure(self, event):
+        visible_rows = max(1, (event.height - HEADING_HEIGHT) // self.row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self._render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total))
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS reports small deltas
+        direction = -1 if event.delta > 0 else 1
+        return self._scroll_units(direction * WHEEL_SCROLL_ROWS)
+
+    def _scroll_units(self, rows):
+        self.scroll_to(self.top + rows)
+        return "break"
+
+    def _move_focus(self, delta):
+        if not self.total:
+            return "break"
+        start, _ = self._window
+        focus = self.tree.focus()
+        index = start + self.tree.index(focus) if focus and self.tree.exists(focus) else self.top
+        index = max(0, min(index + delta, self.total - 1))
+
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.visible_rows:
+            self.scroll_to(index - self.visible_rows + 1)
+
+        start, _ = self._window
+        children = self.tree.get_children()
+        if not 0 <= index - start < len(children):
+            return "break" # Rows still loading
+        iid = children[index - start]
+        self.tree.selection_set(iid)
+        self.tree.focus(iid)
+        return "break"
+
+    def _on_select(self, event):
+        # Rows outside the window keep their selection state; rows inside follow the tree
+        selection = set(self.tree.selection())
+        for iid, row in self._window_rows.items():
+            if iid in selection:
+                self._selected[iid] = row
+            else:
+                self._selected.pop(iid, None)
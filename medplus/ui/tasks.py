@@ -0,0 +1,207 @@
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads; each one holds its own pooled database connection while it lives
+MAX_WORKERS = 4
+# Tasks running at once; anything submitted beyond this waits its turn in submission order
+MAX_IN_FLIGHT = 8
+# How often the Tk thread collects finished tasks (only while something is running)
+POLL_MS = 15
+BUSY_CURSOR = "watch"
+
+
+class Task:
+    """Handle for one submitted call. Cancelling it guarantees no callback will run."""
+    def __init__(self, owner, func, args, kwargs, on_done, on_error, key, busy):
+        self.owner = owner
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.on_error = on_error
+        self.key = key
+        self.busy = busy
+        self.cancelled = False
+        self.finished = False
+        self.future = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel() # Only stops it if it hasn't started yet
+
+    @property
+    def pending(self):
+        return not (self.cancelled or self.finished)
+
+
+class TaskRunner:
+    """Runs blocking work (queries, image resizes) off the Tk main loop.
+
+    submit() hands func to a worker thread and returns immediately; on_done(result) or
+    on_error(exception) is later called on the Tk thread via after(). Every task belongs
+    to an owner widget: the owner shows a busy cursor while it has work in flight, and
+    destroying the owner cancels its tasks so callbacks never reach dead widgets. A task
+    submitted with a key supersedes the owner's earlier task with the same key, so a burst
+    of scroll or keystroke events only delivers the latest result.
+
+    Until attach() is called (scripts, tests) tasks simply run inline.
+    """
+    def __init__(self, max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT):
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self.root = None
+        self._executor = None
+        self._done = queue.SimpleQueue()  # (task, result, error) from the workers
+        self._backlog = deque()           # Tasks waiting for an in-flight slot
+        self._running = set()
+        self._by_owner = {}               # owner -> set of pending tasks
+        self._poll_job = None
+
+    def attach(self, root):
+        """Binds the runner to the application's Tk root and starts the worker pool."""
+        self.root = root
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="medplus-task")
+
+    def shutdown(self):
+        for tasks in list(self._by_owner.values()):
+            for task in list(tasks):
+                task.cancel()
+        self._backlog.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._poll_job is not None and self.root is not None:
+            self.root.after_cancel(self._poll_job)
+        self._poll_job = None
+        self.root = None
+
+    def submit(self, owner, func, *args, on_done=None, on_error=None, key=None, busy=True, **kwargs):
+        """Runs func(*args, **kwargs) in the background on behalf of owner and returns its Task."""
+        task = Task(owner, func, args, kwargs, on_done, on_error, key, busy)
+        if self.root is None or self._executor is None:
+            self._run_inline(task)
+            return task
+
+        tasks = self._by_owner.get(owner)
+        if tasks is None:
+            tasks = self._by_owner[owner] = set()
+            # add="+" keeps the owner's own <Destroy> bindings
+            owner.bind("<Destroy>", lambda event, owner=owner: self._on_owner_destroyed(event, owner), add="+")
+        if key is not None:
+            for other in list(tasks):
+                if other.key == key:
+                    self._forget(other)
+                    other.cancel()
+        tasks.add(task)
+        if busy:
+            self._set_busy(owner, True)
+
+        self._backlog.append(task)
+        self._start_backlog()
+        return task
+
+    def cancel_owner(self, owner):
+        """Cancels everything owner has queued or running."""
+        for task in list(self._by_owner.get(owner, ())):
+            task.cancel()
+            self._forget(task)
+
+    def in_flight(self, owner=None):
+        if owner is None:
+            return len(self._running)
+        return sum(1 for task in self._by_owner.get(owner, ()) if task.pending)
+
+    # --- internals -------------------------------------------------------------------
+
+    def _run_inline(self, task):
+        try:
+            result = task.func(*task.args, **task.kwargs)
+        except Exception as e:
+            task.finished = True
+            self._report_error(task, e)
+            return
+        task.finished = True
+        if task.on_done:
+            task.on_done(result)
+
+    def _start_backlog(self):
+        while self._backlog and len(self._running) < self.max_in_flight:
+            task = self._backlog.popleft()
+            if task.cancelled:
+                self._forget(task)
+                continue
+            self._running.add(task)
+            task.future = self._executor.submit(self._work, task)
+        if self._running and self._poll_job is None:
+            self._poll_job = self.root.after(POLL_MS, self._poll)
+
+    def _work(self, task):
+        # Worker thread: no Tk calls in here, the result goes back through the queue
+        if task.cancelled:
+            self._done.put((task, None, None))
+            return
+        try:
+            result = task.func(*task.args, **task.kwargs)
+        except Exception as e:
+            self._done.put((task, None, e))
+        else:
+            self._done.put((task, result, None))
+
+    def _poll(self):
+        self._poll_job = None
+        # Futures cancelled before they started never reach the queue
+        for task in [task for task in self._running if task.future is not None and task.future.cancelled()]:
+            self._running.discard(task)
+            self._forget(task)
+        while True:
+            try:
+                task, result, error = self._done.get_nowait()
+            except queue.Empty:
+                break
+            self._running.discard(task)
+            self._forget(task)
+            if task.cancelled:
+                continue
+            task.finished = True
+            if error is not None:
+                self._report_error(task, error)
+            elif task.on_done:
+                try:
+                    task.on_done(result)
+                except Exception as e:
+                    print(f"Error in task callback: {e}")
+        self._start_backlog()
+
+    def _report_error(self, task, error):
+        if task.on_error:
+            task.on_error(error)
+        else:
+            print(f"Background task failed: {error}")
+
+    def _forget(self, task):
+        tasks = self._by_owner.get(task.owner)
+        if tasks is None:
+            return
+        tasks.discard(task)
+        if task.busy and not any(other.busy for other in tasks):
+            self._set_busy(task.owner, False)
+
+    def _on_owner_destroyed(self, event, owner):
+        # Toplevels also see <Destroy> for each of their children
+        if event.widget is not owner:
+            return
+        for task in self._by_owner.pop(owner, ()):
+            task.cancel()
+
+    def _set_busy(self, owner, busy):
+        try:
+            owner.configure(cursor=BUSY_CURSOR if busy else "")
+        except Exception:
+            pass # Widget gone or has no cursor option
+
+
+# Singleton instance, attached to the Tk root by MedPlusApp
+task_runner = TaskRunner()
@@ -0,0 +1,6 @@
+from medplus.server import main
+
+# Headless mode: one process owns medplus.db and desktops connect with
+#   python main.py --server http://<host>:8765
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -44,5 +44,18 @@ class TestUIAssets(unittest.TestCase):
         except Exception as e:
             self.fail(f"UserDashboardFrame init failed: {e}")
 
+    def test_background_photo_reused_per_size(self):
+        """Switching back to a size already shown reuses its PhotoImage"""
+        from PIL import Image
+        frame = LoginFrame(self.app)
+        if frame.bg_key is None:
+            self.skipTest("image0.png not found")
+        frame._on_refined(200, 150, Image.new("RGB", (200, 150)))
+        first = frame.bg_image_ref
+        frame._on_refined(300, 200, Image.new("RGB", (300, 200)))
+        self.assertIsNot(frame.bg_image_ref, first)
+        frame._update_background(200, 150)
+        self.assertIs(frame.bg_image_ref, first)
+
 if __name__ == '__main__':
     unittest.main()
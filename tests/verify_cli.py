@@ -0,0 +1,100 @@
+import sys
+import os
+import gzip
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import mock
+
+# Ensure we can import from root
+sys.path.append(os.getcwd())
+
+from medplus.database import Database
+from medplus import auth, cli, database, exporter, importer, repositories, table_model
+
+class TestCLI(unittest.TestCase):
+    MODULES = [auth, database, exporter, importer, repositories, table_model]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+        self._real_db = database.db
+        for module in self.MODULES:
+            module.db = self.db
+        auth.Auth.set_policy("$scrypt$ln=10,r=8,p=1")
+
+    def tearDown(self):
+        for module in self.MODULES:
+            module.db = self._real_db
+        auth.Auth._hasher = auth.Auth._dummy_hash = None
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def run_cli(self, *argv, stdin=""):
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch("sys.stdin", io.StringIO(stdin)), redirect_stdout(out), redirect_stderr(err):
+            status = cli.main(list(argv))
+        return status, out.getvalue(), err.getvalue()
+
+    def test_add_list_update_delete(self):
+        status, _, err = self.run_cli("add", "hospitals", stdin="name,address,contact\nB,Road,1\nA,Lane,2\nC,,3\n")
+        self.assertEqual(status, 2)
+        self.assertIn("inserted 2, rejected 1", err)
+        _, out, _ = self.run_cli("list", "hospitals", "--order-by", "name", "--columns", "name,contact")
+        self.assertEqual(out.splitlines(), ["name,contact", "A,2", "B,1"])
+        status, _, _ = self.run_cli("update", "hospitals", "--format", "jsonl",
+                                    stdin='{"id": 1, "contact": "9", "latitude": 12.5, "longitude": 77.25}\n')
+        self.assertEqual(status, 0)
+        _, out, _ = self.run_cli("list", "hospitals", "--where", "contact = ?", "--param", "9", "--format", "jsonl")
+        self.assertEqual(out, '{"id": 1, "name": "B", "address": "Road", "contact": "9", "latitude": 12.5, "longitude": 77.25}\n')
+        status, _, _ = self.run_cli("update", "hospitals", "--format", "jsonl",
+                                    stdin='{"id": 1, "latitude": 0, "longitude": 0}\n')
+        self.assertEqual(status, 0)
+        self.assertEqual(repositories.hospitals.get(1)[4:], (0.0, 0.0))
+        status, _, err = self.run_cli("update", "hospitals", "--format", "jsonl", stdin='{"id": 2, "lat": 10}\n')
+        self.assertEqual(status, 2)
+        self.assertIn("latitude and longitude must be given together", err)
+        self.assertEqual(self.run_cli("delete", "hospitals", stdin="1\n2\n")[0], 0)
+        self.assertEqual(repositories.hospitals.count(), 0)
+
+    def test_rejects_hidden_columns(self):
+        status, out, err = self.run_cli("list", "users", "--columns", "password_hash")
+        self.assertEqual((status, out), (1, ""))
+        self.assertEqual(self.run_cli("list", "hospitals", "--order-by", "id; DROP TABLE users")[0], 1)
+        auth.Auth.register("boss", "pw", "ADMIN")
+        for where in ["1=0 UNION SELECT username, password_hash FROM users", "password_hash LIKE ?",
+                      "role = 'ADMIN'; DELETE FROM users"]:
+            status, out, _ = self.run_cli("list", "users", "--where", where, "--param", "x")
+            self.assertEqual((status, out), (1, ""))
+            with redirect_stderr(io.StringIO()):
+                self.assertEqual(exporter.main(["users", "-", "--where", where, "--param", "x"]), 1)
+        self.assertEqual(repositories.users.count(), 1)
+
+    def test_list_orders_by_nullable_column(self):
+        for i in range(3):
+            repositories.hospitals.insert([f"H{i}", "Road", str(i)] + ([10.0 + i, 20.0] if i == 1 else []))
+        rows = list(cli.list_rows("hospitals", ["id", "latitude"], order_by="latitude", page_size=1))
+        self.assertEqual(rows, [(1, None), (3, None), (2, 11.0)])
+
+    def test_export_gzip_to_stdout(self):
+        repositories.hospitals.insert(["City", "Road", "1"])
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        with mock.patch("sys.stdout", stdout), redirect_stderr(io.StringIO()):
+            self.assertEqual(exporter.main(["hospitals", "-", "--gzip", "--columns", "name,contact"]), 0)
+        self.assertEqual(gzip.decompress(stdout.buffer.getvalue()).decode(), "name,contact\r\nCity,1\r\n")
+
+    def test_user_management(self):
+        status, _, _ = self.run_cli("users", "add", "--workers", "1", stdin="username,password,role\nann,pw,admin\nbob,pw,\n")
+        self.assertEqual(status, 0)
+        self.assertEqual(self.run_cli("users", "set-role", "bob", "admin")[0], 0)
+        self.assertEqual(self.run_cli("users", "set-password", "bob", stdin="s3cret\n")[0], 0)
+        self.assertEqual(auth.Auth.login("bob", "s3cret", "ADMIN")[0], True)
+        _, out, _ = self.run_cli("users", "list", "--role", "admin")
+        self.assertEqual(out.splitlines(), ["username,role", "ann,ADMIN", "bob,ADMIN"])
+        self.assertEqual(self.run_cli("users", "delete", "ann", "nobody")[0], 2)
+        self.assertEqual(self.run_cli("users", "set-role", "ann", "user")[0], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,406 @@
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Ensure we can import from root
+sys.path.append(os.getcwd())
+
+from medplus.database import Database
+from medplus import migrations
+
+class TestDatabaseTransactions(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def count_hospitals(self):
+        return self.db.fetch_one("SELECT COUNT(*) FROM hospitals")[0]
+
+    def test_transaction_commits_once(self):
+        """All statements in a transaction become visible together"""
+        with self.db.transaction():
+            self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("A", "B", "1"))
+            self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("C", "D", "2"))
+            self.assertTrue(self.db.in_transaction)
+        self.assertFalse(self.db.in_transaction)
+        self.assertEqual(self.count_hospitals(), 2)
+
+    def test_transaction_rolls_back_on_error(self):
+        """A failing statement undoes everything before it"""
+        with self.assertRaises(sqlite3.Error):
+            with self.db.transaction():
+                self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("A", "B", "1"))
+                self.db.execute_query("INSERT INTO hospitals (name) VALUES (?)", ("missing columns",))
+        self.assertEqual(self.count_hospitals(), 0)
+
+    def test_nested_transactions_commit_at_outermost(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                with self.db.transaction():
+                    self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("A", "B", "1"))
+                raise RuntimeError("outer step failed")
+        self.assertEqual(self.count_hospitals(), 0)
+
+    def test_execute_many(self):
+        rows = [(f"H{i}", "Addr", str(i)) for i in range(1000)]
+        cursor = self.db.execute_many("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", rows)
+        self.assertIsNotNone(cursor)
+        self.assertEqual(self.count_hospitals(), 1000)
+
+    def test_execute_query_outside_transaction_reports_errors(self):
+        """Outside a transaction errors keep the old print-and-return-None behaviour"""
+        self.assertIsNone(self.db.execute_query("SELECT * FROM no_such_table"))
+
+class TestDatabasePool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"), pool_size=2)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def run_in_thread(self, func):
+        result = {}
+        def target():
+            result["value"] = func()
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+        return result["value"]
+
+    def test_wal_mode(self):
+        self.assertEqual(self.db.fetch_one("PRAGMA journal_mode")[0], "wal")
+
+    def test_safe_profile_avoids_wal(self):
+        safe = Database(os.path.join(self.tmpdir, "safe.db"), profile="safe")
+        self.assertEqual(safe.fetch_one("PRAGMA journal_mode")[0], "delete")
+        safe.close()
+
+    def test_threads_get_their_own_connection(self):
+        main_conn = self.db.conn
+        self.assertIsNot(self.run_in_thread(lambda: self.db.conn), main_conn)
+
+    def test_reader_not_blocked_by_open_write(self):
+        """Readers see the last committed state while another thread is mid-transaction"""
+        with self.db.transaction():
+            self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("A", "B", "1"))
+            count = self.run_in_thread(lambda: self.db.fetch_one("SELECT COUNT(*) FROM hospitals")[0])
+        self.assertEqual(count, 0)
+        self.assertEqual(self.db.fetch_one("SELECT COUNT(*) FROM hospitals")[0], 1)
+
+    def test_connection_returned_when_thread_ends(self):
+        for _ in range(5):  # More threads than pool slots
+            self.run_in_thread(lambda: self.db.fetch_one("SELECT 1"))
+        self.assertLessEqual(len(self.db._all), 2)
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+        self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("A", "B", "1"))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def count_hospitals(self):
+        return self.db.fetch_one("SELECT COUNT(*) FROM hospitals")[0]
+
+    def test_repeated_reads_hit(self):
+        self.db.cache.reset_stats()
+        for _ in range(3):
+            self.assertEqual(self.count_hospitals(), 1)
+        stats = self.db.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_write_invalidates_table(self):
+        self.db.fetch_all("SELECT name FROM emergency_contacts")
+        self.assertEqual(self.count_hospitals(), 1)
+        self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("C", "D", "2"))
+        self.assertEqual(self.count_hospitals(), 2)
+        # Unrelated tables keep their entries
+        self.db.cache.reset_stats()
+        self.db.fetch_all("SELECT name FROM emergency_contacts")
+        self.assertEqual(self.db.cache_stats()["hits"], 1)
+
+    def test_write_from_other_connection_invalidates(self):
+        self.assertEqual(self.count_hospitals(), 1)
+        other = sqlite3.connect(self.db.path)
+        other.execute("DELETE FROM hospitals")
+        other.commit()
+        other.close()
+        self.assertEqual(self.count_hospitals(), 0)
+
+    def test_new_thread_sees_earlier_external_write(self):
+        self.assertEqual(self.db.fetch_one("SELECT name FROM hospitals"), ("A",))
+        other = sqlite3.connect(self.db.path)
+        other.execute("UPDATE hospitals SET name = 'CHANGED'")
+        other.commit()
+        other.close()
+        # This thread's connection opens after the commit, so its data_version never moves
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(self.db.fetch_one("SELECT name FROM hospitals")))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, [("CHANGED",)])
+
+    def test_pooled_commit_keeps_other_tables(self):
+        self.db.fetch_all("SELECT name FROM emergency_contacts")
+        self.assertEqual(self.count_hospitals(), 1)
+        # Another thread's pooled connection writes; only hospitals entries may go
+        thread = threading.Thread(target=lambda: self.db.execute_query(
+            "INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("C", "D", "2")))
+        thread.start()
+        thread.join()
+        self.db.cache.reset_stats()
+        self.assertEqual(self.count_hospitals(), 2)
+        self.db.fetch_all("SELECT name FROM emergency_contacts")
+        stats = self.db.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_rolled_back_reads_not_cached(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.execute_query("DELETE FROM hospitals")
+                self.assertEqual(self.count_hospitals(), 0)
+                raise RuntimeError("undo")
+        self.assertEqual(self.count_hospitals(), 1)
+
+    def test_search_ranks_every_match(self):
+        from medplus import search
+        real_db, search.db = search.db, self.db
+        try:
+            self.db.execute_many("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)",
+                                 [(f"Care unit {i}", "Long long road", "1") for i in range(1500)])
+            # The best match comes last by rowid, behind more than any old candidate slice
+            self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)",
+                                  ("Care", "Care", "2"))
+            self.assertEqual(search.search("care")[0].name, "Care")
+            self.assertEqual(search.search("care").too_broad, [])
+            with mock.patch.object(search, "RANK_LIMIT", 100):
+                results = search.search("care")
+                self.assertEqual((results, results.too_broad), ([], ["Hospital"]))
+        finally:
+            search.db = real_db
+
+    def test_fts_search_sees_new_rows(self):
+        query = "SELECT rowid FROM hospitals_fts WHERE hospitals_fts MATCH ?"
+        self.assertEqual(self.db.fetch_all(query, ("zebra",)), [])
+        self.db.execute_query("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", ("Zebra", "B", "1"))
+        self.assertEqual(len(self.db.fetch_all(query, ("zebra",))), 1)
+
+class TestPagination(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+        rows = [(f"H{i % 7}", "Addr", str(i)) for i in range(50)]
+        self.db.execute_many("INSERT INTO hospitals (name, address, contact) VALUES (?, ?, ?)", rows)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def walk(self, **kwargs):
+        seen = []
+        rows, after = self.db.fetch_page("hospitals", limit=8, **kwargs)
+        seen.extend(rows)
+        while after is not None:
+            rows, after = self.db.fetch_page("hospitals", after, limit=8, **kwargs)
+            seen.extend(rows)
+        return seen
+
+    def test_fetch_iter_streams_everything(self):
+        rows = list(self.db.fetch_iter("SELECT id FROM hospitals ORDER BY id", chunk_size=7))
+        self.assertEqual([row[0] for row in rows], list(range(1, 51)))
+
+    def test_keyset_walk_by_key(self):
+        rows = self.walk(columns=["id"])
+        self.assertEqual([row[0] for row in rows], list(range(1, 51)))
+
+    def test_keyset_walk_by_non_unique_column(self):
+        rows = self.walk(order_by="name", columns=["id", "name"], descending=True)
+        expected = self.db.fetch_all("SELECT id, name FROM hospitals ORDER BY name DESC, id DESC")
+        self.assertEqual(rows, expected)
+
+    def test_keyset_walk_through_nulls(self):
+        # Pages must cross runs of NULL coordinates in both directions
+        self.db.execute_query("UPDATE hospitals SET latitude = CASE WHEN id % 3 = 0 THEN NULL ELSE id % 4 END")
+        for descending in (False, True):
+            direction = "DESC" if descending else "ASC"
+            rows = self.walk(order_by="latitude", columns=["id", "latitude"], descending=descending)
+            expected = self.db.fetch_all(f"SELECT id, latitude FROM hospitals ORDER BY latitude {direction}, id {direction}")
+            self.assertEqual(rows, expected)
+
+    def test_rejects_bad_identifiers(self):
+        with self.assertRaises(ValueError):
+            self.db.fetch_page("hospitals; DROP TABLE users")
+
+class TestRepositories(unittest.TestCase):
+    def setUp(self):
+        import medplus.repositories as repositories
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+        self.repositories = repositories
+        self._real_db = repositories.db
+        repositories.db = self.db
+
+    def tearDown(self):
+        self.repositories.db = self._real_db
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_insert_returns_named_row(self):
+        row = self.repositories.hospitals.insert(["City", "Main Road", "123"])
+        self.assertEqual(row.name, "City")
+        self.assertEqual(self.repositories.hospitals.get(row.id), row)
+
+    def test_insert_requires_all_but_optional_columns(self):
+        hospitals = self.repositories.hospitals
+        self.assertEqual(hospitals.insert(["City", "Main Road", "123"])[4:], (None, None))
+        self.assertEqual(hospitals.insert(["Port", "Dock", "456", 1.5, 2.5])[4:], (1.5, 2.5))
+        with self.assertRaises(ValueError):
+            hospitals.insert(["City", "Main Road"])
+        with self.assertRaises(ValueError):
+            self.repositories.emergency_contacts.insert(["Fire"])
+
+    def test_users_never_expose_password_hash(self):
+        self.repositories.users.create("alice", "hash", "USER")
+        self.assertEqual(self.repositories.users.get("alice"), ("alice", "USER"))
+        self.assertEqual(self.repositories.users.get_credentials("alice"), ("hash", "USER"))
+
+    def test_update_rejects_unknown_columns(self):
+        row = self.repositories.hospitals.insert(["City", "Main Road", "123"])
+        with self.assertRaises(ValueError):
+            self.repositories.hospitals.update(row.id, {"id": 99})
+
+class TestPasswordHashing(unittest.TestCase):
+    FAST_POLICY = "$scrypt$ln=10,r=8,p=1"
+
+    def setUp(self):
+        import medplus.auth as auth
+        import medplus.repositories as repositories
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+        self.modules = [auth, repositories]
+        self._real_db = repositories.db
+        for module in self.modules:
+            module.db = self.db
+        self.Auth = auth.Auth
+        self.repositories = repositories
+        self.users = repositories.users
+        self.Auth.set_policy(self.FAST_POLICY)
+
+    def tearDown(self):
+        for module in self.modules:
+            module.db = self._real_db
+        self.Auth._hasher = self.Auth._dummy_hash = None
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip_is_salted(self):
+        from medplus.hashing import PasswordHasher
+        hasher = PasswordHasher(self.FAST_POLICY)
+        first, second = hasher.hash("secret"), hasher.hash("secret")
+        self.assertNotEqual(first, second)
+        self.assertTrue(first.startswith(self.FAST_POLICY + "$"))
+        self.assertTrue(hasher.verify("secret", first))
+        self.assertFalse(hasher.verify("Secret", first))
+        self.assertFalse(hasher.verify("secret", "$scrypt$garbage"))
+
+    def test_pbkdf2_and_policy_changes(self):
+        from medplus.hashing import PasswordHasher
+        old = PasswordHasher("$pbkdf2-sha256$i=1000").hash("secret")
+        hasher = PasswordHasher(self.FAST_POLICY)
+        self.assertTrue(hasher.verify("secret", old))
+        self.assertTrue(hasher.needs_rehash(old))
+        self.assertFalse(hasher.needs_rehash(hasher.hash("secret")))
+
+    def test_set_policy_checks_parameters(self):
+        for policy in ["$scrypt$ln=14", "$scrypt$ln=4,r=8,p=1", "$scrypt$ln=14,r=8,p=1,x=2",
+                       "$pbkdf2-sha256$i=1000", "$pbkdf2-sha256$", "$md5$i=1"]:
+            with self.assertRaises(ValueError):
+                self.Auth.set_policy(policy)
+        self.assertEqual(self.Auth.hasher().policy, self.FAST_POLICY)
+        # One stored before policies were checked falls back to the default
+        from medplus.hashing import DEFAULT_POLICY, POLICY_SETTING
+        self.Auth._hasher = None
+        self.repositories.settings.set(POLICY_SETTING, "$scrypt$ln=14")
+        self.assertEqual(self.Auth.hasher().policy, DEFAULT_POLICY)
+
+    def test_register_and_login(self):
+        self.assertEqual(self.Auth.register("alice", "pw")[0], True)
+        self.assertEqual(self.Auth.login("alice", "pw"), (True, "Login successful."))
+        self.assertEqual(self.Auth.login("alice", "nope"), (False, "Invalid username or password."))
+        self.assertEqual(self.Auth.login("bob", "pw"), (False, "Invalid username or password."))
+        self.assertEqual(self.Auth.login("alice", "nope", "ADMIN"), (False, "Invalid username or password."))
+        self.assertEqual(self.Auth.login("alice", "pw", "ADMIN"), (False, "Invalid username or password."))
+
+    def test_legacy_hash_upgraded_on_login(self):
+        import hashlib
+        self.users.create("carol", hashlib.sha256(b"pw").hexdigest(), "USER")
+        self.assertEqual(self.Auth.login("carol", "wrong")[0], False)
+        self.assertEqual(len(self.users.get_credentials("carol")[0]), 64)
+        self.assertEqual(self.Auth.login("carol", "pw")[0], True)
+        stored = self.users.get_credentials("carol")[0]
+        self.assertTrue(stored.startswith(self.FAST_POLICY + "$"))
+        self.assertEqual(self.Auth.login("carol", "pw")[0], True)
+
+    def test_register_many(self):
+        self.users.create("taken", "hash", "USER")
+        accounts = [(f"user{i}", f"pw{i}", "user") for i in range(20)]
+        accounts += [("taken", "pw", "USER"), ("user3", "pw", "USER"), ("", "pw", "USER"), ("eve", "pw", "ROOT")]
+        results = self.Auth.register_many(accounts, workers=2)
+        self.assertEqual([success for _, success, _ in results], [True] * 20 + [False] * 4)
+        self.assertEqual(results[20], ("taken", False, "Username already exists."))
+        self.assertEqual(results[21], ("user3", False, "Duplicate username in this batch."))
+        self.assertEqual(self.users.count(), 21)
+        self.assertEqual(self.users.get_credentials("taken"), ("hash", "USER"))
+        self.assertEqual(self.Auth.login("user7", "pw7"), (True, "Login successful."))
+
+    def test_register_file(self):
+        path = os.path.join(self.tmpdir, "staff.csv")
+        with open(path, "w") as f:
+            f.write("Username,Password,Role\nann,pw1,ADMIN\nben,pw2,\nann,pw3,USER\n")
+        results = self.Auth.register_file(path, workers=1)
+        self.assertEqual([(line, name, ok) for line, name, ok, _ in results],
+                         [(2, "ann", True), (3, "ben", True), (4, "ann", False)])
+        self.assertEqual(self.Auth.login("ann", "pw1", "ADMIN")[0], True)
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "test.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fresh_database_is_latest(self):
+        db = Database(self.path)
+        self.assertEqual(migrations.schema_version(db.conn), migrations.LATEST_VERSION)
+        plan = db.fetch_all("EXPLAIN QUERY PLAN SELECT username FROM users WHERE role = ?", ("ADMIN",))
+        self.assertIn("idx_users_role", plan[0][-1])
+        db.close()
+
+    def test_unversioned_database_upgrades_in_place(self):
+        conn = sqlite3.connect(self.path)
+        migrations.create_base_tables(conn.cursor())
+        conn.execute("INSERT INTO hospitals (name, address, contact) VALUES ('A', 'B', '1')")
+        conn.commit()
+        self.assertEqual(migrations.migrate(conn), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(conn.execute("SELECT rowid FROM hospitals_fts WHERE hospitals_fts MATCH 'a'").fetchall(), [(1,)])
+        # Up to date: nothing to do
+        self.assertEqual(migrations.migrate(conn), [])
+        conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
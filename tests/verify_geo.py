@@ -0,0 +1,135 @@
+import sys
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# Ensure we can import from root
+sys.path.append(os.getcwd())
+
+from medplus.database import Database
+from medplus import geo, importer, repositories, table_model
+from medplus.geo import GridIndex, HospitalLocator, haversine_km
+
+class TestGridIndex(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.points = {}
+        # Dense clusters plus a scattering over the whole globe
+        for i in range(3000):
+            if i % 3:
+                lat, lon = rng.gauss(19.07, 0.4), rng.gauss(72.88, 0.4)
+            else:
+                lat, lon = rng.uniform(-89.9, 89.9), rng.uniform(-180, 180)
+            self.points[i] = (lat, lon)
+        self.index = GridIndex()
+        for key, (lat, lon) in self.points.items():
+            self.index.add(key, lat, lon)
+
+    def brute_force(self, lat, lon, points=None):
+        points = self.points if points is None else points
+        keys = list(points)
+        distances = haversine_km(lat, lon, [points[k][0] for k in keys], [points[k][1] for k in keys])
+        return sorted(zip(keys, (float(d) for d in distances)), key=lambda pair: pair[1])
+
+    def assertSameNeighbours(self, got, expected):
+        self.assertEqual(len(got), len(expected))
+        for (_, got_km), (_, expected_km) in zip(got, expected):
+            self.assertAlmostEqual(got_km, expected_km, places=6)
+
+    def test_haversine(self):
+        # Mumbai to Delhi is about 1150 km
+        self.assertAlmostEqual(float(haversine_km(19.076, 72.8777, [28.6139], [77.209])[0]), 1153, delta=5)
+        self.assertAlmostEqual(float(haversine_km(0, 0, [0], [180])[0]), 3.14159265 * geo.EARTH_RADIUS_KM, places=3)
+
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(11)
+        queries = [(19.1, 72.9), (0, 0), (89.99, 10), (-89.99, -170)]
+        queries += [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(30)]
+        for lat, lon in queries:
+            for k in (1, 10, 50):
+                self.assertSameNeighbours(self.index.nearest(lat, lon, k), self.brute_force(lat, lon)[:k])
+
+    def test_within_matches_brute_force(self):
+        for lat, lon, radius in [(19.07, 72.88, 5), (19.07, 72.88, 60), (10, 100, 2500), (88, 0, 800)]:
+            expected = [pair for pair in self.brute_force(lat, lon) if pair[1] <= radius]
+            self.assertSameNeighbours(self.index.within(lat, lon, radius), expected)
+        limited = self.index.nearest(19.07, 72.88, 500, max_km=10)
+        self.assertTrue(limited and all(km <= 10 for _, km in limited))
+
+    def test_dateline(self):
+        index = GridIndex()
+        index.add("east", 0.0, 179.99)
+        index.add("west", 0.0, -179.99)
+        index.add("far", 0.0, 170.0)
+        self.assertEqual([key for key, _ in index.nearest(0.0, -179.9, 2)], ["west", "east"])
+        self.assertEqual(sorted(key for key, _ in index.within(0.0, 180.0, 5)), ["east", "west"])
+
+    def test_edits_are_incremental(self):
+        self.index.remove(0)
+        self.index.add(1, 51.5, -0.12)
+        self.index.add(2, None, None)
+        del self.points[0], self.points[2]
+        self.points[1] = (51.5, -0.12)
+        self.assertEqual(len(self.index), len(self.points))
+        self.assertEqual(self.index.nearest(51.5, -0.12, 1)[0][0], 1)
+        self.assertSameNeighbours(self.index.nearest(19.0, 73.0, 20), self.brute_force(19.0, 73.0)[:20])
+
+
+class TestHospitalLocator(unittest.TestCase):
+    MODULES = [importer, repositories, table_model]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+        self._real_db = table_model.db
+        for module in self.MODULES:
+            module.db = self.db
+        table_model.set_model_factory(table_model.local_model)
+        self.locator = HospitalLocator()
+
+    def tearDown(self):
+        table_model.set_model_factory(table_model.local_model)
+        for module in self.MODULES:
+            module.db = self._real_db
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_locator_follows_model_edits(self):
+        importer.import_records("hospitals", enumerate([
+            {"name": "Near", "address": "A", "contact": "1", "lat": "19.07", "lon": "72.88"},
+            {"name": "Far", "address": "B", "contact": "2", "lat": "28.61", "lon": "77.21"},
+            {"name": "Nowhere", "address": "C", "contact": "3"},
+        ]))
+        self.assertEqual([h.name for h in self.locator.nearest(19.0, 72.9, 5)], ["Near", "Far"])
+        self.assertEqual(self.locator.located(), 2)
+
+        model = table_model.get_model("hospitals")
+        row = model.insert(["Closer", "D", "4", 19.01, 72.9])
+        nearest = self.locator.nearest(19.0, 72.9, 1)[0]
+        self.assertEqual(nearest.name, "Closer")
+        self.assertLess(nearest.distance_km, 2)
+
+        near_id = repositories.hospitals.page(None, 1)[0][0].id
+        model.update(near_id, {"latitude": 40.7, "longitude": -74.0})
+        self.assertEqual(self.locator.nearest(40.7, -74.0, 1)[0].name, "Near")
+        model.delete(row[0])
+        self.assertEqual([h.name for h in self.locator.within(19.0, 72.9, 100)], [])
+        self.assertEqual(self.locator.located(), 2)
+
+    def test_model_events_read_nothing(self):
+        importer.import_records("hospitals", enumerate([
+            {"name": "Near", "address": "A", "contact": "1", "lat": "19.07", "lon": "72.88"}]))
+        self.assertEqual(self.locator.located(), 1)
+        model = table_model.get_model("hospitals")
+        row = model.write_insert(["Closer", "D", "4"])
+        repositories.hospitals.update(row[0], {"latitude": 19.01, "longitude": 72.9})
+        # Events arrive on the Tk thread; the row is read by the next query instead
+        with mock.patch.object(repositories.hospitals, "get", side_effect=AssertionError("read on event")):
+            model.apply_insert(row)
+        self.assertEqual(self.locator.nearest(19.0, 72.9, 1)[0].name, "Closer")
+
+if __name__ == '__main__':
+    unittest.main()
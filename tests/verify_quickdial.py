@@ -0,0 +1,95 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+# Ensure we can import from root
+sys.path.append(os.getcwd())
+
+from medplus.database import Database
+from medplus import repositories, table_model
+from medplus.quickdial import PrefixIndex, QuickDialIndex
+
+class TestPrefixIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.add_many([("cardiac", 1), ("care", 2), ("city", 3)])
+        self.index.add("car", 4)
+
+    def test_prefix_search(self):
+        self.assertEqual(list(self.index.search("car")), [4, 1, 2])
+        self.assertEqual(self.index.count("ca"), 3)
+        self.assertEqual(list(self.index.search("x")), [])
+
+    def test_remove(self):
+        self.index.remove("care", 2)
+        self.index.remove("care", 99)  # Not there: nothing happens
+        self.assertEqual(list(self.index.search("car")), [4, 1])
+        self.index.discard_where(lambda key: key > 2)
+        self.assertEqual(len(self.index), 1)
+
+
+class TestQuickDialIndex(unittest.TestCase):
+    MODULES = [repositories, table_model]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+        self._real_db = table_model.db
+        for module in self.MODULES:
+            module.db = self.db
+        table_model.set_model_factory(table_model.local_model)
+        self.model = table_model.get_model("emergency_contacts")
+        self.ambulance = self.model.insert(["City Ambulance", "+91 98765-43210"])
+        self.model.insert(["Fire Brigade", "101"])
+        self.index = QuickDialIndex()
+
+    def tearDown(self):
+        table_model.set_model_factory(table_model.local_model)
+        for module in self.MODULES:
+            module.db = self._real_db
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def names(self, text):
+        return [entry.name for entry in self.index.lookup(text)]
+
+    def test_nothing_until_loaded(self):
+        self.assertEqual(self.names("city"), [])
+        loaded = self.index.load()
+        self.assertEqual(self.names("city"), [])
+        # Written between the read and install(): replayed, not lost
+        self.model.insert(["City Hospital Desk", "022 2222"])
+        self.index.install(loaded)
+        self.assertEqual(sorted(self.names("city")), ["City Ambulance", "City Hospital Desk"])
+
+    def test_name_token_prefix(self):
+        self.index.ensure_loaded()
+        self.assertEqual(self.names("amb"), ["City Ambulance"])
+        self.assertEqual(self.names("ci amb"), ["City Ambulance"])
+        self.assertEqual(self.names("fire amb"), [])
+
+    def test_digit_suffix_and_prefix(self):
+        self.index.ensure_loaded()
+        self.assertEqual(self.names("43210"), ["City Ambulance"])
+        self.assertEqual(self.names("+91 987"), ["City Ambulance"])
+        self.assertEqual(self.names("10"), ["City Ambulance", "Fire Brigade"])
+
+    def test_update_replaces_entry(self):
+        self.index.ensure_loaded()
+        self.model.update(self.ambulance[0], {"name": "Rapid Response", "contact_no": "108"})
+        self.assertEqual(self.names("amb"), [])
+        self.assertEqual(self.names("43210"), [])
+        self.assertEqual(self.names("rapid"), ["Rapid Response"])
+        self.assertEqual(self.names("108"), ["Rapid Response"])
+
+    def test_remove(self):
+        self.index.ensure_loaded()
+        self.model.delete(self.ambulance[0])
+        self.assertEqual(self.names("city"), [])
+        self.assertEqual(self.names("43210"), [])
+        self.assertNotIn(("emergency_contacts", self.ambulance[0]), self.index.entries)
+
+if __name__ == '__main__':
+    unittest.main()
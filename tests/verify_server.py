@@ -0,0 +1,205 @@
+import sys
+import os
+import asyncio
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Ensure we can import from root
+sys.path.append(os.getcwd())
+
+from medplus.database import LazyDatabase
+from medplus import auth, repositories, search, server, table_model
+from medplus.client import Client, RemoteTableModel, ServerError
+
+class TestServer(unittest.TestCase):
+    MODULES = [auth, repositories, search, server, table_model]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = LazyDatabase(path=os.path.join(self.tmpdir, "test.db"))
+        self._real_db = server.db
+        for module in self.MODULES:
+            module.db = self.db
+        auth.Auth.set_policy("$scrypt$ln=10,r=8,p=1")
+
+        self.server = server.MedPlusServer(port=0, token="secret")
+        started = threading.Event()
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.server.start())
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.server.stop())
+            self.loop.close()
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait(10)
+        self.client = Client(f"http://127.0.0.1:{self.server.port}", token="secret")
+        auth.Auth.register("boss", "pw", "ADMIN")
+        self.client.login("boss", "pw", "ADMIN")
+
+    def tearDown(self):
+        self.client.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        for module in self.MODULES:
+            module.db = self._real_db
+        auth.Auth._hasher = auth.Auth._dummy_hash = None
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def model(self, table):
+        return RemoteTableModel(self.client, table, table_model.TABLES[table])
+
+    def test_register_and_login(self):
+        self.assertEqual(self.client.register("alice", "pw"), (True, "Registration successful."))
+        self.assertEqual(self.client.register("alice", "pw"), (False, "Username already exists."))
+        self.assertEqual(self.client.login("alice", "pw"), (True, "Login successful."))
+        self.assertEqual(self.client.login("alice", "bad"), (False, "Invalid username or password."))
+
+    def test_login_rehash_goes_through_write_queue(self):
+        auth.Auth.register("alice", "pw")
+        auth.Auth.set_policy("$scrypt$ln=11,r=8,p=1")
+        real, threads = repositories.users.set_password_hash, []
+        def set_password_hash(*args):
+            threads.append(threading.current_thread().name)
+            return real(*args)
+        with mock.patch.object(repositories.users, "set_password_hash", side_effect=set_password_hash):
+            self.assertEqual(self.client.login("alice", "pw"), (True, "Login successful."))
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith("medplus-writer"))
+        self.assertIn("ln=11", repositories.users.get_credentials("alice")[0])
+
+    def test_limits_are_capped(self):
+        model = self.model("hospitals")
+        for i in range(5):
+            model.write_insert([f"H{i}", "Addr", str(i)])
+        with mock.patch.object(server, "MAX_LIMIT", 3):
+            self.assertEqual(len(self.client.request("GET", "/tables/hospitals/scan", {"limit": 100})["rows"]), 3)
+            self.assertEqual(len(self.client.request("GET", "/tables/hospitals/scan", {"limit": -1})["rows"]), 1)
+            self.assertEqual(len(self.client.search("addr", limit=100)), 3)
+        with self.assertRaises(ServerError) as caught:
+            self.client.request("GET", "/search", {"q": "addr", "limit": "lots"})
+        self.assertEqual(caught.exception.status, 400)
+
+    def test_token_required(self):
+        intruder = Client(f"http://127.0.0.1:{self.server.port}", token="wrong")
+        with self.assertRaises(ServerError) as caught:
+            intruder.login("alice", "pw")
+        intruder.close()
+        self.assertEqual(caught.exception.status, 401)
+
+    def test_sessions_and_roles(self):
+        anonymous = Client(f"http://127.0.0.1:{self.server.port}", token="secret")
+        try:
+            self.check_sessions_and_roles(anonymous)
+        finally:
+            anonymous.close()
+
+    def check_sessions_and_roles(self, anonymous):
+        # The station token alone gets nothing but login and USER sign-up
+        for method, path, body in [("POST", "/tables/users/delete", {"keys": ["boss"]}),
+                                   ("GET", "/tables/hospitals/count", None), ("GET", "/search", None)]:
+            with self.assertRaises(ServerError) as caught:
+                anonymous.request(method, path, body=body)
+            self.assertEqual(caught.exception.status, 401)
+        with self.assertRaises(ServerError) as caught:
+            anonymous.register("mallory", "pw", "ADMIN")
+        self.assertEqual(caught.exception.status, 401)
+
+        self.assertEqual(anonymous.register("alice", "pw"), (True, "Registration successful."))
+        anonymous.login("alice", "pw")
+        user = RemoteTableModel(anonymous, "personal_contacts", table_model.TABLES["personal_contacts"])
+        self.assertEqual(user.write_insert(["Mum", "123"])[1], "Mum")
+        self.assertEqual(RemoteTableModel(anonymous, "hospitals", table_model.TABLES["hospitals"]).count_rows(), 0)
+        for table, values in [("hospitals", ["A", "B", "1"]), ("emergency_contacts", ["Fire", "101"])]:
+            with self.assertRaises(ServerError) as caught:
+                RemoteTableModel(anonymous, table, table_model.TABLES[table]).write_insert(values)
+            self.assertEqual(caught.exception.status, 403)
+        for path in ["/tables/users/delete", "/tables/users/count"]:
+            with self.assertRaises(ServerError) as caught:
+                anonymous.request("POST" if path.endswith("delete") else "GET", path, body={"keys": ["boss"]})
+            self.assertEqual(caught.exception.status, 403)
+        self.assertEqual(self.model("users").count_rows(), 2)
+
+        # Deleting an account ends its sessions; logging out ends one
+        self.assertEqual(self.model("users").write_delete(["alice"]), 1)
+        with self.assertRaises(ServerError) as caught:
+            user.count_rows()
+        self.assertEqual(caught.exception.status, 401)
+        self.client.logout()
+        with self.assertRaises(ServerError) as caught:
+            self.model("hospitals").count_rows()
+        self.assertEqual(caught.exception.status, 401)
+
+    def test_bad_header_closes_connection(self):
+        with socket.create_connection(("127.0.0.1", self.server.port), timeout=10) as sock:
+            # The "body" would otherwise be parsed as a second request
+            sock.sendall(b"POST /auth/login HTTP/1.1\r\nContent-Length: ten\r\n\r\n"
+                         b"GET /version HTTP/1.1\r\n\r\n")
+            received = b""
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                received += chunk
+        self.assertTrue(received.startswith(b"HTTP/1.1 400"))
+        self.assertIn(b"Connection: close", received)
+        self.assertEqual(received.count(b"HTTP/1.1"), 1)
+
+    def test_remote_model_crud(self):
+        model = self.model("hospitals")
+        version = model.data_version()
+        row = model.insert(["City Hospital", "Main Road", "123"])
+        self.assertEqual(row[1:], ("City Hospital", "Main Road", "123"))
+        self.assertEqual(model.repository.get(row[0]).latitude, None)
+        self.assertIsNone(model.repository.get(row[0] + 1))
+        self.assertNotEqual(model.data_version(), version)
+        # The write's reply carried the new version, so our own insert doesn't look external
+        self.assertFalse(model.refresh())
+        with mock.patch.object(self.client, "data_version", side_effect=AssertionError("round trip")):
+            model.delete(model.insert(["Temp", "Addr", "0"])[0])
+        for i in range(250):
+            model.write_insert([f"H{i:03}", "Addr", str(i)])
+        model.refresh(force=True)
+        self.assertEqual(model.count(), 251)
+        # Second page is fetched by keyset from the first
+        self.assertEqual(model.rows(195, 205, "name")[0][1], "H194")
+        model.update(row[0], {"name": "Renamed"})
+        self.assertEqual(self.client.search("renamed")[0].name, "Renamed")
+        with mock.patch.object(search, "RANK_LIMIT", 100):
+            self.assertEqual(self.client.search("addr").too_broad, ["Hospital"])
+        model.delete(row[0])
+        self.assertEqual(self.model("hospitals").count(), 250)
+        with self.assertRaises(ServerError):
+            model.write_update(row[0], {"id": 5})
+
+    def test_concurrent_writes_share_commits(self):
+        model = self.model("emergency_contacts")
+        threads = [threading.Thread(target=lambda i=i: model.write_insert([f"C{i}", str(i)])) for i in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(model.count_rows(), 40)
+        self.assertEqual(self.server.writes.writes, 40)
+        self.assertEqual(sorted(row[1] for row in model.repository.iter_all()), sorted(f"C{i}" for i in range(40)))
+
+    def test_failed_write_does_not_undo_its_batch(self):
+        async def writes():
+            queue = self.server.writes
+            insert = repositories.hospitals.insert
+            futures = [queue.submit(insert, ["A", "B", "1"]), queue.submit(insert, ["too few"]),
+                       queue.submit(insert, ["C", "D", "2"])]
+            return await asyncio.gather(*futures, return_exceptions=True)
+        good, bad, other = asyncio.run_coroutine_threadsafe(writes(), self.loop).result(10)
+        self.assertIsInstance(bad, ValueError)
+        self.assertEqual((good.name, other.name), ("A", "C"))
+        self.assertEqual(self.model("hospitals").count_rows(), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+# Ensure we can import from root
+sys.path.append(os.getcwd())
+
+from medplus.database import Database
+from medplus import repositories, table_model
+
+class TestTableModel(unittest.TestCase):
+    MODULES = [repositories, table_model]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmpdir, "test.db"))
+        self._real_db = table_model.db
+        for module in self.MODULES:
+            module.db = self.db
+        table_model.set_model_factory(table_model.local_model)
+        self.db.execute_many("INSERT INTO emergency_contacts (name, contact_no) VALUES (?, ?)",
+                             [(f"Contact {i:03}", str(i)) for i in range(25)])
+        spec = table_model.TABLES["emergency_contacts"]
+        self.model = table_model.TableModel("emergency_contacts", spec["select"], spec["key"], spec["insert"],
+                                            spec["sortable"], spec["search"], page_size=10)
+        self.events = []
+        self.model.subscribe(lambda event, payload: self.events.append(event))
+
+    def tearDown(self):
+        table_model.set_model_factory(table_model.local_model)
+        for module in self.MODULES:
+            module.db = self._real_db
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_pages_are_cached(self):
+        with mock.patch.object(self.model, "query_page", wraps=self.model.query_page) as query_page:
+            rows = self.model.rows(5, 15)
+            self.assertEqual([row[1] for row in rows], [f"Contact {i:03}" for i in range(5, 15)])
+            self.assertEqual(query_page.call_count, 2)
+            self.assertEqual(self.model.rows(0, 20), self.model.rows(0, 20))
+            self.assertEqual(query_page.call_count, 2)
+        self.assertEqual(self.model.count(), 25)
+        self.assertEqual(self.model.peek_rows(0, 20)[0][1], "Contact 000")
+        self.assertIsNone(self.model.peek_rows(20, 25))
+
+    def test_sorted_and_filtered_pages(self):
+        rows = self.model.rows(0, 25, "name", descending=True)
+        self.assertEqual(rows[0][1], "Contact 024")
+        self.assertEqual(rows[-1][1], "Contact 000")
+        self.assertEqual(self.model.count("Contact 01"), 10)
+        self.assertEqual(len(self.model.rows(0, 25, search="Contact 01")), 10)
+
+    def test_load_and_store(self):
+        loaded = self.model.load(10, 20)
+        self.assertTrue(self.model.store(loaded))
+        self.assertEqual(self.model.peek_count(), 25)
+        self.assertEqual(self.model.peek_rows(10, 20)[0][1], "Contact 010")
+        # A write in between makes what was read stale
+        loaded = self.model.load(0, 10)
+        self.model.insert(["Late", "999"])
+        self.assertFalse(self.model.store(loaded))
+
+    def test_insert_invalidates(self):
+        self.model.rows(0, 25)
+        self.model.rows(0, 25, "name", descending=True)
+        self.assertEqual(self.model.count(), 25)
+        row = self.model.insert(["Aardvark Ambulance", "108"])
+        self.assertEqual(self.events, ["insert"])
+        self.assertEqual(self.model.peek_count(), 26)
+        # The trailing page of the default order was dropped; sorted sets are refetched
+        self.assertIsNone(self.model.peek_rows(20, 26))
+        self.assertIsNone(self.model.peek_rows(0, 10, "name", descending=True))
+        self.assertEqual(self.model.rows(25, 26), [row])
+        self.assertEqual(self.model.rows(0, 1, "name")[0], row)
+
+    def test_update_patches_default_order(self):
+        self.model.rows(0, 25)
+        key = self.model.rows(3, 4)[0][0]
+        self.model.update(key, {"name": "Renamed"})
+        self.assertEqual(self.events, ["update"])
+        self.assertEqual(self.model.peek_rows(3, 4)[0][1], "Renamed")
+
+    def test_delete_invalidates(self):
+        self.model.rows(0, 25)
+        self.assertEqual(self.model.count(), 25)
+        keys = [row[0] for row in self.model.rows(12, 14)]
+        self.model.delete_many(keys)
+        self.assertEqual(self.events, ["delete", "delete"])
+        self.assertEqual(self.model.peek_count(), 23)
+        # Pages before the first deleted row stay; later ones shift and are refetched
+        self.assertIsNotNone(self.model.peek_rows(0, 10))
+        self.assertIsNone(self.model.peek_rows(10, 20))
+        self.assertEqual(self.model.rows(12, 13)[0][1], "Contact 014")
+
+    def test_refresh_picks_up_external_write(self):
+        self.assertTrue(self.model.refresh())
+        self.model.rows(0, 25)
+        self.assertFalse(self.model.refresh())
+        self.model.insert(["Own write", "1"])
+        self.assertFalse(self.model.refresh())
+
+        other = sqlite3.connect(self.db.path)
+        other.execute("UPDATE emergency_contacts SET name = 'Changed' WHERE name = 'Contact 000'")
+        other.commit()
+        other.close()
+        self.events.clear()
+        self.assertTrue(self.model.refresh())
+        self.assertEqual(self.events, ["reload"])
+        self.assertIsNone(self.model.peek_rows(0, 10))
+        self.assertEqual(self.model.rows(0, 1)[0][1], "Changed")
+
+    def test_refresh_with_version_read_elsewhere(self):
+        self.model.refresh()
+        with mock.patch.object(self.model, "data_version", side_effect=AssertionError("read here")):
+            self.assertFalse(self.model.refresh(version=self.model._data_version))
+            self.assertTrue(self.model.refresh(version=("other", 0)))
+
+if __name__ == '__main__':
+    unittest.main()
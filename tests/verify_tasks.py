@@ -0,0 +1,90 @@
+import sys
+import os
+import time
+import unittest
+
+# Ensure we can import from root
+sys.path.append(os.getcwd())
+
+from medplus.ui.tasks import TaskRunner
+
+class FakeRoot:
+    """Stands in for Tk: after() callbacks run when pump() is called."""
+    def __init__(self):
+        self.jobs = []
+
+    def after(self, ms, callback):
+        self.jobs.append(callback)
+        return len(self.jobs)
+
+    def after_cancel(self, job):
+        pass
+
+    def pump(self):
+        while self.jobs:
+            self.jobs.pop(0)()
+            time.sleep(0.005)
+
+class FakeWidget:
+    def __init__(self):
+        self.cursor = ""
+        self.destroy_handlers = []
+
+    def bind(self, sequence, callback, add=None):
+        self.destroy_handlers.append(callback)
+
+    def configure(self, cursor):
+        self.cursor = cursor
+
+    def destroy(self):
+        event = type("Event", (), {"widget": self})()
+        for handler in self.destroy_handlers:
+            handler(event)
+
+class TestTaskRunner(unittest.TestCase):
+    def setUp(self):
+        self.root = FakeRoot()
+        self.runner = TaskRunner(max_workers=2, max_in_flight=2)
+        self.runner.attach(self.root)
+        self.owner = FakeWidget()
+
+    def tearDown(self):
+        self.runner.shutdown()
+
+    def test_results_delivered_on_pump(self):
+        results = []
+        for i in range(5):
+            self.runner.submit(self.owner, lambda i=i: i * i, on_done=results.append)
+        self.assertEqual(self.runner.in_flight(), 2) # Capped, the rest wait
+        self.assertEqual(self.owner.cursor, "watch")
+        self.root.pump()
+        self.assertEqual(sorted(results), [0, 1, 4, 9, 16])
+        self.assertEqual(self.owner.cursor, "")
+
+    def test_errors_go_to_on_error(self):
+        errors = []
+        self.runner.submit(self.owner, lambda: 1 / 0, on_error=errors.append)
+        self.root.pump()
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+
+    def test_same_key_supersedes(self):
+        results = []
+        self.runner.submit(self.owner, lambda: time.sleep(0.02) or "old", on_done=results.append, key="q")
+        self.runner.submit(self.owner, lambda: "new", on_done=results.append, key="q")
+        self.root.pump()
+        self.assertEqual(results, ["new"])
+
+    def test_destroying_owner_cancels(self):
+        results = []
+        self.runner.submit(self.owner, lambda: time.sleep(0.02) or "late", on_done=results.append)
+        self.owner.destroy()
+        self.root.pump()
+        self.assertEqual(results, [])
+
+    def test_runs_inline_without_root(self):
+        results = []
+        TaskRunner().submit(self.owner, lambda: "now", on_done=results.append)
+        self.assertEqual(results, ["now"])
+
+if __name__ == '__main__':
+    unittest.main()